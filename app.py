@@ -1,15 +1,88 @@
-from flask import Flask, render_template, request, jsonify
-import os, time
+from flask import Flask, Response, render_template, request, jsonify, g, send_from_directory, stream_with_context, url_for
+import os, time, mimetypes
+from datetime import datetime
 from handlers.audio import record_audio
 from handlers.stt import stt_transcribe
-from handlers.agent import process_with_agent
+from handlers.agent import process_with_agent, is_cacheable_answer
 from handlers.rag import enhance_response_with_rag
 from handlers.tts import tts_synthesize
+from handlers.cache import answer_cache, query_key
+from handlers.prefetch import prefetch, prefetcher
+from handlers.session import TIME_SENSITIVE_ACTIONS, session_store, resolve_query
+from handlers.database import get_database
+from handlers.metrics import request_trace, span, render_metrics, register_collector, stats_lines
+from handlers.warmup import start_warmup, readiness, start_reload, reload_status
+from handlers.gtfs import feed_now, get_feed, pin_feed, pinned_feed, unpin_feed, on_swap
+from handlers.admission import Overloaded, check_rate, admission_stats, overload_body, retry_after_seconds
+from handlers.admission import metrics_lines as admission_metrics
+from handlers.realtime import on_update, realtime_status
+from handlers.realtime import metrics_lines as realtime_metrics
+from handlers.assets import DIST, IMMUTABLE_MAX_AGE, MANIFEST, compressed_variant, hashed_name, is_generated_audio
 
 app = Flask(__name__)
 
+register_collector(lambda: stats_lines(
+    'metro_answer_cache', answer_cache.stats(), counters=('hits', 'misses', 'coalesced', 'evictions')))
+register_collector(lambda: stats_lines('metro_sessions', {'active': len(session_store)}))
+register_collector(lambda: stats_lines('metro_db_write_queue', {'depth': get_database().queue_depth()}))
+register_collector(lambda: stats_lines('metro', {'ready': int(readiness()['ready'])}))
+register_collector(lambda: stats_lines('metro_gtfs', {'version': readiness()['gtfs_version'] or 0}))
+register_collector(lambda: stats_lines(
+    'metro_prefetch', prefetcher.stats(), counters=('scheduled', 'dropped', 'computed', 'skipped', 'errors', 'hits', 'used')))
+register_collector(admission_metrics)
+register_collector(realtime_metrics)
+# Answers computed from the previous snapshot must not outlive it
+on_swap(lambda feed: answer_cache.clear())
+on_swap(lambda feed: session_store.drop_results())
+# nor may times and routes computed before the latest delays
+on_update(lambda status: answer_cache.evict(lambda key: key[0] in ('schedule', 'route_finding', 'get_schedule', 'find_route')))
+on_update(lambda status: session_store.drop_results(TIME_SENSITIVE_ACTIONS))
+
+@app.before_request
+def ensure_warmup():
+    # Servers that import app:app directly warm up on the first request (or readiness probe)
+    start_warmup()
+    # Pin the live GTFS snapshot so a reload mid-request does not change its data
+    g.feed_token = pin_feed()
+
+@app.teardown_request
+def release_feed(exc):
+    token = g.pop('feed_token', None)
+    if token is not None:
+        unpin_feed(token)
+
+def asset_url(filename):
+    """URL of the content-hashed build of a static file, or the plain file if not built"""
+    hashed = hashed_name(filename)
+    if hashed:
+        return url_for('hashed_asset', filename=hashed[len(DIST) + 1:])
+    return url_for('static', filename=filename)
+
+app.jinja_env.globals['asset_url'] = asset_url
+
+@app.route('/static/dist/<path:filename>')
+def hashed_asset(filename):
+    # Content-hashed names never change content, so they can be cached forever
+    directory = os.path.join(app.static_folder, DIST)
+    if filename == MANIFEST:
+        return jsonify({'error': 'Not found'}), 404
+    name, encoding = compressed_variant(directory, filename, request.accept_encodings)
+    response = send_from_directory(directory, name, mimetype=mimetypes.guess_type(filename)[0],
+                                   max_age=IMMUTABLE_MAX_AGE)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
 @app.after_request
 def add_no_cache(response):
+    # Static files revalidate by ETag (or are immutable when hashed) and cacheable JSON sets
+    # its own headers; everything dynamic, including generated audio, is never cached
+    if response.cache_control.public or (request.endpoint in ('static', 'hashed_asset')
+                                         and not is_generated_audio(request.path)):
+        return response
     response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
     response.headers["Pragma"] = "no-cache"
     response.headers["Expires"] = "0"
@@ -19,86 +92,318 @@ def add_no_cache(response):
 def index():
     return render_template('index.html')
 
+def get_session_id():
+    data = request.get_json(silent=True) or {}
+    return request.args.get('session_id') or data.get('session_id') or 'anonymous'
+
+def answer_query(query, lang='en', stations=None, session_id=None):
+    """Run agent + RAG once per cache key; identical concurrent queries share the result"""
+    def compute():
+        # Process with agentic AI
+        response = process_with_agent(query, lang, session_id)
+        # Enhance with RAG
+        return enhance_response_with_rag(query, response)
+    
+    context = session_store.get(session_id)
+    step_free = bool(context and context.needs_step_free())
+    return answer_cache.get_or_compute(query_key(query, lang, stations, step_free=step_free), compute,
+                                       cacheable=is_cacheable_answer)
+
+def log_interaction(session_id, query, response, stations, lang, trace):
+    """Queue the conversation and route search for the background writer"""
+    db = get_database()
+    route_data = {'from_station': stations[0], 'to_station': stations[1]} if stations else None
+    db.save_conversation(session_id, query, response, route_data, lang, trace.elapsed(), trace.as_dict())
+    if stations:
+        db.save_route_search(session_id, stations[0], stations[1])
+
+@app.errorhandler(Overloaded)
+def overloaded(error):
+    # Shed by admission control or the session rate limit: tell the client when to retry
+    return jsonify(overload_body(error)), 429, {'Retry-After': str(retry_after_seconds(error))}
+
 @app.route('/process', methods=['POST'])
 def process_audio():
-    start_time = time.time()
-    
-    # Record audio
-    wav_path = record_audio(duration=5)
-    transcript = stt_transcribe(wav_path)
-    
-    if not transcript:
-        return jsonify({'error': 'Could not transcribe audio'}), 500
-    
-    # Process with agentic AI
-    try:
-        response = process_with_agent(transcript, 'en')
-        
-        # Enhance with RAG
-        enhanced_response = enhance_response_with_rag(transcript, response)
+    with request_trace('process') as trace:
+        session_id = get_session_id()
+        check_rate('process', session_id, request.remote_addr)
         
-        # Generate audio
-        out_mp3 = os.path.join('static', 'output.mp3')
-        if os.path.exists(out_mp3): 
-            os.remove(out_mp3)
-        tts_synthesize(enhanced_response, 'en')
+        # Record audio
+        with span('record_audio'):
+            wav_path = record_audio(duration=5)
+        with span('stt'):
+            transcript = stt_transcribe(wav_path)
         
-        timestamp = int(time.time())
-        return jsonify({
-            'transcript': transcript,
-            'response': enhanced_response,
-            'audio_url': f"/static/output.mp3?ts={timestamp}"
-        })
+        if not transcript:
+            return jsonify({'error': 'Could not transcribe audio'}), 500
         
-    except Exception as e:
-        return jsonify({'error': f'Processing error: {str(e)}'}), 500
+        # Process with agentic AI
+        try:
+            context = session_store.get(session_id)
+            stations = resolve_query(transcript, 'en', context)
+            prefetch(session_id, transcript, stations)
+            enhanced_response = answer_query(transcript, 'en', stations, session_id)
+            if context:
+                context.note_stations(stations)
+            
+            # Generate audio
+            out_mp3 = os.path.join('static', 'output.mp3')
+            try:
+                os.remove(out_mp3)
+            except FileNotFoundError:
+                # A concurrent request removed it first
+                pass
+            with span('tts'):
+                tts_synthesize(enhanced_response, 'en')
+            log_interaction(session_id, transcript, enhanced_response, stations, 'en', trace)
+            
+            timestamp = int(time.time())
+            return jsonify({
+                'transcript': transcript,
+                'response': enhanced_response,
+                'audio_url': f"/static/output.mp3?ts={timestamp}"
+            })
+            
+        except Overloaded:
+            raise
+        except Exception as e:
+            return jsonify({'error': f'Processing error: {str(e)}'}), 500
 
 @app.route('/process_text', methods=['POST'])
 def process_text():
-    start_time = time.time()
-    data = request.get_json()
-    user_query = data.get('query', '')
-    
-    if not user_query:
-        return jsonify({'error': 'No query provided'}), 400
-    
-    try:
-        # Process with agentic AI
-        response = process_with_agent(user_query, 'en')
+    with request_trace('process_text') as trace:
+        data = request.get_json()
+        user_query = data.get('query', '')
+        session_id = get_session_id()
         
-        # Enhance with RAG
-        enhanced_response = enhance_response_with_rag(user_query, response)
-        
-        return jsonify({
-            'response': enhanced_response
-        })
+        if not user_query:
+            return jsonify({'error': 'No query provided'}), 400
+        check_rate('process_text', session_id, request.remote_addr)
         
-    except Exception as e:
-        return jsonify({'error': f'Processing error: {str(e)}'}), 500
+        try:
+            context = session_store.get(session_id)
+            with span('resolve_stations'):
+                stations = resolve_query(user_query, 'en', context)
+            prefetch(session_id, user_query, stations)
+            enhanced_response = answer_query(user_query, 'en', stations, session_id)
+            if context:
+                context.note_stations(stations)
+            log_interaction(session_id, user_query, enhanced_response, stations, 'en', trace)
+            
+            return jsonify({
+                'response': enhanced_response
+            })
+            
+        except Overloaded:
+            raise
+        except Exception as e:
+            return jsonify({'error': f'Processing error: {str(e)}'}), 500
 
 @app.route('/api/history')
 def get_history():
-    return jsonify([])
+    limit = request.args.get('limit', 10, type=int)
+    return jsonify(get_database().get_conversation_history(get_session_id(), limit))
 
 @app.route('/api/favorites')
 def get_favorites():
-    return jsonify([])
+    return jsonify(get_database().get_station_favorites(get_session_id()))
 
 @app.route('/api/popular_routes')
 def get_popular_routes():
-    return jsonify([])
+    limit = request.args.get('limit', 10, type=int)
+    hours = request.args.get('hours', type=int)
+    return jsonify(get_database().get_popular_routes(limit, hours))
 
 @app.route('/api/user_insights')
 def get_user_insights():
-    return jsonify({})
+    return jsonify(get_database().get_user_insights(get_session_id()))
+
+def wants_step_free():
+    """?accessible=1/0 if given, else the session's saved accessibility needs"""
+    flag = request.args.get('accessible')
+    if flag is not None:
+        return flag.lower() in ('1', 'true', 'yes')
+    context = session_store.get(get_session_id())
+    return bool(context and context.needs_step_free())
+
+def requested_time():
+    """?time=HH:MM as a datetime today, None for now; ValueError if malformed"""
+    if not request.args.get('time'):
+        return None
+    return datetime.combine(feed_now().date(), datetime.strptime(request.args['time'], '%H:%M').time())
+
+@app.route('/api/journeys')
+def get_journeys():
+    from handlers.route_finder import find_multiple_routes
+    from_station = request.args.get('from', '')
+    to_station = request.args.get('to', '')
+    if not from_station or not to_station:
+        return jsonify({'error': 'Both from and to stations are required'}), 400
+    try:
+        when = requested_time()
+    except ValueError:
+        return jsonify({'error': 'time must be HH:MM'}), 400
+    max_routes = min(request.args.get('max', 3, type=int), 10)
+    result = find_multiple_routes(from_station, to_station, max_routes, when, wants_step_free())
+    if request.args.get('geometry', '').lower() in ('1', 'true', 'yes') and result.get('routes'):
+        from handlers.geometry import add_leg_geometry
+        add_leg_geometry(result['routes'], request.args.get('zoom', type=int))
+    return jsonify(result)
+
+def cacheable_json(payload, max_age=int(os.getenv('GEOMETRY_MAX_AGE', '86400'))):
+    """JSON that browsers and CDNs may keep, revalidated by ETag (304 when unchanged)"""
+    response = jsonify(payload)
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    response.add_etag()
+    return response.make_conditional(request)
+
+@app.route('/api/geometry/lines')
+def get_line_geometries():
+    from handlers.geometry import get_geometry
+    return cacheable_json(get_geometry().lines(request.args.get('zoom', type=int)))
+
+@app.route('/api/geometry/lines/<route_id>')
+def get_line_geometry(route_id):
+    from handlers.geometry import get_geometry
+    line = get_geometry().line(route_id, request.args.get('zoom', type=int))
+    if line is None:
+        return jsonify({'error': 'Line not found'}), 404
+    return cacheable_json(line)
+
+@app.route('/api/reachable')
+def get_reachable():
+    from handlers.isochrone import reachable, isochrone_geojson
+    from_station = request.args.get('from', '')
+    if not from_station:
+        return jsonify({'error': 'A from station is required'}), 400
+    stops = get_feed().stops
+    matches = stops[stops['stop_name'].str.contains(from_station, case=False, na=False, regex=False)]
+    if matches.empty:
+        return jsonify({'error': 'Station not found'}), 404
+    try:
+        when = requested_time()
+    except ValueError:
+        return jsonify({'error': 'time must be HH:MM'}), 400
+    minutes = max(1, min(request.args.get('minutes', 30, type=int), 180))
+    stop_id = matches.iloc[0]['stop_id']
+    if request.args.get('format') == 'geojson':
+        walk = request.args.get('walk', '').lower() in ('1', 'true', 'yes')
+        return jsonify(isochrone_geojson(stop_id, when, minutes, wants_step_free(), walk))
+    return jsonify(reachable(stop_id, when, minutes, wants_step_free()))
+
+@app.route('/api/od_matrix', methods=['POST'])
+def get_od_matrix():
+    """Travel-time and fare matrix, streamed as CSV (or returned as Parquet)"""
+    from handlers.od_matrix import (MAX_API_PAIRS, API_PROCESSES, matrix_pairs, parse_departures, od_matrix,
+                                    csv_chunks, write_parquet)
+    data = request.get_json(silent=True) or {}
+    try:
+        departures = parse_departures(data.get('times') or ['09:00'])
+        day = datetime.strptime(data['date'], '%Y-%m-%d').date() if data.get('date') else None
+    except (ValueError, TypeError, AttributeError):
+        return jsonify({'error': 'times must be HH:MM and date YYYY-MM-DD'}), 400
+    if not data.get('pairs') and not data.get('origins'):
+        return jsonify({'error': 'Provide pairs [[from, to], ...] or origins (and optionally destinations)'}), 400
+    try:
+        pairs, unresolved = matrix_pairs(data.get('pairs'), data.get('origins'), data.get('destinations'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if unresolved:
+        return jsonify({'error': 'Stations not found', 'stations': unresolved}), 404
+    if len(pairs) * len(departures) > MAX_API_PAIRS:
+        return jsonify({'error': f'At most {MAX_API_PAIRS} pairs x times per request; use python -m handlers.od_matrix'}), 413
+    accessible = bool(data.get('accessible'))
+    headers = {'X-OD-Pairs': str(len(pairs) * len(departures))}
+    feed = get_feed()
+
+    if data.get('format') == 'parquet':
+        import io
+        buffer = io.BytesIO()
+        stats = {}
+        try:
+            write_parquet(od_matrix(pairs, departures, day, accessible, API_PROCESSES, stats), buffer)
+        except ImportError:
+            return jsonify({'error': 'Parquet output needs pyarrow installed'}), 501
+        headers['X-OD-Pairs-Per-Second'] = str(stats['pairs_per_second'])
+        return Response(buffer.getvalue(), mimetype='application/vnd.apache.parquet', headers=headers)
+
+    def generate():
+        # Streaming outlives the request's pin, so hold the same snapshot until the last row
+        stats = {}
+        with pinned_feed(feed), span('od_matrix'):
+            yield from csv_chunks(od_matrix(pairs, departures, day, accessible, API_PROCESSES, stats))
+        # The rate is known only once the last row is out, after the headers were sent
+        yield f"# pairs={stats['pairs']} seconds={stats['seconds']} pairs_per_second={stats['pairs_per_second']}\r\n"
+    return Response(stream_with_context(generate()), mimetype='text/csv', headers=headers)
 
 @app.route('/api/add_favorite', methods=['POST'])
 def add_favorite():
+    data = request.get_json(silent=True) or {}
+    station_name = data.get('station_name', '')
+    if not station_name:
+        return jsonify({'error': 'No station provided'}), 400
+    get_database().add_station_favorite(get_session_id(), station_name, data.get('station_code'))
     return jsonify({'success': True})
 
+@app.route('/ready')
+def ready():
+    status = readiness()
+    return jsonify(status), 200 if status['ready'] else 503
+
+def admin_authorized():
+    token = os.getenv('METRO_ADMIN_TOKEN')
+    return bool(token) and request.headers.get('X-Admin-Token') == token
+
+@app.route('/admin/gtfs', methods=['GET'])
+def gtfs_status():
+    if not admin_authorized():
+        return jsonify({'error': 'Forbidden'}), 403
+    return jsonify(reload_status())
+
+@app.route('/admin/gtfs/reload', methods=['POST'])
+def reload_gtfs():
+    if not admin_authorized():
+        return jsonify({'error': 'Forbidden'}), 403
+    path = (request.get_json(silent=True) or {}).get('path')
+    if not start_reload(path):
+        return jsonify({'error': 'A reload is already running'}), 409
+    return jsonify({'status': 'reloading', 'path': path}), 202
+
+@app.route('/metrics')
+def metrics():
+    return render_metrics(), 200, {'Content-Type': 'text/plain; version=0.0.4'}
+
+@app.route('/api/admission_stats')
+def get_admission_stats():
+    return jsonify(admission_stats())
+
+@app.route('/api/realtime_status')
+def get_realtime_status():
+    return jsonify(realtime_status())
+
+@app.route('/api/cache_stats')
+def get_cache_stats():
+    return jsonify(dict(answer_cache.stats(), prefetch=prefetcher.stats()))
+
 @app.route('/api/preferences', methods=['GET', 'POST'])
 def handle_preferences():
-    return jsonify({})
+    db = get_database()
+    session_id = get_session_id()
+    if request.method == 'POST':
+        preferences = request.get_json(silent=True) or {}
+        if not isinstance(preferences, dict):
+            return jsonify({'error': 'Preferences must be a JSON object'}), 400
+        from handlers.journey import valid_accessibility_needs
+        needs = preferences.get('accessibility_needs')
+        if needs is not None and not valid_accessibility_needs(needs):
+            return jsonify({'error': 'accessibility_needs must be an object, a list of strings or a string'}), 400
+        db.save_user_preferences(session_id, preferences)
+        saved = db.get_user_preferences(session_id)
+        session_store.update_preferences(session_id, saved)
+        return jsonify(saved)
+    return jsonify(db.get_user_preferences(session_id))
 
 if __name__ == '__main__':
+    start_warmup()
     app.run(debug=True)
\ No newline at end of file
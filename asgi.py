@@ -0,0 +1,134 @@
+import os
+import uuid
+import asyncio
+import contextlib
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route, Mount
+from app import app as flask_app, log_interaction
+from handlers.audio import record_audio
+from handlers.stt import stt_transcribe_async
+from handlers.agent import process_with_agent_async, is_cacheable_answer
+from handlers.rag import enhance_response_with_rag
+from handlers.tts import tts_synthesize_async, prune_audio
+from handlers.cache import answer_cache, query_key
+from handlers.prefetch import prefetch
+from handlers.session import session_store, resolve_query
+from handlers.metrics import request_trace, span
+from handlers.warmup import start_warmup
+from handlers.gtfs import pinned_feed
+from handlers.admission import Overloaded, check_rate, overload_body, retry_after_seconds
+
+# Async serving mode: the conversation endpoints await LLM, TTS and STT I/O
+# so one worker can hold hundreds of in-flight requests. Every other route is
+# served by the Flask app mounted below.
+#
+#   uvicorn asgi:app --workers 4
+#   gunicorn -k uvicorn.workers.UvicornWorker -w 4 asgi:app
+
+async def answer_query(query, lang='en', stations=None, session_id=None):
+    """Async counterpart of app.answer_query sharing the same answer cache"""
+    async def compute():
+        response = await process_with_agent_async(query, lang, session_id)
+        return await asyncio.to_thread(enhance_response_with_rag, query, response)
+
+    context = session_store.get(session_id)
+    key = query_key(query, lang, stations, step_free=bool(context and context.needs_step_free()))
+    return await answer_cache.get_or_compute_async(key, compute, cacheable=is_cacheable_answer)
+
+async def process_audio(request):
+    with request_trace('process') as trace, pinned_feed():
+        return await _process_audio(request, trace)
+
+async def _process_audio(request, trace):
+    session_id = request.query_params.get('session_id') or 'anonymous'
+    check_rate('process', session_id, request.client.host if request.client else None)
+    request_id = uuid.uuid4().hex
+
+    # Record audio
+    with span('record_audio'):
+        wav_path = await asyncio.to_thread(record_audio, f"{request_id}.wav", 5)
+    with span('stt'):
+        transcript = await stt_transcribe_async(wav_path)
+    try:
+        os.remove(wav_path)
+    except OSError:
+        pass
+
+    if not transcript:
+        return JSONResponse({'error': 'Could not transcribe audio'}, status_code=500)
+
+    try:
+        context = session_store.get(session_id)
+        stations = await asyncio.to_thread(resolve_query, transcript, 'en', context)
+        prefetch(session_id, transcript, stations)
+        enhanced_response = await answer_query(transcript, 'en', stations, session_id)
+        if context:
+            context.note_stations(stations)
+
+        # Each conversation gets its own audio file so concurrent requests don't clobber output.mp3
+        await asyncio.to_thread(prune_audio)
+        with span('tts'):
+            await tts_synthesize_async(enhanced_response, 'en', f"audio/{request_id}.mp3")
+        log_interaction(session_id, transcript, enhanced_response, stations, 'en', trace)
+
+        return JSONResponse({
+            'transcript': transcript,
+            'response': enhanced_response,
+            'audio_url': f"/static/audio/{request_id}.mp3"
+        })
+
+    except Overloaded:
+        raise
+    except Exception as e:
+        return JSONResponse({'error': f'Processing error: {str(e)}'}, status_code=500)
+
+async def process_text(request):
+    with request_trace('process_text') as trace, pinned_feed():
+        return await _process_text(request, trace)
+
+async def _process_text(request, trace):
+    try:
+        data = await request.json()
+    except Exception:
+        data = {}
+    user_query = data.get('query', '')
+    session_id = data.get('session_id') or request.query_params.get('session_id') or 'anonymous'
+
+    if not user_query:
+        return JSONResponse({'error': 'No query provided'}, status_code=400)
+    check_rate('process_text', session_id, request.client.host if request.client else None)
+
+    try:
+        context = session_store.get(session_id)
+        with span('resolve_stations'):
+            stations = await asyncio.to_thread(resolve_query, user_query, 'en', context)
+        prefetch(session_id, user_query, stations)
+        enhanced_response = await answer_query(user_query, 'en', stations, session_id)
+        if context:
+            context.note_stations(stations)
+        log_interaction(session_id, user_query, enhanced_response, stations, 'en', trace)
+
+        return JSONResponse({
+            'response': enhanced_response
+        })
+
+    except Overloaded:
+        raise
+    except Exception as e:
+        return JSONResponse({'error': f'Processing error: {str(e)}'}, status_code=500)
+
+async def overloaded(request, error):
+    return JSONResponse(overload_body(error), status_code=429, headers={'Retry-After': str(retry_after_seconds(error))})
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    start_warmup()
+    yield
+
+app = Starlette(routes=[
+    Route('/process', process_audio, methods=['POST']),
+    Route('/process_text', process_text, methods=['POST']),
+    Mount('/', app=WSGIMiddleware(flask_app)),
+], lifespan=lifespan, exception_handlers={Overloaded: overloaded})
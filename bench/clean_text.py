@@ -0,0 +1,93 @@
+"""Speed of llm.clean_text_for_tts.
+
+    python -m bench.clean_text [--iterations 200] [--save]
+
+Times the compiled cleaner against the previous eleven-pass version on long
+Markdown-heavy LLM answers. The previous version and the corpus are kept here
+as the reference for tests/test_clean_text.py, which checks that the two agree
+and that the cleaner is idempotent.
+"""
+import re
+import sys
+import time
+import argparse
+from typing import List
+from bench.common import percentiles, save_results
+
+def legacy_clean_text_for_tts(text: str) -> str:
+    """The cleaner as it was before the single-scan rewrite, kept as the reference"""
+    if not text:
+        return ""
+    text = re.sub(r'\*\*(.*?)\*\*', r'\1', text)
+    text = re.sub(r'\*(.*?)\*', r'\1', text)
+    text = re.sub(r'#+\s*(.*)', r'\1', text)
+    text = re.sub(r'`(.*?)`', r'\1', text)
+    text = re.sub(r'~~(.*?)~~', r'\1', text)
+    text = re.sub(r'^\s*[-*+]\s+', '', text, flags=re.MULTILINE)
+    text = re.sub(r'^\s*\d+\.\s+', '', text, flags=re.MULTILINE)
+    text = re.sub(r'\n\s*\n', '\n', text)
+    text = re.sub(r' +', ' ', text)
+    text = text.strip()
+    text = re.sub(r'[^\w\s\.\,\!\?\:\;\-\(\)]', '', text)
+    return text
+
+# Answers in the shapes the LLM actually returns despite the plain-text instruction
+CORPUS = [
+    "Take the **Yellow Line** from Rajiv Chowk towards *Samaypur Badli* and get off at Kashmere Gate.",
+    "## Route from Rajiv Chowk to Dwarka\n\n1. Board the **Blue Line** towards Dwarka Sector 21.\n"
+    "2. Travel 18 stations (about 35 minutes).\n3. Exit at `Dwarka Sector 21`.\n\n**Fare:** ₹50 (₹45 with a smart card).",
+    "Here are your options:\n\n* **Option 1:** Blue Line direct - 35 min\n* **Option 2:** Via Yellow Line - 40 min\n\n"
+    "Let me know if you need anything else! 🚇",
+    "### Next trains at Hauz Khas\n- 09:05 towards Samaypur Badli\n- 09:09 towards HUDA City Centre\n"
+    "- 09:13 towards Samaypur Badli\n\n> Trains run every 4 minutes at peak.",
+    "The fare from Vaishali to Botanical Garden is ₹40. ~~Tokens are no longer sold~~ Smart cards save 10%.",
+    "Rajiv Chowk has:\n\n+ Lifts at Gates 1, 4 and 7\n+ Parking: not available\n+ Toilets near Gate 5\n\n"
+    "Need directions to a gate? Just ask.",
+    "Sure! Here's the plan:\n\n1. **Start** at Janak Puri West (Magenta Line).\n2. **Change** at Botanical Garden.\n"
+    "3. **Arrive** at Kalkaji Mandir.\n\nTotal: ~45 minutes, fare ₹50.",
+    "Step-free route: use the lift at Gate 2, board the Violet Line (platform 1) & change at Mandi House.",
+    "Journey summary — 3 stops, 8 minutes; first train 05:30, last train 23:30.",
+    "I'm sorry, I couldn't process your request at the moment.",
+]
+
+def long_answer(repeats: int = 20) -> str:
+    """A several-KB answer built from the corpus, like a long multi-route response"""
+    return '\n\n'.join(CORPUS * repeats)
+
+def time_cleaner(clean, text: str, iterations: int):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        clean(text)
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+def main(argv: List[str] = None) -> int:
+    from handlers import llm
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--save', action='store_true', help='also write bench/results/clean_text-<timestamp>.json')
+    args = parser.parse_args(argv)
+
+    def fresh(text):
+        # Time the cleaning itself, not the recently-cleaned short-circuit
+        llm._cleaned.clear()
+        return llm.clean_text_for_tts(text)
+
+    text = long_answer()
+    cleaned = llm.clean_text_for_tts(text)
+    results = {
+        'input_chars': len(text),
+        'legacy': time_cleaner(legacy_clean_text_for_tts, text, args.iterations),
+        'single_scan': time_cleaner(fresh, text, args.iterations),
+        'already_clean': time_cleaner(llm.clean_text_for_tts, cleaned, args.iterations),
+    }
+    print(f"input: {len(text)} chars")
+    for name in ('legacy', 'single_scan', 'already_clean'):
+        print(f"{name:14s} {results[name]}")
+    if args.save:
+        print(f"Saved {save_results('clean_text', results)}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,75 @@
+import os
+import json
+import time
+import platform
+import subprocess
+from typing import Dict, List
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+# Representative commuter queries, reused by the micro-benchmarks and the load generator
+SAMPLE_QUERIES = [
+    "How do I get from Rajiv Chowk to Kashmere Gate",
+    "What's the fare from Dwarka Sector - 21 to Noida Electronic City?",
+    "Next train at Hauz Khas",
+    "Route from Dilshad Garden to Rithala",
+    "How much is a ticket from Vaishali to Botanical Garden",
+    "Tell me about the facilities at Rajiv Chowk",
+    "Schedule for Central Secretariat station",
+    "from Janak Puri West to Kalkaji Mandir",
+]
+
+# The same kinds of question in Hindi and Hinglish, resolved through the station lexicon
+SAMPLE_QUERIES_HI = [
+    "राजीव चौक से कश्मीरी गेट कैसे जाऊं",
+    "द्वारका सेक्टर 21 से नोएडा इलेक्ट्रॉनिक सिटी का किराया",
+    "हौज़ ख़ास पर अगली ट्रेन",
+    "rajeev chauk se kashmiri gate kitna kiraya hai",
+    "mujhe vaishali se botanical garden jana hai",
+    "केंद्रीय सचिवालय से मंडी हाउस",
+    "janakpuri west se kalkaji mandir kaise jaayen",
+    "लक्ष्मी नगर से आनंद विहार",
+]
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """p50/p95/p99, mean, min and max of a list of durations (seconds, reported in ms)"""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+    return {
+        'count': len(ordered),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3),
+        'min_ms': round(ordered[0] * 1000, 3),
+        'p50_ms': round(pick(0.50) * 1000, 3),
+        'p95_ms': round(pick(0.95) * 1000, 3),
+        'p99_ms': round(pick(0.99) * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3),
+    }
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return 'unknown'
+
+def save_results(name: str, results: Dict) -> str:
+    """Write results to bench/results/<name>-<timestamp>.json and return the path"""
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    stamp = time.strftime('%Y%m%d-%H%M%S')
+    path = os.path.join(RESULTS_DIR, f"{name}-{stamp}.json")
+    payload = {
+        'benchmark': name,
+        'timestamp': stamp,
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+    with open(path, 'w') as f:
+        json.dump(payload, f, indent=2, default=str)
+    return path
@@ -0,0 +1,71 @@
+"""Import-time budget check for the web entry points.
+
+    python -m bench.importtime --budget-ms 400
+
+Imports each module in a fresh interpreter under `python -X importtime`,
+takes the best of several runs, and exits non-zero if an entry point goes
+over budget or pulls in one of the heavy libraries that should only load
+during warm-up or on first use.
+"""
+import sys
+import argparse
+import subprocess
+from typing import Dict, List
+from bench.common import save_results
+
+ENTRY_POINTS = ('app', 'asgi')
+# Loaded lazily by handlers.gtfs, handlers.rag, audio, STT and TTS
+HEAVY_MODULES = ('pandas', 'numpy', 'sklearn', 'scipy', 'sounddevice', 'speech_recognition', 'edge_tts', 'requests')
+
+def parse_importtime(stderr: str) -> Dict[str, int]:
+    """Cumulative microseconds per module from -X importtime output"""
+    cumulative = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line.split('|')
+        cumulative[name.strip()] = int(cumulative_us)
+    return cumulative
+
+def measure(module: str) -> Dict[str, int]:
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return parse_importtime(result.stderr)
+
+def check(module: str, budget_ms: float, runs: int) -> Dict:
+    timings = [measure(module) for _ in range(runs)]
+    best = min(timings, key=lambda t: t.get(module, 0))
+    heavy = sorted({name.split('.')[0] for name in best} & set(HEAVY_MODULES))
+    total_ms = best.get(module, 0) / 1000
+    top = sorted(((name, us) for name, us in best.items() if '.' not in name and name != module),
+                 key=lambda item: item[1], reverse=True)[:10]
+    return {
+        'import_ms': round(total_ms, 1),
+        'budget_ms': budget_ms,
+        'heavy_modules': heavy,
+        'slowest': {name: round(us / 1000, 1) for name, us in top},
+        'ok': total_ms <= budget_ms and not heavy,
+    }
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget-ms', type=float, default=400)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--save', action='store_true', help='also write bench/results/importtime-<timestamp>.json')
+    args = parser.parse_args(argv)
+
+    results = {module: check(module, args.budget_ms, args.runs) for module in ENTRY_POINTS}
+    for module, result in results.items():
+        status = 'ok' if result['ok'] else 'FAIL'
+        print(f"{module:6s} {result['import_ms']:8.1f} ms (budget {args.budget_ms:.0f} ms) {status}")
+        if result['heavy_modules']:
+            print(f"       eagerly imports: {', '.join(result['heavy_modules'])}")
+        print(f"       slowest: {result['slowest']}")
+    if args.save:
+        print(f"Saved {save_results('importtime', results)}")
+    return 0 if all(result['ok'] for result in results.values()) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
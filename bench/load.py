@@ -0,0 +1,125 @@
+"""Concurrent load generator for /process_text (or /process) against local stand-ins.
+
+    python -m bench.load --mode asgi --requests 1000 --concurrency 200 --llm-latency 0.4
+
+Starts a stub Gemini server and fake TTS/STT, serves the app in-process
+(Flask's threaded WSGI server or uvicorn for asgi.py), fires requests with
+a bounded number in flight, and reports p50/p95/p99 latency and
+throughput. Results go to bench/results/load-<timestamp>.json.
+"""
+import os
+import time
+import random
+import tempfile
+import asyncio
+import argparse
+import threading
+from bench.common import SAMPLE_QUERIES, percentiles, save_results
+from bench.stubs import start_gemini_stub, install_fakes
+
+def serve_wsgi(port: int):
+    import logging
+    from werkzeug.serving import make_server
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    from app import app
+    server = make_server('127.0.0.1', port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.shutdown
+
+def serve_asgi(port: int):
+    import uvicorn
+    from asgi import app
+    server = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=port, log_level='warning'))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    def stop():
+        server.should_exit = True
+        thread.join(timeout=5)
+    return stop
+
+def build_queries(total: int, distinct: int):
+    """Commuter traffic is repetitive: draw `total` queries from `distinct` variants"""
+    pool = []
+    for i in range(distinct):
+        base = SAMPLE_QUERIES[i % len(SAMPLE_QUERIES)]
+        pool.append(base if i < len(SAMPLE_QUERIES) else f"{base} please ({i})")
+    return [random.choice(pool) for _ in range(total)]
+
+async def run_load(base_url: str, endpoint: str, queries, concurrency: int, sessions: int):
+    import httpx
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    statuses = {}
+
+    async def one(client, i, query):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                if endpoint == 'process':
+                    response = await client.post(f"/process?session_id=bench-{i % sessions}")
+                else:
+                    response = await client.post('/process_text', json={'query': query, 'session_id': f"bench-{i % sessions}"})
+                status = response.status_code
+            except Exception as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(client, i, q) for i, q in enumerate(queries)))
+        wall = time.perf_counter() - start
+
+    return latencies, statuses, wall
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=['wsgi', 'asgi'], default='asgi')
+    parser.add_argument('--endpoint', choices=['process_text', 'process'], default='process_text')
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--distinct', type=int, default=8, help='number of distinct queries in the mix')
+    parser.add_argument('--sessions', type=int, default=100)
+    parser.add_argument('--llm-latency', type=float, default=0.4)
+    parser.add_argument('--llm-jitter', type=float, default=0.1)
+    parser.add_argument('--tts-latency', type=float, default=0.3)
+    parser.add_argument('--stt-latency', type=float, default=0.5)
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    # Keep benchmark conversations out of the real database
+    os.environ.setdefault('METRO_DB_PATH', os.path.join(tempfile.gettempdir(), 'metro_bench.db'))
+    # The app reads recordings/ and writes static/ relative to the working directory; run in a
+    # scratch one so fake audio never lands on the tracked recordings/temp.wav and static/output.mp3
+    scratch = tempfile.mkdtemp(prefix='metro-bench-')
+    os.makedirs(os.path.join(scratch, 'static'))
+    os.chdir(scratch)
+
+    gemini = start_gemini_stub(args.llm_latency, args.llm_jitter)
+    stop = serve_asgi(args.port) if args.mode == 'asgi' else serve_wsgi(args.port)
+    install_fakes(tts_latency=args.tts_latency, stt_latency=args.stt_latency)
+
+    queries = build_queries(args.requests, args.distinct)
+    latencies, statuses, wall = asyncio.run(run_load(
+        f"http://127.0.0.1:{args.port}", args.endpoint, queries, args.concurrency, args.sessions))
+    stop()
+    gemini.shutdown()
+
+    results = {
+        'config': vars(args),
+        'latency': percentiles(latencies),
+        'throughput_rps': round(len(latencies) / wall, 2),
+        'wall_seconds': round(wall, 3),
+        'statuses': {str(k): v for k, v in statuses.items()},
+        'llm_calls': gemini.RequestHandlerClass.calls,
+    }
+    print(results)
+    print(f"Saved {save_results('load', results)}")
+
+if __name__ == '__main__':
+    main()
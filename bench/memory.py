@@ -0,0 +1,85 @@
+"""Per-worker memory report: what the loaded feed and each warm-up index hold.
+
+    python -m bench.memory [--save]
+
+Runs the warm-up steps one at a time in a fresh process, recording the
+Python heap growth of each (tracemalloc, which also sees numpy and pandas
+buffers) and the resident set size after it. Then lists the in-memory size of
+every GTFS table column by column (DataFrame.memory_usage(deep=True)), so a
+column still held as object strings stands out.
+"""
+import os
+import sys
+import argparse
+import tracemalloc
+from typing import Dict, List
+from bench.common import save_results
+
+def rss_mb() -> float:
+    """Resident set size of this process in MB"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    # ru_maxrss is the peak, in KB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+def table_usage(feed) -> Dict[str, Dict]:
+    from handlers.gtfs import TABLES
+    tables = {}
+    for table in TABLES:
+        frame = getattr(feed, table)
+        usage = frame.memory_usage(deep=True, index=True)
+        tables[table] = {
+            'rows': len(frame), 'mb': round(usage.sum() / 2 ** 20, 3),
+            'columns': {column: {'dtype': str(frame[column].dtype), 'mb': round(usage[column] / 2 ** 20, 3)}
+                        for column in frame.columns},
+        }
+    return tables
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--save', action='store_true', help='also write bench/results/memory-<timestamp>.json')
+    args = parser.parse_args(argv)
+
+    from handlers.warmup import WARMUP_STEPS
+    from handlers.gtfs import get_feed
+    results = {'pid': os.getpid(), 'rss_start_mb': round(rss_mb(), 1), 'steps': {}}
+    tracemalloc.start()
+    for name, step in WARMUP_STEPS:
+        before = tracemalloc.get_traced_memory()[0]
+        try:
+            step()
+        except Exception as e:
+            results['steps'][name] = {'skipped': f"{type(e).__name__}: {e}"}
+            continue
+        results['steps'][name] = {'heap_mb': round((tracemalloc.get_traced_memory()[0] - before) / 2 ** 20, 2),
+                                  'rss_mb': round(rss_mb(), 1)}
+    results['heap_mb'] = round(tracemalloc.get_traced_memory()[0] / 2 ** 20, 2)
+    tracemalloc.stop()
+    results['rss_mb'] = round(rss_mb(), 1)
+    results['tables'] = table_usage(get_feed())
+
+    print(f"{'warm-up step':14s} {'heap MB':>9s} {'RSS MB':>8s}")
+    for name, step in results['steps'].items():
+        if 'skipped' in step:
+            print(f"{name:14s} skipped: {step['skipped']}")
+        else:
+            print(f"{name:14s} {step['heap_mb']:>9.2f} {step['rss_mb']:>8.1f}")
+    print(f"{'total':14s} {results['heap_mb']:>9.2f} {results['rss_mb']:>8.1f}\n")
+    print(f"{'table.column':36s} {'dtype':>10s} {'MB':>8s}")
+    for table, usage in results['tables'].items():
+        print(f"{table:36s} {'':>10s} {usage['mb']:>8.3f}  ({usage['rows']} rows)")
+        for column, col in usage['columns'].items():
+            print(f"  {column:34s} {col['dtype']:>10s} {col['mb']:>8.3f}")
+    if args.save:
+        print(f"Saved {save_results('memory', results)}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""Micro-benchmarks for the local (non-network) parts of a request.
+
+    python -m bench.micro [--iterations 200]
+
+Times station resolution, routing, next-train and first/last-train lookup and
+RAG search, and writes the results to bench/results/micro-<timestamp>.json.
+"""
+import time
+import argparse
+import traceback
+from datetime import time as dt_time
+from bench.common import SAMPLE_QUERIES, SAMPLE_QUERIES_HI, percentiles, save_results
+
+def run_case(fn, iterations: int, warmup: int = 3):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+def bench_station_resolution(iterations):
+    from handlers.llm import extract_stations
+    queries = iter(SAMPLE_QUERIES * (iterations + 10))
+    return run_case(lambda: extract_stations(next(queries)), iterations)
+
+def bench_station_resolution_hi(iterations):
+    from handlers.llm import extract_stations
+    queries = iter(SAMPLE_QUERIES_HI * (iterations + 10))
+    return run_case(lambda: extract_stations(next(queries), 'hi'), iterations)
+
+def bench_routing(iterations):
+    from handlers.route_finder import find_route
+    queries = iter(SAMPLE_QUERIES * (iterations + 10))
+    return run_case(lambda: find_route(next(queries)), iterations)
+
+def bench_journeys(iterations):
+    from datetime import datetime
+    from handlers.route_finder import find_multiple_routes
+    pairs = iter([("Rajiv Chowk", "Kashmere Gate"), ("Dwarka Sector - 21", "Noida Electronic City"),
+                  ("Dilshad Garden", "Hauz Khas"), ("Janak Puri West", "Kalkaji Mandir")] * (iterations + 10))
+    when = datetime.now().replace(hour=9, minute=0)
+    return run_case(lambda: find_multiple_routes(*next(pairs), max_routes=5, when=when), iterations)
+
+def bench_reachable(iterations):
+    from datetime import datetime
+    from handlers.gtfs import get_feed
+    from handlers.isochrone import reachable
+    stop_ids = iter(list(get_feed().stops['stop_id'])[:50] * (iterations + 10))
+    when = datetime.now().replace(hour=9, minute=0)
+    return run_case(lambda: reachable(next(stop_ids), when, 30), iterations)
+
+def bench_next_trains(iterations):
+    from handlers.schedule import MetroSchedule
+    schedule = MetroSchedule()
+    station_ids = list(schedule.stops['stop_id'])[:50]
+    ids = iter(station_ids * (iterations // len(station_ids) + 10))
+    return run_case(lambda: schedule.get_next_trains(next(ids), dt_time(9, 0)), iterations)
+
+def bench_service_hours(iterations):
+    from handlers.gtfs import get_feed
+    from handlers.service_hours import station_hours
+    station_ids = list(get_feed().stops['stop_id'])[:50]
+    ids = iter(station_ids * (iterations // len(station_ids) + 10))
+    return run_case(lambda: station_hours(next(ids)), iterations)
+
+def bench_rag_search(iterations):
+    from handlers.rag import MetroRAG
+    rag = MetroRAG()
+    queries = iter(SAMPLE_QUERIES * (iterations + 10))
+    return run_case(lambda: rag.search(next(queries)), iterations)
+
+def bench_rag_enhance(iterations):
+    from handlers.rag import enhance_response_with_rag
+    queries = iter(SAMPLE_QUERIES * (iterations + 10))
+    return run_case(lambda: enhance_response_with_rag(next(queries), "Take the Yellow line."), iterations)
+
+CASES = {
+    'station_resolution': bench_station_resolution,
+    'station_resolution_hi': bench_station_resolution_hi,
+    'routing': bench_routing,
+    'journeys': bench_journeys,
+    'reachable': bench_reachable,
+    'next_trains': bench_next_trains,
+    'service_hours': bench_service_hours,
+    'rag_search': bench_rag_search,
+    'rag_enhance': bench_rag_enhance,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--only', nargs='*', choices=sorted(CASES), help='run a subset of cases')
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.only or CASES:
+        try:
+            results[name] = CASES[name](args.iterations)
+        except Exception as e:
+            # Missing GTFS files or optional dependencies skip a case instead of aborting the run
+            results[name] = {'skipped': f"{type(e).__name__}: {e}"}
+            traceback.print_exc(limit=1)
+        print(f"{name:20s} {results[name]}")
+
+    print(f"Saved {save_results('micro', results)}")
+
+if __name__ == '__main__':
+    main()
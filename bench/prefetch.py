@@ -0,0 +1,99 @@
+"""Speculative prefetch: hit rate and follow-up latency, with and without it.
+
+    python -m bench.prefetch [--sessions 30] [--think 0.5] [--llm-latency 0.1] [--save]
+
+Seeds route_history with a few destinations per origin, then replays
+conversations through /process_text against the stub Gemini server: a route
+question, then after `--think` seconds the follow-ups a commuter tends to ask
+about the origin (next train, fare to a usual destination, facilities). Each
+session uses its own stations, so the answer cache cannot serve follow-ups.
+The same conversations run with prefetching off and on. The report compares
+the handler time spent on follow-ups and gives the prefetcher's hit rate.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+from typing import Dict, List
+from bench.common import percentiles, save_results
+from bench.stubs import start_gemini_stub
+
+FOLLOWUPS = ("Next train at {origin}", "What is the fare from {origin} to {usual}",
+             "Tell me about the facilities at {origin}")
+
+def conversations(stations: List[str], sessions: int, seed: int = 0) -> List[Dict]:
+    rng = random.Random(seed)
+    picked = rng.sample(stations, min(len(stations), sessions * 3))
+    return [{'origin': picked[3 * i], 'to': picked[3 * i + 1], 'usual': picked[3 * i + 2]}
+            for i in range(len(picked) // 3)]
+
+def replay(client, plan: List[Dict], think: float, tag: str) -> Dict:
+    from handlers.metrics import STAGE_SECONDS
+    handler_seconds = []
+    for i, trip in enumerate(plan):
+        session = f"{tag}-{i}"
+        client.post('/process_text', json={'query': f"Route from {trip['origin']} to {trip['to']}",
+                                           'session_id': session})
+        time.sleep(think)
+        for followup in FOLLOWUPS:
+            before = _handler_total(STAGE_SECONDS)
+            client.post('/process_text', json={'query': followup.format(**trip), 'session_id': session})
+            handler_seconds.append(_handler_total(STAGE_SECONDS) - before)
+    return percentiles(handler_seconds)
+
+def _handler_total(histogram) -> float:
+    with histogram._lock:
+        return sum(total for label, (_, total, _) in histogram._series.items() if label.startswith('handler.'))
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=30, help='conversations per run')
+    parser.add_argument('--think', type=float, default=0.5, help='seconds between the route question and follow-ups')
+    parser.add_argument('--llm-latency', type=float, default=0.1, help='stub LLM latency in seconds')
+    parser.add_argument('--save', action='store_true', help='also write bench/results/prefetch-<timestamp>.json')
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('METRO_DB_PATH', os.path.join(tempfile.mkdtemp(), 'prefetch.db'))
+    os.environ.setdefault('SESSION_RATE_PER_MINUTE', '0')
+    server = start_gemini_stub(latency=args.llm_latency)
+    from app import app
+    from handlers import prefetch
+    from handlers.database import get_database
+    from handlers.gtfs import station_names
+    from handlers.warmup import warm_up
+    warm_up()
+    client = app.test_client()
+
+    results = {}
+    try:
+        for enabled in (False, True):
+            prefetch.PREFETCH_ENABLED = enabled
+            plan = conversations(station_names(), args.sessions, seed=int(enabled))
+            db = get_database()
+            for trip in plan:
+                # Other commuters' searches from this origin, most often to the usual destination
+                for _ in range(3):
+                    db.save_route_search('history', trip['origin'], trip['usual'])
+                db.save_route_search('history', trip['origin'], trip['to'])
+            db.flush()
+            name = 'prefetch_on' if enabled else 'prefetch_off'
+            results[name] = replay(client, plan, args.think, name)
+        results['prefetcher'] = prefetch.prefetcher.stats()
+    finally:
+        server.shutdown()
+
+    print(f"{'follow-up handler time':24s} {'p50 ms':>8s} {'p95 ms':>8s} {'mean ms':>8s}")
+    for name in ('prefetch_off', 'prefetch_on'):
+        r = results[name]
+        print(f"{name:24s} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['mean_ms']:>8.2f}")
+    stats = results['prefetcher']
+    print(f"prefetched {stats['computed']} results, {stats['used']} used ({stats['hit_rate']:.0%}), "
+          f"{stats['hits']} hits, {stats['dropped']} dropped over budget")
+    if args.save:
+        print(f"Saved {save_results('prefetch', results)}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
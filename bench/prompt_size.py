@@ -0,0 +1,89 @@
+"""Response-prompt size and LLM latency: compact summaries against indented JSON.
+
+    python -m bench.prompt_size [--calls 10] [--latency 0.2] [--per-1k-tokens 0.1] [--save]
+
+Builds the handler results the agent produces for typical queries, then
+compares the response prompt built from `json.dumps(results, indent=2)` (the
+previous prompt) with the one built from prompt.summarize_results. Reports
+characters and estimated tokens per prompt, the cost of summarizing, and the
+LLM round trip against the local Gemini stub, whose latency grows with prompt
+length by `--per-1k-tokens` seconds per 1000 tokens.
+"""
+import sys
+import json
+import time
+import argparse
+from typing import Dict, List
+from bench.common import percentiles, save_results
+from bench.stubs import start_gemini_stub
+
+SCENARIOS = [
+    ('route', [{"action": "find_route", "from": "Rajiv Chowk", "to": "Kashmere Gate"},
+               {"action": "calculate_fare", "from": "Rajiv Chowk", "to": "Kashmere Gate"},
+               {"action": "get_schedule", "from": "Rajiv Chowk", "to": "Kashmere Gate"}]),
+    ('step_free_route', [{"action": "find_route", "from": "Rajiv Chowk", "to": "Dwarka Sector - 21", "accessible": True},
+                         {"action": "calculate_fare", "from": "Rajiv Chowk", "to": "Dwarka Sector - 21"},
+                         {"action": "get_schedule", "from": "Rajiv Chowk", "to": "Dwarka Sector - 21"}]),
+    ('fare', [{"action": "calculate_fare", "from": "Vaishali", "to": "Botanical Garden"}]),
+    ('station_info', [{"action": "get_station_info", "station": "Rajiv Chowk"}]),
+]
+
+def legacy_response_prompt(query: str, results: List[Dict]) -> str:
+    """The English response prompt as it was before results were summarized"""
+    return f"""
+            You are a Delhi Metro assistant. User query: {query}
+            Results: {json.dumps(results, indent=2)}
+
+            Based on these results, provide a clear, helpful, and detailed response in English.
+            Include route information, timing, fare, and other relevant details.
+            Use natural, conversational language without any formatting symbols or markdown.
+            """
+
+def time_calls(fn, calls: int):
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=10, help='LLM calls per prompt variant and scenario')
+    parser.add_argument('--latency', type=float, default=0.2, help='stub LLM base latency in seconds')
+    parser.add_argument('--per-1k-tokens', type=float, default=0.1, help='stub LLM seconds per 1000 prompt tokens')
+    parser.add_argument('--save', action='store_true', help='also write bench/results/prompt_size-<timestamp>.json')
+    args = parser.parse_args(argv)
+
+    server = start_gemini_stub(latency=args.latency, per_1k_tokens=args.per_1k_tokens)
+    from handlers.agent import MetroAgent
+    from handlers.prompt import estimate_tokens, summarize_results
+    agent = MetroAgent()
+    results = {}
+    try:
+        for name, actions in SCENARIOS:
+            query = f"{name.replace('_', ' ')}: {actions[0].get('from') or actions[0].get('station')}"
+            handler_results = agent.execute_actions(actions)
+            legacy = legacy_response_prompt(query, handler_results)
+            compact = agent._response_prompt(query, handler_results, 'en')
+            results[name] = {
+                'legacy_chars': len(legacy), 'compact_chars': len(compact),
+                'legacy_tokens': estimate_tokens(legacy), 'compact_tokens': estimate_tokens(compact),
+                'reduction': round(1 - len(compact) / len(legacy), 3),
+                'summarize': time_calls(lambda: summarize_results(handler_results), 200),
+                'legacy_llm': time_calls(lambda: agent._call_llm(legacy), args.calls),
+                'compact_llm': time_calls(lambda: agent._call_llm(compact), args.calls),
+            }
+    finally:
+        server.shutdown()
+
+    print(f"{'scenario':16s} {'tokens':>15s} {'reduction':>9s} {'summarize p50':>13s} {'LLM p50 (ms)':>17s}")
+    for name, r in results.items():
+        print(f"{name:16s} {r['legacy_tokens']:>6d} -> {r['compact_tokens']:<5d} {r['reduction']:>9.0%} "
+              f"{r['summarize']['p50_ms']:>10.3f} ms {r['legacy_llm']['p50_ms']:>7.0f} -> {r['compact_llm']['p50_ms']:<7.0f}")
+    if args.save:
+        print(f"Saved {save_results('prompt_size', results)}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
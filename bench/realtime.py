@@ -0,0 +1,118 @@
+"""GTFS-Realtime delay overlay: update-apply latency and its effect on queries.
+
+    python -m bench.realtime [--trips 50 200 1000] [--updates 20] [--save]
+
+Writes synthetic TripUpdates messages (JSON FeedMessage, as a local file
+standing in for GTFS_RT_TRIP_UPDATES_URL) delaying `--trips` trips running
+around 09:00, then times reading, parsing and applying each one with
+realtime.poll_once. Each update moves the delays, so every apply rebuilds the
+overlay for the trips it names. Also reports journey and next-train latency
+with the overlay in place against the plain timetable, and checks that a
+delayed first leg shows up in the planned journey.
+"""
+import os
+import sys
+import json
+import random
+import argparse
+import tempfile
+from datetime import datetime, time as dt_time
+from typing import Dict, List
+from bench.common import percentiles, save_results
+from bench.micro import run_case
+
+def trip_updates(trip_ids: List, seed: int) -> Dict:
+    """A FeedMessage delaying each trip from a random stop on, with a few cancellations"""
+    rng = random.Random(seed)
+    entities = []
+    for trip_id in trip_ids:
+        trip = {'tripId': str(trip_id)}
+        if rng.random() < 0.05:
+            trip['scheduleRelationship'] = 'CANCELED'
+            entities.append({'id': str(trip_id), 'tripUpdate': {'trip': trip}})
+            continue
+        delay = rng.randint(1, 15) * 60
+        update = {'trip': trip, 'stopTimeUpdate': [{'stopSequence': rng.randint(1, 5),
+                                                    'arrival': {'delay': delay}, 'departure': {'delay': delay}}]}
+        entities.append({'id': str(trip_id), 'tripUpdate': update})
+    return {'header': {'gtfsRealtimeVersion': '2.0', 'timestamp': int(datetime.now().timestamp())},
+            'entity': entities}
+
+def morning_trips(limit: int) -> List:
+    """Trips of the full timetable that are running at 09:00"""
+    from handlers.journey import get_timetable
+    found = []
+    for pattern in get_timetable().patterns:
+        for t, trip_id in enumerate(pattern.trip_ids):
+            if pattern.departures[t][0] <= 9 * 3600 <= pattern.arrivals[t][-1]:
+                found.append(trip_id)
+    random.Random(0).shuffle(found)
+    return found[:limit]
+
+def bench_queries(iterations: int) -> Dict:
+    from handlers.route_finder import find_multiple_routes
+    from handlers.schedule import MetroSchedule
+    when = datetime.now().replace(hour=9, minute=0)
+    schedule = MetroSchedule()
+    station_ids = list(schedule.stops['stop_id'])[:50]
+    ids = iter(station_ids * (iterations // len(station_ids) + 10))
+    return {'journeys': run_case(lambda: find_multiple_routes('Rajiv Chowk', 'Kashmere Gate', max_routes=5,
+                                                              when=when), iterations),
+            'next_trains': run_case(lambda: schedule.get_next_trains(next(ids), dt_time(9, 0)), iterations)}
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--trips', type=int, nargs='*', default=[50, 200, 1000], help='delayed trips per update')
+    parser.add_argument('--updates', type=int, default=20, help='updates applied per size')
+    parser.add_argument('--iterations', type=int, default=50, help='queries timed with and without delays')
+    parser.add_argument('--save', action='store_true', help='also write bench/results/realtime-<timestamp>.json')
+    args = parser.parse_args(argv)
+
+    from handlers import realtime
+    from handlers.journey import get_timetable
+    get_timetable().view(None)
+    results = {'scheduled': bench_queries(args.iterations)}
+    path = os.path.join(tempfile.mkdtemp(), 'trip_updates.json')
+    for size in args.trips:
+        trip_ids = morning_trips(size)
+        samples = []
+        for seed in range(args.updates):
+            with open(path, 'w') as f:
+                json.dump(trip_updates(trip_ids, seed), f)
+            status = realtime.poll_once(path)
+            samples.append(status['last_seconds']['parse'] + status['last_seconds']['apply'])
+        results[f"apply_{size}_trips"] = dict(percentiles(samples), delayed=status['delayed_trips'],
+                                               cancelled=status['cancelled_trips'],
+                                               patterns_touched=status['patterns_touched'])
+    results['delayed'] = bench_queries(args.iterations)
+
+    # Delaying every trip by ten minutes must show on the planned journey and be undone by clearing
+    from handlers.route_finder import find_multiple_routes
+    when = datetime.now().replace(hour=9, minute=0, second=0)
+    realtime.clear_delays()
+    before = find_multiple_routes('Rajiv Chowk', 'Kashmere Gate', 1, when)['routes'][0]['legs'][0]
+    every_trip = [trip_id for pattern in get_timetable().patterns for trip_id in pattern.trip_ids]
+    realtime.apply_trip_updates({'entity': [{'id': str(trip_id), 'tripUpdate': {'trip': {'tripId': str(trip_id)},
+                                                                               'delay': 600}}
+                                            for trip_id in every_trip]})
+    delayed = find_multiple_routes('Rajiv Chowk', 'Kashmere Gate', 1, when)['routes'][0]['legs'][0]
+    realtime.clear_delays()
+    after = find_multiple_routes('Rajiv Chowk', 'Kashmere Gate', 1, when)['routes'][0]['legs'][0]
+    results['check'] = {'scheduled': before['departure_time'], 'delayed': delayed['departure_time'],
+                        'delay_minutes': delayed.get('delay_minutes'), 'cleared': after['departure_time']}
+    print(f"First leg departs {before['departure_time']}, {delayed['departure_time']} with every trip "
+          f"{delayed.get('delay_minutes')} min late, {after['departure_time']} once cleared")
+
+    print(f"{'case':22s} {'p50 ms':>9s} {'p95 ms':>9s} {'max ms':>9s}")
+    for name, r in results.items():
+        if name == 'check':
+            continue
+        rows = r.items() if name in ('scheduled', 'delayed') else [('', r)]
+        for sub, stats in rows:
+            print(f"{(name + ' ' + sub).strip():22s} {stats['p50_ms']:>9.3f} {stats['p95_ms']:>9.3f} {stats['max_ms']:>9.3f}")
+    if args.save:
+        print(f"Saved {save_results('realtime', results)}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""Local stand-ins for Gemini, edge-tts, speech recognition and the microphone.
+
+Each stand-in sleeps for a configurable latency so benchmarks can model the
+real services without network access:
+
+    server = start_gemini_stub(latency=0.4)   # sets GEMINI_API_BASE
+    server = start_gemini_stub(latency=0.2, per_1k_tokens=0.1)   # prompt-length dependent
+    install_fakes(tts_latency=0.3, stt_latency=0.5)
+"""
+import os
+import re
+import json
+import time
+import wave
+import random
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class LatencyModel:
+    """Fixed latency with optional uniform jitter, plus time per 1000 prompt tokens, in seconds"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, per_1k_tokens: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.per_1k_tokens = per_1k_tokens
+
+    def sample(self, tokens: int = 0) -> float:
+        return max(0.0, self.latency + random.uniform(-self.jitter, self.jitter) + tokens / 1000 * self.per_1k_tokens)
+
+def _stub_answer(prompt: str) -> str:
+    """Mimic Gemini: intent JSON for classification prompts, plain prose otherwise"""
+    if 'classify the intent' in prompt:
+        from handlers.llm import find_stations
+        from handlers.cache import guess_intent
+        match = re.search(r'Query: "(.*)"', prompt)
+        query = match.group(1) if match else ''
+        # A single station ("next train at X") is the from_station, as Gemini returns it
+        found = find_stations(query)
+        start, end = (found + [None, None])[:2]
+        return json.dumps({
+            "intent": guess_intent(query, 2 if start and end else 0),
+            "entities": {"from_station": start or "", "to_station": end or "", "time": "", "line": ""},
+            "confidence": 0.9,
+            "requires_followup": False
+        })
+    return ("You can take the metro directly. The journey takes about 25 minutes "
+            "and the fare is 30 rupees, or 27 rupees with a smart card.")
+
+class _GeminiHandler(BaseHTTPRequestHandler):
+    latency = LatencyModel()
+    calls = 0
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length) or b'{}')
+        prompt = body.get('contents', [{}])[0].get('parts', [{}])[0].get('text', '')
+        time.sleep(self.latency.sample(len(prompt) // 4))
+        type(self).calls += 1
+        payload = json.dumps({
+            "candidates": [{"content": {"parts": [{"text": _stub_answer(prompt)}]}}],
+            "usageMetadata": {"promptTokenCount": len(prompt) // 4}
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+def start_gemini_stub(latency: float = 0.3, jitter: float = 0.0, port: int = 0,
+                      per_1k_tokens: float = 0.0) -> ThreadingHTTPServer:
+    """Serve a fake generateContent API on localhost and point the app at it"""
+    handler = type('GeminiHandler', (_GeminiHandler,),
+                   {'latency': LatencyModel(latency, jitter, per_1k_tokens), 'calls': 0})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ['GEMINI_API_BASE'] = base
+    os.environ.setdefault('GEMINI_API_KEY', 'stub')
+    # Modules already imported keep their URL constant, so update it in place too
+    import handlers.llm as llm
+    llm.GEMINI_API_BASE = base
+    llm.GEMINI_URL = f"{base}/v1beta/models/gemini-2.0-flash:generateContent"
+    if not llm.api_key:
+        llm.api_key = 'stub'
+    return server
+
+class FakeCommunicate:
+    """Drop-in for edge_tts.Communicate that writes a short silent MP3 frame"""
+    latency = LatencyModel()
+
+    def __init__(self, text, voice):
+        self.text = text
+        self.voice = voice
+
+    async def save(self, path):
+        await asyncio.sleep(self.latency.sample())
+        with open(path, 'wb') as f:
+            f.write(b'\xff\xfb\x90\x00' + b'\x00' * 413)
+
+def _fake_recording(path):
+    with wave.open(path, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(16000)
+        w.writeframes(b'\x00\x00' * 1600)
+
+def install_fakes(tts_latency: float = 0.3, stt_latency: float = 0.5, record_latency: float = 0.0,
+                  transcript: str = "How do I get from Rajiv Chowk to Kashmere Gate"):
+    """Replace edge-tts, Google STT and the microphone with local fakes"""
+    import edge_tts
+    import handlers.stt as stt
+    import handlers.audio as audio
+
+    FakeCommunicate.latency = LatencyModel(tts_latency)
+    # handlers.tts imports Communicate on each call, so patching the package is enough
+    edge_tts.Communicate = FakeCommunicate
+
+    stt_model = LatencyModel(stt_latency)
+
+    def fake_stt(wav_path):
+        time.sleep(stt_model.sample())
+        return transcript
+
+    record_model = LatencyModel(record_latency)
+
+    def fake_record(filename='temp.wav', duration=5, sample_rate=44100):
+        os.makedirs('recordings', exist_ok=True)
+        path = os.path.join('recordings', filename)
+        time.sleep(record_model.sample())
+        _fake_recording(path)
+        return path
+
+    # Both stt_transcribe and stt_transcribe_async call _transcribe once admitted, so the
+    # fake sits behind the same admission budgets as the real client
+    stt._transcribe = fake_stt
+    audio.record_audio = fake_record
+    # app.py and asgi.py bind record_audio at import time
+    import sys
+    for name in ('app', 'asgi'):
+        module = sys.modules.get(name)
+        if module is None:
+            continue
+        if hasattr(module, 'record_audio'):
+            module.record_audio = fake_record
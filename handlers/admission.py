@@ -0,0 +1,237 @@
+import os
+import math
+import time
+import asyncio
+import threading
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, List
+
+class Overloaded(Exception):
+    """A request was shed: a stage queue was full or timed out, or the session is over its rate"""
+
+    def __init__(self, stage: str, reason: str, retry_after: float):
+        super().__init__(f"{stage} overloaded ({reason})")
+        self.stage = stage
+        self.reason = reason
+        self.retry_after = retry_after
+
+class _Waiter:
+    __slots__ = ('event', 'loop', 'future', 'granted')
+
+    def __init__(self, loop=None):
+        self.loop = loop
+        self.future = loop.create_future() if loop else None
+        self.event = None if loop else threading.Event()
+        self.granted = False
+
+    def grant(self) -> bool:
+        """Hand a slot to this waiter; called with the gate lock held"""
+        self.granted = True
+        if self.event is not None:
+            self.event.set()
+            return True
+        try:
+            self.loop.call_soon_threadsafe(_wake, self.future)
+            return True
+        except RuntimeError:
+            # The waiter's event loop has closed
+            self.granted = False
+            return False
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+class StageGate:
+    """Admits at most `limit` concurrent calls to one stage; up to `queue_limit` more wait
+    in FIFO order for at most `max_wait` seconds, anything beyond that is shed.
+
+    Threads and coroutines share one gate, so the WSGI and ASGI servers are governed together.
+    """
+
+    def __init__(self, stage: str, limit: int, queue_limit: int, max_wait: float):
+        self.stage = stage
+        self.limit = limit
+        self.queue_limit = queue_limit
+        self.max_wait = max_wait
+        self.active = 0
+        self.admitted = self.queued = self.shed_queue_full = self.shed_timeout = self.max_depth = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    def _enter(self, waiter: _Waiter) -> bool:
+        """True if admitted at once, False if queued; raises Overloaded if the queue is full"""
+        with self._lock:
+            if self.active < self.limit and not self._waiters:
+                self.active += 1
+                self.admitted += 1
+                return True
+            if len(self._waiters) >= self.queue_limit:
+                self.shed_queue_full += 1
+                raise Overloaded(self.stage, 'queue_full', self.max_wait)
+            self._waiters.append(waiter)
+            self.queued += 1
+            self.max_depth = max(self.max_depth, len(self._waiters))
+            return False
+
+    def _settle(self, waiter: _Waiter):
+        """After a wait: proceed if a slot was handed over, otherwise leave the queue and shed"""
+        with self._lock:
+            if waiter.granted:
+                self.admitted += 1
+                return
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                pass
+            self.shed_timeout += 1
+        raise Overloaded(self.stage, 'timeout', self.max_wait)
+
+    def acquire(self):
+        waiter = _Waiter()
+        if not self._enter(waiter):
+            waiter.event.wait(self.max_wait)
+            self._settle(waiter)
+
+    async def acquire_async(self):
+        waiter = _Waiter(asyncio.get_running_loop())
+        if self._enter(waiter):
+            return
+        try:
+            await asyncio.wait({waiter.future}, timeout=self.max_wait)
+        except asyncio.CancelledError:
+            # Client went away while queued: give back a slot handed over in the meantime
+            with self._lock:
+                granted = waiter.granted
+                if not granted and waiter in self._waiters:
+                    self._waiters.remove(waiter)
+            if granted:
+                self.release()
+            raise
+        self._settle(waiter)
+
+    def release(self):
+        with self._lock:
+            # Pass the slot straight to the next waiter, so active only drops when nobody is queued
+            while self._waiters:
+                if self._waiters.popleft().grant():
+                    return
+            self.active -= 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'limit': self.limit, 'active': self.active, 'queue_depth': len(self._waiters),
+                    'max_queue_depth': self.max_depth, 'admitted': self.admitted, 'queued': self.queued,
+                    'shed_queue_full': self.shed_queue_full, 'shed_timeout': self.shed_timeout}
+
+def _stage_gate(stage: str, limit: int, queue_limit: int) -> StageGate:
+    prefix = f"ADMISSION_{stage.upper()}"
+    return StageGate(stage, int(os.getenv(f"{prefix}_CONCURRENCY", limit)),
+                     int(os.getenv(f"{prefix}_QUEUE", queue_limit)),
+                     float(os.getenv(f"{prefix}_MAX_WAIT", os.getenv('ADMISSION_MAX_WAIT', '5'))))
+
+# Per-stage budgets; the server has one microphone, so recordings run one at a time
+GATES = {
+    'record': _stage_gate('record', 1, 4),
+    'stt': _stage_gate('stt', 4, 16),
+    'llm': _stage_gate('llm', 32, 128),
+    'tts': _stage_gate('tts', 8, 32),
+}
+
+@contextmanager
+def admit(stage: str):
+    """Hold one of `stage`'s slots for the duration of the block (may wait, may raise Overloaded)"""
+    gate = GATES[stage]
+    gate.acquire()
+    try:
+        yield
+    finally:
+        gate.release()
+
+@asynccontextmanager
+async def admit_async(stage: str):
+    gate = GATES[stage]
+    await gate.acquire_async()
+    try:
+        yield
+    finally:
+        gate.release()
+
+class TokenBucket:
+    __slots__ = ('tokens', 'updated')
+
+    def __init__(self, tokens: float, now: float):
+        self.tokens = tokens
+        self.updated = now
+
+class SessionLimiter:
+    """Per-session token buckets: `rate` tokens per second, bursts of up to `burst`"""
+
+    def __init__(self, rate: float, burst: float, max_sessions: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_sessions = max_sessions
+        self.limited = 0
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, cost: float = 1.0):
+        """Spend `cost` tokens from `key`'s bucket or raise Overloaded with the wait until it could"""
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.pop(key, None) or TokenBucket(self.burst, now)
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+            bucket.updated = now
+            self._buckets[key] = bucket
+            # Least recently seen sessions go first; a forgotten session just starts with a full bucket
+            while len(self._buckets) > self.max_sessions:
+                self._buckets.popitem(last=False)
+            if bucket.tokens >= cost:
+                bucket.tokens -= cost
+                return
+            self.limited += 1
+            retry_after = (cost - bucket.tokens) / self.rate
+        raise Overloaded('session', 'rate_limited', retry_after)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'sessions': len(self._buckets), 'rate_limited': self.limited}
+
+# Default: 30 requests a minute per session with bursts of 10; /process costs more than text
+session_limiter = SessionLimiter(float(os.getenv('SESSION_RATE_PER_MINUTE', '30')) / 60,
+                                 float(os.getenv('SESSION_BURST', '10')))
+ENDPOINT_COST = {'process': 3.0, 'process_text': 1.0}
+
+def check_rate(endpoint: str, session_id: str, client: str):
+    """Charge one `endpoint` request to its session; anonymous callers are limited per client address"""
+    key = session_id if session_id and session_id != 'anonymous' else f"ip:{client}"
+    session_limiter.take(key, ENDPOINT_COST[endpoint])
+
+def admission_stats() -> Dict:
+    return {'stages': {stage: gate.stats() for stage, gate in GATES.items()}, 'sessions': session_limiter.stats()}
+
+def retry_after_seconds(error: Overloaded) -> int:
+    """Whole seconds to wait, at least one"""
+    return max(1, math.ceil(error.retry_after))
+
+def overload_body(error: Overloaded) -> Dict:
+    return {'error': 'Too many requests, please retry shortly', 'stage': error.stage, 'reason': error.reason,
+            'retry_after': retry_after_seconds(error)}
+
+def metrics_lines() -> List[str]:
+    """Per-stage gauges and shed counters for /metrics"""
+    stats = {stage: gate.stats() for stage, gate in GATES.items()}
+    lines = []
+    for key, kind in (('active', 'gauge'), ('limit', 'gauge'), ('queue_depth', 'gauge'), ('max_queue_depth', 'gauge'),
+                      ('admitted', 'counter'), ('queued', 'counter'), ('shed_queue_full', 'counter'),
+                      ('shed_timeout', 'counter')):
+        name = f"metro_admission_{key}" + ('_total' if kind == 'counter' else '')
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(f'{name}{{stage="{stage}"}} {values[key]}' for stage, values in stats.items())
+    session = session_limiter.stats()
+    lines += ['# TYPE metro_session_rate_limited_total counter', f"metro_session_rate_limited_total {session['rate_limited']}",
+              '# TYPE metro_session_buckets gauge', f"metro_session_buckets {session['sessions']}"]
+    return lines
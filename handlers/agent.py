@@ -1,22 +1,42 @@
 import os
 import json
-import requests
+import asyncio
 from typing import Dict, List, Any
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
-from handlers.llm import clean_text_for_tts, extract_stations, clarification_prompt
+from handlers.metrics import span
+from handlers.prompt import summarize_results
+from handlers.admission import admit
+from handlers.prefetch import prefetched_result
+from handlers.llm import (clean_text_for_tts, extract_stations, clarification_prompt, gemini_request, call_llm_async,
+                          canonical_station, LLM_TIMEOUT)
 
 load_dotenv()
 api_key = os.getenv('GEMINI_API_KEY')
 
+LLM_UNAVAILABLE = "I'm sorry, I couldn't process your request at the moment."
+
 class MetroAgent:
-    def __init__(self):
-        self.conversation_history = []
-        self.user_context = {}
+    def __init__(self, context=None):
+        # A SessionContext carries history, entities and results across requests
+        self.context = context
+        self.conversation_history = context.history if context else []
+        self.user_context = context.user_context if context else {}
         
     def classify_intent(self, query: str) -> Dict[str, Any]:
         """Classify user intent and extract relevant information"""
-        prompt = f"""
+        with span('intent_classification'):
+            response = self._call_llm(self._intent_prompt(query))
+        return self._parse_intent(response)
+    
+    async def classify_intent_async(self, query: str) -> Dict[str, Any]:
+        """Async variant of classify_intent"""
+        with span('intent_classification'):
+            response = await self._call_llm_async(self._intent_prompt(query))
+        return self._parse_intent(response)
+    
+    def _intent_prompt(self, query: str) -> str:
+        return f"""
         Analyze this Delhi Metro query and classify the intent:
         Query: "{query}"
         
@@ -26,12 +46,19 @@ class MetroAgent:
         - confidence: 0.0-1.0
         - requires_followup: true/false
         """
-        
-        response = self._call_llm(prompt)
+    
+    def _parse_intent(self, response: str) -> Dict[str, Any]:
         try:
-            return json.loads(response)
+            intent_data = json.loads(response)
         except:
             return {"intent": "route_finding", "entities": {}, "confidence": 0.5, "requires_followup": False}
+        # For Hindi queries the LLM may name stations in Devanagari; the handlers need GTFS names
+        entities = intent_data.get("entities") if isinstance(intent_data, dict) else None
+        if isinstance(entities, dict):
+            for key in ("from_station", "to_station"):
+                if isinstance(entities.get(key), str):
+                    entities[key] = canonical_station(entities[key])
+        return intent_data
     
     def plan_actions(self, intent: str, entities: Dict) -> List[Dict]:
         """Plan the sequence of actions needed"""
@@ -41,7 +68,11 @@ class MetroAgent:
             if not entities.get("from_station") or not entities.get("to_station"):
                 actions.append({"action": "clarify_stations", "message": "Please specify your starting and destination stations"})
             else:
-                actions.append({"action": "find_route", "from": entities["from_station"], "to": entities["to_station"]})
+                route = {"action": "find_route", "from": entities["from_station"], "to": entities["to_station"]}
+                # The same source as the answer-cache key, so cached answers match their key
+                if self.context and self.context.needs_step_free():
+                    route["accessible"] = True
+                actions.append(route)
                 actions.append({"action": "calculate_fare", "from": entities["from_station"], "to": entities["to_station"]})
                 actions.append({"action": "get_schedule", "from": entities["from_station"], "to": entities["to_station"]})
         
@@ -61,6 +92,9 @@ class MetroAgent:
         action_type = action["action"]
         
         if action_type == "find_route":
+            if action.get("accessible"):
+                from handlers.route_finder import find_multiple_routes
+                return find_multiple_routes(action['from'], action['to'], accessible=True)
             from handlers.route_finder import find_route
             return find_route(f"from {action['from']} to {action['to']}")
         
@@ -70,7 +104,8 @@ class MetroAgent:
         
         elif action_type == "get_schedule":
             from handlers.schedule import get_schedule
-            return get_schedule(action.get('from', ''), action.get('to', ''))
+            # Schedule intents name their station as 'station', routes as 'from'/'to'
+            return get_schedule(action.get('from') or action.get('station', ''), action.get('to', ''))
         
         elif action_type == "get_station_info":
             from handlers.station_info import get_station_details
@@ -83,65 +118,120 @@ class MetroAgent:
         
         return {"error": "Unknown action"}
     
+    def execute_actions(self, actions: List[Dict]) -> List[Dict]:
+        """Execute a planned sequence of actions, reusing results cached in the session"""
+        results = []
+        for action in actions:
+            result = self.context.get_result(action) if self.context else None
+            if result is None:
+                result = prefetched_result(action)
+            if result is None:
+                with span(f"handler.{action['action']}"):
+                    result = self.execute_action(action)
+                if self.context:
+                    self.context.put_result(action, result)
+            results.append(result)
+        return results
+    
+    def resolve_intent(self, query: str) -> Dict[str, Any]:
+        """Follow-ups are answered from session context, anything else is classified by the LLM"""
+        if self.context:
+            intent_data = self.context.followup_intent(query, self.user_context.get('lang', 'en'))
+            if intent_data:
+                return intent_data
+        return self.classify_intent(query)
+    
+    async def resolve_intent_async(self, query: str) -> Dict[str, Any]:
+        """Async variant of resolve_intent"""
+        if self.context:
+            intent_data = await asyncio.to_thread(self.context.followup_intent, query, self.user_context.get('lang', 'en'))
+            if intent_data:
+                return intent_data
+        return await self.classify_intent_async(query)
+    
+    def remember(self, query: str, intent_data: Dict, response: str):
+        if self.context:
+            self.context.remember(query, intent_data, response)
+    
     def generate_response(self, query: str, results: List[Dict], lang: str = 'en') -> str:
         """Generate natural language response from action results"""
-        context = f"User query: {query}\nResults: {json.dumps(results, indent=2)}"
-        
+        with span('llm_generate'):
+            response = self._call_llm(self._response_prompt(query, results, lang))
+        # Clean the response for TTS
+        return clean_text_for_tts(response)
+    
+    async def generate_response_async(self, query: str, results: List[Dict], lang: str = 'en') -> str:
+        """Async variant of generate_response"""
+        with span('llm_generate'):
+            response = await self._call_llm_async(self._response_prompt(query, results, lang))
+        return clean_text_for_tts(response)
+    
+    def _response_prompt(self, query: str, results: List[Dict], lang: str) -> str:
+        # Compact summary under a token budget; the LLM does not need ids, nulls or every next train
+        summary = summarize_results(results)
         if lang == 'hi':
-            prompt = f"""
+            return f"""
             आप दिल्ली मेट्रो सहायक हैं। उपयोगकर्ता का प्रश्न: {query}
-            परिणाम: {json.dumps(results, indent=2)}
+            परिणाम (किराया ₹ में): {summary}
             
             इन परिणामों को आधार बनाकर एक स्पष्ट, सहायक और विस्तृत उत्तर हिंदी में दें।
             मार्ग, समय, किराया, और अन्य महत्वपूर्ण जानकारी शामिल करें।
             सादा पाठ में उत्तर दें, कोई विशेष स्वरूपण न करें।
             """
-        else:
-            prompt = f"""
+        return f"""
             You are a Delhi Metro assistant. User query: {query}
-            Results: {json.dumps(results, indent=2)}
+            Results (fares in rupees): {summary}
             
             Based on these results, provide a clear, helpful, and detailed response in English.
             Include route information, timing, fare, and other relevant details.
             Use natural, conversational language without any formatting symbols or markdown.
             """
-        
-        response = self._call_llm(prompt)
-        # Clean the response for TTS
-        return clean_text_for_tts(response)
     
     def _call_llm(self, prompt: str) -> str:
         """Call the LLM API"""
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={api_key}"
-        payload = {"contents": [{"parts": [{"text": prompt}]}]}
+        url, payload = gemini_request(prompt)
         headers = {"Content-Type": "application/json"}
         
-        try:
-            response = requests.post(url, headers=headers, json=payload)
-            if response.ok:
-                return response.json()['candidates'][0]['content']['parts'][0]['text']
-        except:
-            pass
-        return "I'm sorry, I couldn't process your request at the moment."
+        # Admission sits outside the try: a shed call surfaces as Overloaded, not as LLM_UNAVAILABLE
+        with admit('llm'):
+            try:
+                import requests
+                response = requests.post(url, headers=headers, json=payload, timeout=LLM_TIMEOUT)
+                if response.ok:
+                    return response.json()['candidates'][0]['content']['parts'][0]['text']
+            except:
+                pass
+        return LLM_UNAVAILABLE
+    
+    async def _call_llm_async(self, prompt: str) -> str:
+        """Call the LLM API without blocking the event loop"""
+        text = await call_llm_async(prompt)
+        return text if text is not None else LLM_UNAVAILABLE
 
-def process_with_agent(query: str, lang: str = 'en') -> str:
+def is_cacheable_answer(response: str) -> bool:
+    """Answers produced while the LLM was unavailable must not be cached"""
+    return bool(response) and clean_text_for_tts(LLM_UNAVAILABLE) not in response and LLM_UNAVAILABLE not in response
+
+def process_with_agent(query: str, lang: str = 'en', session_id: str = None) -> str:
     """Main function to process queries using the agentic approach"""
-    agent = MetroAgent()
+    from handlers.session import session_store
+    context = session_store.get(session_id)
+    agent = MetroAgent(context)
     agent.user_context['lang'] = lang
-    # Step 1: Classify intent
-    intent_data = agent.classify_intent(query)
+    # Step 1: Classify intent (follow-ups reuse the session's entities)
+    intent_data = agent.resolve_intent(query)
     
     # Step 2: Plan actions
     actions = agent.plan_actions(intent_data["intent"], intent_data["entities"])
     
     # Step 3: Execute actions
-    results = []
-    for action in actions:
-        result = agent.execute_action(action)
-        results.append(result)
+    results = agent.execute_actions(actions)
     
     # Step 4: Generate response
     response = agent.generate_response(query, results, lang)
+    agent.remember(query, intent_data, response)
+    if context:
+        session_store.save(context)
     
     # Only enhance with RAG if the response is incomplete or needs additional context
     # For route queries, the base response is usually sufficient
@@ -151,4 +241,30 @@ def process_with_agent(query: str, lang: str = 'en') -> str:
     else:
         # For other queries, enhance with RAG if needed
         from handlers.rag import enhance_response_with_rag
-        return enhance_response_with_rag(query, response) 
\ No newline at end of file
+        return enhance_response_with_rag(query, response)
+
+async def process_with_agent_async(query: str, lang: str = 'en', session_id: str = None) -> str:
+    """Async variant of process_with_agent for the ASGI server.
+
+    LLM calls are awaited; the pandas-backed handlers and RAG search are CPU
+    work and run in the default thread pool so the event loop stays free.
+    """
+    from handlers.session import session_store
+    context = session_store.get(session_id)
+    agent = MetroAgent(context)
+    agent.user_context['lang'] = lang
+    intent_data = await agent.resolve_intent_async(query)
+    
+    actions = agent.plan_actions(intent_data["intent"], intent_data["entities"])
+    results = await asyncio.to_thread(agent.execute_actions, actions)
+    
+    response = await agent.generate_response_async(query, results, lang)
+    agent.remember(query, intent_data, response)
+    if context:
+        await asyncio.to_thread(session_store.save, context)
+    
+    if intent_data["intent"] == "route_finding" and len(results) > 0:
+        return response
+    else:
+        from handlers.rag import enhance_response_with_rag
+        return await asyncio.to_thread(enhance_response_with_rag, query, response)
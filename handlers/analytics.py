@@ -0,0 +1,173 @@
+import sys
+import heapq
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Dict, Hashable, List, Optional, Tuple
+
+class SpaceSaving:
+    """Space-Saving heavy-hitter summary (Metwally et al.).
+
+    Tracks at most `capacity` keys. When a new key arrives and the summary
+    is full, it replaces the current minimum and inherits its count, so any
+    key whose true frequency exceeds N / capacity is guaranteed to be kept.
+    Counts are over-estimates by at most the recorded error.
+    """
+
+    def __init__(self, capacity: int = 256):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self._heap = []  # lazy (count, key) min-heap, stale entries skipped on pop
+
+    def update(self, key: Hashable, increment: int = 1):
+        if key in self.counts:
+            self.counts[key] += increment
+        elif len(self.counts) < self.capacity:
+            self.counts[key] = increment
+            self.errors[key] = 0
+        else:
+            min_count, min_key = self._pop_min()
+            del self.counts[min_key]
+            del self.errors[min_key]
+            self.counts[key] = min_count + increment
+            self.errors[key] = min_count
+        heapq.heappush(self._heap, (self.counts[key], key))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(count, k) for k, count in self.counts.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_min(self) -> Tuple[int, Hashable]:
+        while True:
+            count, key = heapq.heappop(self._heap)
+            if self.counts.get(key) == count:
+                return count, key
+
+    def clear(self):
+        self.counts = {}
+        self.errors = {}
+        self._heap = []
+
+    def top(self, k: int) -> List[Tuple[Hashable, int]]:
+        return heapq.nlargest(k, self.counts.items(), key=lambda item: item[1])
+
+class RollingTopK:
+    """Heavy hitters over a rolling window of hourly buckets.
+
+    Each hour gets its own SpaceSaving summary; expired hours are dropped as
+    the window slides. Reads merge at most `hours` summaries of bounded
+    capacity, so their cost is independent of how many rows are stored.
+    """
+
+    def __init__(self, hours: int = 24, capacity: int = 256):
+        self.hours = hours
+        self.capacity = capacity
+        self._buckets = deque()  # (hour_start, SpaceSaving)
+        self._lock = threading.Lock()
+
+    def _bucket(self, hour: datetime) -> SpaceSaving:
+        if self._buckets and self._buckets[-1][0] == hour:
+            return self._buckets[-1][1]
+        for start, summary in self._buckets:
+            if start == hour:
+                return summary
+        summary = SpaceSaving(self.capacity)
+        self._buckets.append((hour, summary))
+        self._buckets = deque(sorted(self._buckets, key=lambda b: b[0]))
+        return summary
+
+    def _expire(self, now: datetime):
+        cutoff = now.replace(minute=0, second=0, microsecond=0) - timedelta(hours=self.hours - 1)
+        while self._buckets and self._buckets[0][0] < cutoff:
+            self._buckets.popleft()
+
+    def record(self, key: Hashable, when: Optional[datetime] = None, increment: int = 1):
+        when = when or datetime.utcnow()
+        hour = when.replace(minute=0, second=0, microsecond=0)
+        with self._lock:
+            self._expire(datetime.utcnow())
+            if hour < datetime.utcnow() - timedelta(hours=self.hours):
+                return
+            self._bucket(hour).update(key, increment)
+
+    def clear(self):
+        with self._lock:
+            self._buckets = deque()
+
+    def top(self, k: int, hours: Optional[int] = None) -> List[Tuple[Hashable, int]]:
+        now = datetime.utcnow()
+        with self._lock:
+            self._expire(now)
+            cutoff = now.replace(minute=0, second=0, microsecond=0) - timedelta(hours=(hours or self.hours) - 1)
+            merged = {}
+            for start, summary in self._buckets:
+                if start < cutoff:
+                    continue
+                for key, count in summary.counts.items():
+                    merged[key] = merged.get(key, 0) + count
+        return heapq.nlargest(k, merged.items(), key=lambda item: item[1])
+
+trending_routes = RollingTopK()
+
+def seed_trending(db, hours: int = 24):
+    """Replace the in-memory rolling top-K with the recent hourly counters; the
+    counters already include everything recorded in memory once the writer is flushed"""
+    since = (datetime.utcnow() - timedelta(hours=hours)).strftime('%Y-%m-%d %H:00:00')
+    rows = db.conn.execute("""
+        SELECT from_station, to_station, hour_bucket, searches
+        FROM route_pair_hourly
+        WHERE hour_bucket >= ?
+    """, (since,)).fetchall()
+    trending_routes.clear()
+    for row in rows:
+        hour = datetime.strptime(row['hour_bucket'], '%Y-%m-%d %H:%M:%S')
+        trending_routes.record((row['from_station'], row['to_station']), hour, row['searches'])
+
+def backfill(db) -> Dict:
+    """Rebuild the aggregate tables from route_history and conversations.
+
+    Only needed once for data written before the aggregates existed; after
+    that they are maintained incrementally by the database writer. Hourly
+    rows the writer has kept are left alone: searches are only approximated
+    into hours older than the first of them, from last_searched, since
+    route_history keeps no per-search timestamps. Those approximations are
+    all-time totals, so the in-memory trending view is not reseeded from them.
+    """
+    db.flush()
+    conn = db.conn
+    with conn:
+        conn.execute("DELETE FROM route_pair_stats")
+        conn.execute("""
+            INSERT INTO route_pair_stats (from_station, to_station, total_searches, last_searched)
+            SELECT from_station, to_station, SUM(search_count), MAX(last_searched)
+            FROM route_history
+            GROUP BY from_station, to_station
+        """)
+        first_hour = conn.execute("SELECT MIN(hour_bucket) FROM route_pair_hourly").fetchone()[0]
+        conn.execute("""
+            INSERT INTO route_pair_hourly (from_station, to_station, hour_bucket, searches)
+            SELECT from_station, to_station, strftime('%Y-%m-%d %H:00:00', last_searched), SUM(search_count)
+            FROM route_history
+            WHERE ? IS NULL OR strftime('%Y-%m-%d %H:00:00', last_searched) < ?
+            GROUP BY from_station, to_station, strftime('%Y-%m-%d %H:00:00', last_searched)
+        """, (first_hour, first_hour))
+        conn.execute("DELETE FROM session_stats")
+        conn.execute("""
+            INSERT INTO session_stats (session_id, total_conversations, last_seen)
+            SELECT session_id, COUNT(*), MAX(timestamp)
+            FROM conversations
+            WHERE session_id IS NOT NULL
+            GROUP BY session_id
+        """)
+    return {
+        table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        for table in ('route_pair_stats', 'route_pair_hourly', 'session_stats')
+    }
+
+if __name__ == '__main__':
+    # python -m handlers.analytics backfill
+    if len(sys.argv) < 2 or sys.argv[1] != 'backfill':
+        print("Usage: python -m handlers.analytics backfill")
+        sys.exit(1)
+    from handlers.database import get_database
+    print(backfill(get_database()))
@@ -0,0 +1,121 @@
+import io
+import os
+import sys
+import gzip
+import json
+import shutil
+import hashlib
+from typing import Dict, Optional, Tuple
+
+BASE = os.path.dirname(os.path.dirname(__file__))
+STATIC_DIR = os.path.join(BASE, 'static')
+# Built, content-hashed copies live in static/dist and are served as immutable
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# Audio under static/ is written per request and must never be cached or fingerprinted
+GENERATED_EXTENSIONS = ('.mp3', '.wav')
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.map')
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+MAX_IMAGE_SIZE = 1024
+
+def is_generated_audio(path: str) -> bool:
+    return path.lower().endswith(GENERATED_EXTENSIONS)
+
+def _optimize_image(data: bytes, ext: str, max_size: int) -> bytes:
+    """Shrink to `max_size` px on the long side and re-encode; keeps the original if that is smaller"""
+    try:
+        from PIL import Image
+    except ImportError:
+        print("Pillow not installed, copying images unoptimized")
+        return data
+    image = Image.open(io.BytesIO(data))
+    image.thumbnail((max_size, max_size))
+    out = io.BytesIO()
+    if ext == '.png':
+        image.save(out, 'PNG', optimize=True)
+    else:
+        image.convert('RGB').save(out, 'JPEG', quality=85, optimize=True, progressive=True)
+    return out.getvalue() if out.tell() < len(data) else data
+
+def _compressed(data: bytes) -> Dict[str, bytes]:
+    variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+    try:
+        import brotli
+        variants['.br'] = brotli.compress(data, quality=11)
+    except ImportError:
+        print("brotli not installed, writing gzip variants only")
+    return variants
+
+def build_assets(static_dir: str = STATIC_DIR, max_image_size: int = MAX_IMAGE_SIZE) -> Dict:
+    """Copy static files into static/dist under content-hashed names, with optimized images
+    and .gz/.br variants of text assets, and write the name -> hashed name manifest"""
+    dist = os.path.join(static_dir, DIST)
+    shutil.rmtree(dist, ignore_errors=True)
+    manifest = {}
+    before = after = 0
+    for root, dirs, files in os.walk(static_dir):
+        # Skip previous builds and the per-request audio directory
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) not in (dist, os.path.join(static_dir, 'audio')))
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            rel = os.path.relpath(path, static_dir).replace(os.sep, '/')
+            stem, ext = os.path.splitext(rel)
+            ext = ext.lower()
+            if is_generated_audio(rel):
+                continue
+            with open(path, 'rb') as f:
+                data = f.read()
+            before += len(data)
+            if ext in IMAGE_EXTENSIONS:
+                data = _optimize_image(data, ext, max_image_size)
+            hashed = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+            target = os.path.join(dist, hashed)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(data)
+            after += len(data)
+            if ext in COMPRESSIBLE_EXTENSIONS:
+                for suffix, compressed in _compressed(data).items():
+                    with open(target + suffix, 'wb') as f:
+                        f.write(compressed)
+            manifest[rel] = hashed
+    os.makedirs(dist, exist_ok=True)
+    with open(os.path.join(dist, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return {'files': len(manifest), 'bytes_before': before, 'bytes_after': after, 'dist': dist}
+
+_manifest = {'mtime': None, 'entries': {}}
+
+def hashed_name(filename: str, static_dir: str = STATIC_DIR) -> Optional[str]:
+    """'dist/<hashed name>' for a built asset, None if it has not been built"""
+    path = os.path.join(static_dir, DIST, MANIFEST)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    # Re-read only when a new build has replaced the manifest
+    if mtime != _manifest['mtime']:
+        try:
+            with open(path) as f:
+                _manifest['entries'] = json.load(f)
+            _manifest['mtime'] = mtime
+        except (OSError, ValueError) as e:
+            print(f"Error reading asset manifest: {e}")
+            return None
+    hashed = _manifest['entries'].get(filename)
+    return f"{DIST}/{hashed}" if hashed else None
+
+def compressed_variant(directory: str, filename: str, accept_encodings) -> Tuple[str, Optional[str]]:
+    """The pre-compressed file to send for `filename` given the client's Accept-Encoding, and its encoding"""
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if encoding in accept_encodings and os.path.isfile(os.path.join(directory, filename + suffix)):
+            return filename + suffix, encoding
+    return filename, None
+
+if __name__ == '__main__':
+    # python -m handlers.assets build
+    if len(sys.argv) < 2 or sys.argv[1] != 'build':
+        print("Usage: python -m handlers.assets build")
+        sys.exit(1)
+    print(build_assets())
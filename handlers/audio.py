@@ -1,12 +1,16 @@
 # handlers/audio.py
-import sounddevice as sd
-from scipy.io.wavfile import write
 import os
+from handlers.admission import admit
 
 def record_audio(filename='temp.wav', duration=5, sample_rate=44100):
+    # Imported on first use: sounddevice needs PortAudio and scipy is slow to load
+    import sounddevice as sd
+    from scipy.io.wavfile import write
     os.makedirs('recordings', exist_ok=True)
     path = os.path.join('recordings', filename)
-    audio = sd.rec(int(duration * sample_rate), samplerate=sample_rate, channels=1, dtype='int16')
-    sd.wait()
+    # One microphone: recordings are serialized by the 'record' stage budget
+    with admit('record'):
+        audio = sd.rec(int(duration * sample_rate), samplerate=sample_rate, channels=1, dtype='int16')
+        sd.wait()
     write(path, sample_rate, audio)
     return path
\ No newline at end of file
@@ -0,0 +1,246 @@
+import os
+import re
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+from handlers.gtfs import feed_now
+
+# English, Hinglish and Hindi keywords
+FARE_WORDS = ('fare', 'cost', 'price', 'ticket', 'charge', 'how much', 'kiraya', 'kitne paise', 'किराया', 'टिकट')
+SCHEDULE_WORDS = ('schedule', 'timing', 'next train', 'first train', 'last train', 'when', 'frequency',
+                  'agli train', 'kitne baje', 'अगली', 'समय', 'कब')
+STATION_WORDS = ('facilit', 'about', 'info', 'parking', 'lift', 'elevator', 'accessib', 'exit', 'gate no',
+                 'सुविधा', 'पार्किंग', 'लिफ्ट')
+
+# Answers to these carry departure times (next trains, journeys leaving now), so they are
+# cached per 5 minute window of the clock as well
+TIME_SENSITIVE_INTENTS = ('schedule', 'route_finding')
+
+def guess_intent(query: str, stations: int = 0) -> str:
+    """Cheap keyword intent guess used for cache keys (no LLM round-trip)"""
+    q = query.lower()
+    if any(word in q for word in FARE_WORDS):
+        return 'fare'
+    if any(word in q for word in SCHEDULE_WORDS):
+        return 'schedule'
+    if any(word in q for word in STATION_WORDS):
+        return 'station_info'
+    if stations >= 2:
+        return 'route_finding'
+    return 'general_help'
+
+def service_day(now: Optional[datetime] = None) -> str:
+    """Map a date onto the GTFS calendar service_id (weekday/saturday/sunday)"""
+    now = now or feed_now()
+    weekday = now.weekday()
+    if weekday < 5:
+        return 'weekday'
+    return 'saturday' if weekday == 5 else 'sunday'
+
+def normalize_query(query: str) -> str:
+    return re.sub(r'\s+', ' ', re.sub(r'[^\w\s]', ' ', query.lower())).strip()
+
+def resolve_stations(query: str, lang: str = 'en') -> Optional[tuple]:
+    """Resolve the (from, to) station pair locally, or None"""
+    from handlers.llm import extract_stations
+    start, end = extract_stations(query, lang)
+    if not start or not end:
+        return None
+    # Exact matches come back in stop list order, keep the direction the user asked for
+    # (names found through the station lexicon are already in the order they were said)
+    q = query.lower()
+    positions = [q.find(name.lower()) for name in (start, end)]
+    if -1 not in positions and positions[1] < positions[0]:
+        return (end, start)
+    return (start, end)
+
+def query_key(query: str, lang: str, stations: Optional[tuple], now: Optional[datetime] = None,
+              step_free: bool = False) -> tuple:
+    """Build a cache key from resolved stations (see resolve_stations), intent, language and service day.
+
+    Queries whose stations can't be resolved locally fall back to the
+    normalized query text. Schedule and route answers depend on the clock,
+    so they are additionally bucketed into 5 minute windows. Step-free
+    routing gets its own entries.
+    """
+    now = now or feed_now()
+    intent = guess_intent(query, 2 if stations else 0)
+
+    key = (intent, lang, service_day(now))
+    if intent in TIME_SENSITIVE_INTENTS:
+        key += (now.hour, now.minute // 5)
+    if step_free:
+        key += ('step_free',)
+    if stations:
+        return key + tuple(stations)
+    return key + (normalize_query(query),)
+
+class _Flight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+class AnswerCache:
+    """TTL + LRU answer cache with single-flight coalescing.
+
+    Concurrent callers asking for the same key share one computation:
+    threads wait on the first caller's result, coroutines await a shared
+    future.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._inflight = {}
+        self._inflight_async = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def get(self, key) -> Any:
+        """Return the cached value for key or None (counts a hit or miss)"""
+        with self._lock:
+            value = self._lookup(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def peek(self, key) -> Any:
+        """The cached value for key or None, without counting a hit or miss"""
+        with self._lock:
+            return self._lookup(key)
+
+    def _lookup(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def _store(self, key, value, ttl=None):
+        self._data[key] = (time.monotonic() + (ttl or self.ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def get_or_compute(self, key, compute: Callable[[], Any], cacheable: Callable[[Any], bool] = None) -> Any:
+        """Return the cached value or compute it once for all concurrent callers"""
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                self.hits += 1
+                return value
+            flight = self._inflight.get(key)
+            if flight is None:
+                self.misses += 1
+                flight = self._inflight[key] = _Flight()
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = compute()
+            if cacheable is None or cacheable(flight.value):
+                self.set(key, flight.value)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    async def get_or_compute_async(self, key, compute, cacheable: Callable[[Any], bool] = None) -> Any:
+        """Async variant of get_or_compute; compute is a zero-argument coroutine function"""
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                self.hits += 1
+                return value
+            future = self._inflight_async.get(key)
+            if future is None:
+                self.misses += 1
+                future = self._inflight_async[key] = asyncio.get_running_loop().create_future()
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            return await asyncio.shield(future)
+
+        try:
+            value = await compute()
+            if cacheable is None or cacheable(value):
+                self.set(key, value)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            with self._lock:
+                self._inflight_async.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def evict(self, match: Callable[[Any], bool]) -> int:
+        """Drop every entry whose key satisfies `match`; returns how many were dropped"""
+        with self._lock:
+            stale = [key for key in self._data if match(key)]
+            for key in stale:
+                del self._data[key]
+            return len(stale)
+
+    def stats(self) -> Dict:
+        """Hit/miss counters for the metrics endpoints"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+answer_cache = AnswerCache(
+    maxsize=int(os.getenv('ANSWER_CACHE_SIZE', '2048')),
+    ttl=float(os.getenv('ANSWER_CACHE_TTL', '300'))
+)
@@ -0,0 +1,406 @@
+import os
+import json
+import uuid
+import queue
+import sqlite3
+import atexit
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+from handlers.analytics import trending_routes, seed_trending
+
+BASE = os.path.dirname(os.path.dirname(__file__))
+DB_PATH = os.getenv('METRO_DB_PATH', os.path.join(BASE, 'metro_assistant.db'))
+
+# SQL is kept in constants so sqlite3's per-connection statement cache
+# reuses the compiled (prepared) statements across calls.
+INSERT_CONVERSATION = """
+    INSERT INTO conversations (id, session_id, user_query, assistant_response, route_data, language, timestamp, processing_time, stage_timings)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+UPDATE_ROUTE_SEARCH = """
+    UPDATE route_history
+    SET search_count = search_count + 1, last_searched = ?, route_data = COALESCE(?, route_data)
+    WHERE session_id = ? AND from_station = ? AND to_station = ?
+"""
+INSERT_ROUTE_SEARCH = """
+    INSERT INTO route_history (session_id, from_station, to_station, route_data, first_searched, last_searched)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+# A NULL parameter leaves the stored column as it is (or takes the default for a new row)
+UPSERT_PREFERENCES = """
+    INSERT INTO user_preferences (session_id, preferred_language, frequent_stations, accessibility_needs, last_updated)
+    VALUES (?1, COALESCE(?2, 'en'), COALESCE(?3, '[]'), COALESCE(?4, '{}'), CURRENT_TIMESTAMP)
+    ON CONFLICT(session_id) DO UPDATE SET
+        preferred_language = COALESCE(?2, preferred_language),
+        frequent_stations = COALESCE(?3, frequent_stations),
+        accessibility_needs = COALESCE(?4, accessibility_needs),
+        last_updated = CURRENT_TIMESTAMP
+"""
+UPSERT_PAIR_STATS = """
+    INSERT INTO route_pair_stats (from_station, to_station, total_searches, last_searched)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(from_station, to_station) DO UPDATE SET
+        total_searches = total_searches + excluded.total_searches,
+        last_searched = excluded.last_searched
+"""
+UPSERT_PAIR_HOURLY = """
+    INSERT INTO route_pair_hourly (from_station, to_station, hour_bucket, searches)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(from_station, to_station, hour_bucket) DO UPDATE SET
+        searches = searches + excluded.searches
+"""
+UPSERT_SESSION_STATS = """
+    INSERT INTO session_stats (session_id, total_conversations, last_seen)
+    VALUES (?, ?, ?)
+    ON CONFLICT(session_id) DO UPDATE SET
+        total_conversations = total_conversations + excluded.total_conversations,
+        last_seen = excluded.last_seen
+"""
+INSERT_FAVORITE = """
+    INSERT INTO station_favorites (session_id, station_name, station_code)
+    SELECT ?, ?, ?
+    WHERE NOT EXISTS (SELECT 1 FROM station_favorites WHERE session_id = ? AND station_name = ?)
+"""
+
+def _now() -> str:
+    # Same format and timezone (UTC) as SQLite's CURRENT_TIMESTAMP
+    return datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+
+class MetroDatabase:
+    """SQLite data-access layer.
+
+    The database runs in WAL mode so readers never block the writer. Each
+    thread reuses its own connection. Conversation and route-search logging
+    is queued and written in batches by a background thread, so it never
+    adds latency to the request path.
+    """
+
+    def __init__(self, db_path: str = DB_PATH, batch_size: int = 200):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        self.init_database()
+        self._writer = threading.Thread(target=self._writer_loop, name='db-writer', daemon=True)
+        self._writer.start()
+        atexit.register(self.flush)
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Per-thread connection, opened on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, cached_statements=256)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA temp_store=MEMORY')
+            self._local.conn = conn
+        return conn
+
+    def init_database(self):
+        """Initialize database tables and indexes"""
+        conn = self.conn
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS conversations (
+                id TEXT PRIMARY KEY,
+                session_id TEXT,
+                user_query TEXT,
+                assistant_response TEXT,
+                route_data TEXT,
+                language TEXT,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                processing_time REAL
+            );
+            CREATE TABLE IF NOT EXISTS user_preferences (
+                session_id TEXT PRIMARY KEY,
+                preferred_language TEXT DEFAULT 'en',
+                frequent_stations TEXT,
+                accessibility_needs TEXT,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                last_updated DATETIME DEFAULT CURRENT_TIMESTAMP
+            );
+            CREATE TABLE IF NOT EXISTS station_favorites (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT,
+                station_name TEXT,
+                station_code TEXT,
+                added_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            );
+            CREATE TABLE IF NOT EXISTS route_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT,
+                from_station TEXT,
+                to_station TEXT,
+                route_data TEXT,
+                search_count INTEGER DEFAULT 1,
+                first_searched DATETIME DEFAULT CURRENT_TIMESTAMP,
+                last_searched DATETIME DEFAULT CURRENT_TIMESTAMP
+            );
+            -- Aggregates maintained incrementally by the batch writer
+            -- (python -m handlers.analytics backfill rebuilds them)
+            CREATE TABLE IF NOT EXISTS route_pair_stats (
+                from_station TEXT,
+                to_station TEXT,
+                total_searches INTEGER DEFAULT 0,
+                last_searched DATETIME,
+                PRIMARY KEY (from_station, to_station)
+            );
+            CREATE TABLE IF NOT EXISTS route_pair_hourly (
+                from_station TEXT,
+                to_station TEXT,
+                hour_bucket DATETIME,
+                searches INTEGER DEFAULT 0,
+                PRIMARY KEY (from_station, to_station, hour_bucket)
+            );
+            CREATE TABLE IF NOT EXISTS session_stats (
+                session_id TEXT PRIMARY KEY,
+                total_conversations INTEGER DEFAULT 0,
+                last_seen DATETIME
+            );
+            CREATE INDEX IF NOT EXISTS idx_conversations_session ON conversations (session_id, timestamp);
+            CREATE INDEX IF NOT EXISTS idx_conversations_timestamp ON conversations (timestamp);
+            CREATE INDEX IF NOT EXISTS idx_favorites_session ON station_favorites (session_id, station_name);
+            CREATE INDEX IF NOT EXISTS idx_route_history_session ON route_history (session_id, from_station, to_station);
+            CREATE INDEX IF NOT EXISTS idx_route_history_pair ON route_history (from_station, to_station);
+            CREATE INDEX IF NOT EXISTS idx_route_history_last_searched ON route_history (last_searched);
+            CREATE INDEX IF NOT EXISTS idx_route_history_session_count ON route_history (session_id, search_count DESC);
+            CREATE INDEX IF NOT EXISTS idx_pair_stats_total ON route_pair_stats (total_searches DESC);
+            CREATE INDEX IF NOT EXISTS idx_pair_hourly_bucket ON route_pair_hourly (hour_bucket);
+        """)
+        # Per-stage timings (JSON, milliseconds) next to the total processing_time
+        columns = [row['name'] for row in conn.execute("PRAGMA table_info(conversations)")]
+        if 'stage_timings' not in columns:
+            conn.execute("ALTER TABLE conversations ADD COLUMN stage_timings TEXT")
+        conn.commit()
+
+    # Background writer
+
+    def _writer_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            # Drain whatever else is already queued into the same transaction
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                print(f"Error writing batch to database: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write_batch(self, batch: List[tuple]):
+        conn = self.conn
+        conversations = [params for kind, params in batch if kind == 'conversation']
+        searches = [params for kind, params in batch if kind == 'route_search']
+
+        # Fold the batch into aggregate increments before touching the database
+        session_counts = {}
+        for params in conversations:
+            session_id, ts = params[1], params[6]
+            count, _ = session_counts.get(session_id, (0, ts))
+            session_counts[session_id] = (count + 1, ts)
+        pair_counts = {}
+        hourly_counts = {}
+        for session_id, from_station, to_station, route_json, ts in searches:
+            count, _ = pair_counts.get((from_station, to_station), (0, ts))
+            pair_counts[(from_station, to_station)] = (count + 1, ts)
+            hour_key = (from_station, to_station, ts[:13] + ':00:00')
+            hourly_counts[hour_key] = hourly_counts.get(hour_key, 0) + 1
+
+        try:
+            if conversations:
+                conn.executemany(INSERT_CONVERSATION, conversations)
+                conn.executemany(UPSERT_SESSION_STATS, [
+                    (session_id, count, ts) for session_id, (count, ts) in session_counts.items()
+                ])
+            for session_id, from_station, to_station, route_json, ts in searches:
+                cursor = conn.execute(UPDATE_ROUTE_SEARCH, (ts, route_json, session_id, from_station, to_station))
+                if cursor.rowcount == 0:
+                    conn.execute(INSERT_ROUTE_SEARCH, (session_id, from_station, to_station, route_json, ts, ts))
+            if searches:
+                conn.executemany(UPSERT_PAIR_STATS, [
+                    (from_station, to_station, count, ts) for (from_station, to_station), (count, ts) in pair_counts.items()
+                ])
+                conn.executemany(UPSERT_PAIR_HOURLY, [
+                    key + (count,) for key, count in hourly_counts.items()
+                ])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        for (from_station, to_station, hour_bucket), count in hourly_counts.items():
+            trending_routes.record((from_station, to_station), datetime.strptime(hour_bucket, '%Y-%m-%d %H:%M:%S'), count)
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def flush(self):
+        """Block until every queued write has been committed"""
+        self._queue.join()
+
+    # Writes
+
+    def save_conversation(self, session_id: str, user_query: str, assistant_response: str,
+                          route_data: Optional[Dict] = None, language: str = 'en',
+                          processing_time: float = 0.0, stage_timings: Optional[Dict] = None) -> str:
+        """Save a conversation interaction (queued, returns immediately)"""
+        conversation_id = str(uuid.uuid4())
+        route_json = json.dumps(route_data) if route_data else None
+        timings_json = json.dumps(stage_timings) if stage_timings else None
+        self._queue.put(('conversation', (
+            conversation_id, session_id, user_query, assistant_response,
+            route_json, language, _now(), processing_time, timings_json
+        )))
+        return conversation_id
+
+    def save_route_search(self, session_id: str, from_station: str, to_station: str, route_data: Optional[Dict] = None):
+        """Save a route search for analytics (queued, returns immediately)"""
+        route_json = json.dumps(route_data) if route_data else None
+        self._queue.put(('route_search', (session_id, from_station, to_station, route_json, _now())))
+
+    def save_user_preferences(self, session_id: str, preferences: Dict):
+        """Save or update user preferences; keys missing from `preferences` keep their stored value"""
+        def column(key):
+            value = preferences.get(key)
+            return None if value is None else json.dumps(value)
+        self.conn.execute(UPSERT_PREFERENCES, (
+            session_id,
+            preferences.get('preferred_language'),
+            column('frequent_stations'),
+            column('accessibility_needs')
+        ))
+        self.conn.commit()
+
+    def add_station_favorite(self, session_id: str, station_name: str, station_code: Optional[str] = None):
+        """Add a station to user's favorites"""
+        self.conn.execute(INSERT_FAVORITE, (session_id, station_name, station_code, session_id, station_name))
+        self.conn.commit()
+
+    # Reads
+
+    def get_conversation_history(self, session_id: str, limit: int = 10) -> List[Dict]:
+        """Get conversation history for a session"""
+        rows = self.conn.execute("""
+            SELECT user_query, assistant_response, route_data, language, timestamp, processing_time, stage_timings
+            FROM conversations
+            WHERE session_id = ?
+            ORDER BY timestamp DESC
+            LIMIT ?
+        """, (session_id, limit)).fetchall()
+
+        history = []
+        for row in rows:
+            history.append({
+                'user_query': row['user_query'],
+                'assistant_response': row['assistant_response'],
+                'route_data': json.loads(row['route_data']) if row['route_data'] else None,
+                'language': row['language'],
+                'timestamp': row['timestamp'],
+                'processing_time': row['processing_time'],
+                'stage_timings': json.loads(row['stage_timings']) if row['stage_timings'] else None
+            })
+        return history
+
+    def get_user_preferences(self, session_id: str) -> Dict:
+        """Get user preferences for a session"""
+        row = self.conn.execute("""
+            SELECT preferred_language, frequent_stations, accessibility_needs
+            FROM user_preferences
+            WHERE session_id = ?
+        """, (session_id,)).fetchone()
+
+        if not row:
+            return {}
+        return {
+            'preferred_language': row['preferred_language'],
+            'frequent_stations': json.loads(row['frequent_stations']) if row['frequent_stations'] else [],
+            'accessibility_needs': json.loads(row['accessibility_needs']) if row['accessibility_needs'] else {}
+        }
+
+    def frequent_destinations(self, session_id: str, from_station: str, limit: int = 3) -> List[str]:
+        """Stations most often searched to from `from_station`: this session's own first, then everyone's"""
+        rows = self.conn.execute("""
+            SELECT to_station, SUM(search_count) AS searches, MAX(session_id = ?) AS own
+            FROM route_history
+            WHERE from_station = ?
+            GROUP BY to_station
+            ORDER BY own DESC, searches DESC
+            LIMIT ?
+        """, (session_id, from_station, limit)).fetchall()
+        return [row['to_station'] for row in rows]
+
+    def get_station_favorites(self, session_id: str) -> List[Dict]:
+        """Get user's favorite stations"""
+        rows = self.conn.execute("""
+            SELECT station_name, station_code, added_at
+            FROM station_favorites
+            WHERE session_id = ?
+            ORDER BY added_at DESC
+        """, (session_id,)).fetchall()
+        return [{'name': row['station_name'], 'code': row['station_code'], 'added_at': row['added_at']} for row in rows]
+
+    def get_popular_routes(self, limit: int = 10, hours: Optional[int] = None) -> List[Dict]:
+        """Get most frequently searched routes, all-time or over the last `hours`"""
+        if hours:
+            # Rolling window comes from the in-memory heavy-hitter summaries
+            return [
+                {'from': from_station, 'to': to_station, 'searches': count}
+                for (from_station, to_station), count in trending_routes.top(limit, hours)
+            ]
+        rows = self.conn.execute("""
+            SELECT from_station, to_station, total_searches
+            FROM route_pair_stats
+            ORDER BY total_searches DESC
+            LIMIT ?
+        """, (limit,)).fetchall()
+        return [{'from': row['from_station'], 'to': row['to_station'], 'searches': row['total_searches']} for row in rows]
+
+    def get_user_insights(self, session_id: str) -> Dict:
+        """Get insights about user's metro usage patterns"""
+        conn = self.conn
+        row = conn.execute("SELECT total_conversations FROM session_stats WHERE session_id = ?", (session_id,)).fetchone()
+        total = row['total_conversations'] if row else 0
+
+        favorites = conn.execute("""
+            SELECT station_name, COUNT(*) as visit_count
+            FROM station_favorites
+            WHERE session_id = ?
+            GROUP BY station_name
+            ORDER BY visit_count DESC
+            LIMIT 5
+        """, (session_id,)).fetchall()
+
+        # route_history holds one row per (session, pair), so the index answers this directly
+        routes = conn.execute("""
+            SELECT from_station, to_station, search_count
+            FROM route_history
+            WHERE session_id = ?
+            ORDER BY search_count DESC
+            LIMIT 5
+        """, (session_id,)).fetchall()
+
+        return {
+            'total_conversations': total,
+            'favorite_stations': [{'name': row['station_name'], 'visits': row['visit_count']} for row in favorites],
+            'frequent_routes': [{'from': row['from_station'], 'to': row['to_station'], 'searches': row['search_count']} for row in routes]
+        }
+
+_database = None
+_database_lock = threading.Lock()
+
+def get_database() -> MetroDatabase:
+    """Shared MetroDatabase instance, created on first use"""
+    global _database
+    if _database is None:
+        with _database_lock:
+            if _database is None:
+                _database = MetroDatabase()
+                seed_trending(_database)
+    return _database
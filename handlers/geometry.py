@@ -0,0 +1,161 @@
+import math
+from typing import Dict, List, Optional
+from handlers.gtfs import GTFSFeed, get_feed
+
+# Douglas-Peucker tolerance in metres for each map zoom level served;
+# a request for any other zoom gets the nearest level at or below it
+ZOOM_TOLERANCES = {10: 120.0, 13: 25.0, 16: 4.0}
+EARTH_RADIUS_M = 6371000
+
+def _shape_points(feed: GTFSFeed) -> Dict[str, List[tuple]]:
+    """shapes.txt as {shape_id: [(lon, lat), ...]} in sequence order"""
+    shapes = feed.shapes.sort_values(['shape_id', 'shape_pt_sequence'], kind='stable')
+    points = {}
+    for shape_id, lat, lon in zip(shapes['shape_id'], shapes['shape_pt_lat'].astype(float),
+                                  shapes['shape_pt_lon'].astype(float)):
+        points.setdefault(shape_id, []).append((lon, lat))
+    return points
+
+def _stop_positions(feed: GTFSFeed) -> Dict[tuple, int]:
+    """{(shape_id, stop index): index of the shape point nearest that stop} for stops the shape serves"""
+    import numpy as np
+    from handlers.journey import Timetable
+    timetable = feed.derived('timetable', Timetable)
+    points = feed.derived('shape_points', _shape_points)
+    positions = {}
+    for pattern in timetable.patterns:
+        line = points.get(pattern.shape_id)
+        if not line:
+            continue
+        lons, lats = np.array(line).T
+        scale = math.cos(math.radians(lats.mean()))
+        for stop in pattern.stops:
+            if (pattern.shape_id, stop) not in positions:
+                lat, lon = timetable.coords[stop]
+                positions[(pattern.shape_id, stop)] = int(np.argmin(((lons - lon) * scale) ** 2 + (lats - lat) ** 2))
+    return positions
+
+def shape_points() -> Dict[str, List[tuple]]:
+    return get_feed().derived('shape_points', _shape_points)
+
+def stop_positions() -> Dict[tuple, int]:
+    return get_feed().derived('shape_stop_positions', _stop_positions)
+
+def simplify(points: List[tuple], tolerance: float) -> List[tuple]:
+    """Douglas-Peucker on (lon, lat) points with `tolerance` in metres (local equirectangular projection)"""
+    if len(points) < 3:
+        return list(points)
+    lat0 = math.radians(sum(lat for _, lat in points) / len(points))
+    xy = [(math.radians(lon) * math.cos(lat0) * EARTH_RADIUS_M, math.radians(lat) * EARTH_RADIUS_M)
+          for lon, lat in points]
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        (x1, y1), (x2, y2) = xy[first], xy[last]
+        dx, dy = x2 - x1, y2 - y1
+        length = math.hypot(dx, dy)
+        farthest, index = 0.0, None
+        for i in range(first + 1, last):
+            x, y = xy[i]
+            if length:
+                distance = abs(dy * x - dx * y + x2 * y1 - y2 * x1) / length
+            else:
+                distance = math.hypot(x - x1, y - y1)
+            if distance > farthest:
+                farthest, index = distance, i
+        if index is not None and farthest > tolerance:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return [point for point, kept in zip(points, keep) if kept]
+
+def encode_polyline(points: List[tuple]) -> str:
+    """Google encoded polyline (precision 5) for (lon, lat) points"""
+    chunks = []
+    previous_lat = previous_lon = 0
+    for lon, lat in points:
+        lat, lon = int(round(lat * 1e5)), int(round(lon * 1e5))
+        for value in (lat - previous_lat, lon - previous_lon):
+            value = ~(value << 1) if value < 0 else value << 1
+            while value >= 0x20:
+                chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            chunks.append(chr(value + 63))
+        previous_lat, previous_lon = lat, lon
+    return ''.join(chunks)
+
+def zoom_level(zoom: Optional[int]) -> int:
+    """The precomputed zoom level to serve for a requested map zoom"""
+    levels = sorted(ZOOM_TOLERANCES)
+    if zoom is None:
+        return levels[len(levels) // 2]
+    return max([level for level in levels if level <= zoom] or levels[:1])
+
+class ShapeGeometry:
+    """Every shape simplified and encoded at each zoom level, plus cached leg slices"""
+
+    def __init__(self, feed: GTFSFeed):
+        self.points = feed.derived('shape_points', _shape_points)
+        self.encoded = {level: {shape_id: encode_polyline(simplify(line, tolerance))
+                                for shape_id, line in self.points.items()}
+                        for level, tolerance in ZOOM_TOLERANCES.items()}
+        trips = feed.trips.dropna(subset=['shape_id'])
+        self.route_shapes = {}
+        for route_id, shape_id in zip(trips['route_id'], trips['shape_id']):
+            shapes = self.route_shapes.setdefault(str(route_id), [])
+            if shape_id not in shapes:
+                shapes.append(shape_id)
+        self.route_names = {str(route_id): (short, long) for route_id, short, long in zip(
+            feed.routes['route_id'], feed.routes['route_short_name'], feed.routes['route_long_name'])}
+        self._legs = {}
+
+    def line(self, route_id, zoom: Optional[int] = None) -> Optional[Dict]:
+        route_id = str(route_id)
+        if route_id not in self.route_names:
+            return None
+        level = zoom_level(zoom)
+        short, long = self.route_names[route_id]
+        return {'route_id': route_id, 'line': short, 'line_name': long, 'zoom': level,
+                'shapes': [{'shape_id': shape_id, 'polyline': self.encoded[level][shape_id]}
+                           for shape_id in self.route_shapes.get(route_id, []) if shape_id in self.points]}
+
+    def lines(self, zoom: Optional[int] = None) -> List[Dict]:
+        return [self.line(route_id, zoom) for route_id in self.route_names]
+
+    def leg(self, shape_id, start: int, end: int, zoom: Optional[int] = None) -> Optional[str]:
+        """Encoded polyline of shape points `start`..`end` (either order), simplified for `zoom`"""
+        line = self.points.get(shape_id)
+        if not line:
+            return None
+        level = zoom_level(zoom)
+        key = (shape_id, start, end, level)
+        encoded = self._legs.get(key)
+        if encoded is None:
+            low, high = sorted((start, end))
+            segment = line[low:high + 1]
+            if start > end:
+                segment.reverse()
+            encoded = self._legs[key] = encode_polyline(simplify(segment, ZOOM_TOLERANCES[level]))
+        return encoded
+
+def get_geometry() -> ShapeGeometry:
+    return get_feed().derived('geometry', ShapeGeometry)
+
+def add_leg_geometry(journeys: List[Dict], zoom: Optional[int] = None) -> List[Dict]:
+    """Add an encoded `polyline` to every journey leg, along its shape where the feed has one"""
+    from handlers.journey import get_timetable
+    geometry = get_geometry()
+    timetable = get_timetable()
+    positions = stop_positions()
+    for journey in journeys:
+        for leg in journey.get('legs', []):
+            stops = [timetable.stop_index.get(leg['from_stop_id']), timetable.stop_index.get(leg['to_stop_id'])]
+            start, end = (positions.get((leg.get('shape_id'), stop)) for stop in stops)
+            if start is not None and end is not None and start != end:
+                leg['polyline'] = geometry.leg(leg['shape_id'], start, end, zoom)
+            else:
+                # No shape for this trip: a straight line between the two stations
+                leg['polyline'] = encode_polyline([timetable.coords[stop][::-1] for stop in stops if stop is not None])
+    return journeys
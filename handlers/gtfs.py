@@ -0,0 +1,191 @@
+import os
+import time
+import threading
+import contextvars
+from datetime import datetime
+from contextlib import contextmanager
+from typing import Any, Callable, List, Optional
+
+BASE = os.path.dirname(os.path.dirname(__file__))
+GTFS_PATH = os.getenv('METRO_GTFS_PATH', os.path.join(BASE, 'gtfs'))
+# Timezone of the schedule when agency.txt does not name one
+DEFAULT_TIMEZONE = os.getenv('METRO_TIMEZONE', 'Asia/Kolkata')
+
+# Expected columns per table, so a missing file loads as an empty frame
+# and the handlers degrade to "no results" instead of failing to import.
+TABLES = {
+    'agency': ['agency_id', 'agency_name', 'agency_url', 'agency_timezone'],
+    'stops': ['stop_id', 'stop_code', 'stop_name', 'stop_desc', 'stop_lat', 'stop_lon'],
+    'routes': ['route_id', 'agency_id', 'route_short_name', 'route_long_name', 'route_desc', 'route_type'],
+    'trips': ['route_id', 'service_id', 'trip_id', 'trip_headsign', 'direction_id', 'shape_id', 'wheelchair_accessible'],
+    'stop_times': ['trip_id', 'arrival_time', 'departure_time', 'stop_id', 'stop_sequence'],
+    'shapes': ['shape_id', 'shape_pt_lat', 'shape_pt_lon', 'shape_pt_sequence', 'shape_dist_traveled'],
+    'translations': ['table_name', 'field_name', 'language', 'translation', 'record_id', 'record_sub_id',
+                     'field_value'],
+    'calendar': ['service_id', 'monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday',
+                 'start_date', 'end_date'],
+}
+
+# Text columns that repeat heavily are held as categoricals (each distinct value once, plus small
+# integer codes): times are read that way, ids are converted when they are not already integers
+TIME_COLUMNS = {'stop_times': ('arrival_time', 'departure_time')}
+ID_COLUMNS = {
+    'stop_times': ('trip_id', 'stop_id'),
+    'trips': ('route_id', 'service_id', 'trip_headsign', 'shape_id'),
+    'shapes': ('shape_id',),
+}
+# Tables large enough for 64-bit integer columns to matter
+NARROW_INTEGERS = ('stop_times', 'trips', 'shapes')
+
+def compact_frame(frame, table: str):
+    """`frame` with repetitive text ids as categoricals and integers in 32 bits where they fit"""
+    import numpy as np
+    from pandas.api.types import is_numeric_dtype
+    for column in ID_COLUMNS.get(table, ()):
+        if column in frame and not is_numeric_dtype(frame[column]) and frame[column].dtype != 'category':
+            frame[column] = frame[column].astype('category')
+    if table in NARROW_INTEGERS:
+        int32 = np.iinfo(np.int32)
+        for column in frame.columns:
+            values = frame[column]
+            if values.dtype == np.int64 and (values.empty or int32.min <= values.min() and values.max() <= int32.max):
+                frame[column] = values.astype(np.int32)
+    return frame
+
+class GTFSFeed:
+    """One loaded copy of the GTFS tables plus the indexes derived from them"""
+
+    def __init__(self, path: str = GTFS_PATH, version: int = 1):
+        import pandas as pd
+        self.path = path
+        self.version = version
+        self.fingerprint = directory_fingerprint(path)
+        self.missing = []
+        for table, columns in TABLES.items():
+            file_path = os.path.join(path, f'{table}.txt')
+            frame = None
+            if os.path.exists(file_path):
+                try:
+                    frame = compact_frame(pd.read_csv(file_path, dtype={column: 'category' for column in
+                                                                        TIME_COLUMNS.get(table, ())}), table)
+                except Exception as e:
+                    print(f"Error loading {table}.txt: {e}")
+            if frame is None:
+                self.missing.append(f'{table}.txt')
+                frame = pd.DataFrame(columns=columns)
+            setattr(self, table, frame)
+        self.loaded_at = time.time()
+        self._derived = {}
+        self._lock = threading.RLock()
+
+    def derived(self, name: str, build: Callable[['GTFSFeed'], Any]) -> Any:
+        """Build an index from this feed once and reuse it for every later call"""
+        try:
+            return self._derived[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name not in self._derived:
+                self._derived[name] = build(self)
+            return self._derived[name]
+
+    def describe(self) -> dict:
+        return {'version': self.version, 'path': self.path, 'loaded_at': self.loaded_at,
+                'missing_files': self.missing, 'indexes': sorted(self._derived)}
+
+def _timezone(feed: GTFSFeed):
+    from zoneinfo import ZoneInfo
+    names = feed.agency['agency_timezone'].dropna().tolist() if 'agency_timezone' in feed.agency else []
+    return ZoneInfo(str(names[0]) if names else DEFAULT_TIMEZONE)
+
+def feed_timezone(feed: GTFSFeed = None):
+    """The feed's agency_timezone as a ZoneInfo; GTFS times are local to it, not to the host"""
+    return (feed or get_feed()).derived('timezone', _timezone)
+
+def feed_now(feed: GTFSFeed = None) -> datetime:
+    """The current wall-clock time in the feed's timezone, naive like the times in the feed"""
+    return datetime.now(feed_timezone(feed)).replace(tzinfo=None)
+
+def directory_fingerprint(path: str) -> tuple:
+    """(name, size, mtime) of each GTFS table, to tell when a directory has changed"""
+    fingerprint = []
+    for table in TABLES:
+        try:
+            stat = os.stat(os.path.join(path, f'{table}.txt'))
+            fingerprint.append((table, stat.st_size, stat.st_mtime_ns))
+        except OSError:
+            fingerprint.append((table, None, None))
+    return tuple(fingerprint)
+
+_feed = None
+_feed_lock = threading.Lock()
+# A request pins the snapshot it started with, so a reload never changes
+# the data underneath it; the context follows it into asyncio.to_thread.
+_pinned = contextvars.ContextVar('metro_feed', default=None)
+_swap_listeners = []
+
+def get_feed() -> GTFSFeed:
+    """The current request's snapshot, else the shared feed (read from disk on first use)"""
+    global _feed
+    pinned = _pinned.get()
+    if pinned is not None:
+        return pinned
+    if _feed is None:
+        with _feed_lock:
+            if _feed is None:
+                _feed = GTFSFeed()
+                if _feed.missing:
+                    print(f"GTFS files missing from {_feed.path}: {', '.join(_feed.missing)}")
+    return _feed
+
+def loaded_feed() -> Optional[GTFSFeed]:
+    """The shared feed if it has been loaded, without triggering a load"""
+    return _feed
+
+def pin_feed(feed: Optional[GTFSFeed] = None):
+    """Pin a snapshot (default: the live one, if loaded) to the current context; returns a reset token"""
+    return _pinned.set(feed or _feed)
+
+def unpin_feed(token):
+    _pinned.reset(token)
+
+@contextmanager
+def pinned_feed(feed: Optional[GTFSFeed] = None):
+    """Serve everything inside the block from one snapshot"""
+    token = pin_feed(feed)
+    try:
+        yield _pinned.get()
+    finally:
+        unpin_feed(token)
+
+def on_swap(listener: Callable[[GTFSFeed], None]):
+    """Call `listener(new_feed)` after every snapshot swap"""
+    _swap_listeners.append(listener)
+
+def swap_feed(feed: GTFSFeed) -> Optional[GTFSFeed]:
+    """Make `feed` the live snapshot; requests already pinned to the old one keep it"""
+    global _feed
+    with _feed_lock:
+        old, _feed = _feed, feed
+    for listener in _swap_listeners:
+        try:
+            listener(feed)
+        except Exception as e:
+            print(f"Error in GTFS swap listener: {e}")
+    return old
+
+def gtfs_seconds(times) -> 'np.ndarray':
+    """Seconds after midnight for a Series of GTFS HH:MM:SS times (hours may exceed 24)"""
+    import numpy as np
+    if times.dtype == 'category':
+        # Parse each distinct time once and expand through the codes (-1, missing, picks the 0)
+        seconds = np.append(gtfs_seconds(times.cat.categories.to_series()), np.int32(0))
+        return seconds[times.cat.codes.to_numpy()]
+    parts = times.astype(str).str.split(':', expand=True)
+    if parts.shape[1] < 3:
+        return np.zeros(len(times), dtype=np.int32)
+    parts = parts.iloc[:, :3].astype(int).to_numpy()
+    return (parts[:, 0] * 3600 + parts[:, 1] * 60 + parts[:, 2]).astype(np.int32)
+
+def station_names() -> List[str]:
+    return get_feed().derived('station_names', lambda feed: feed.stops['stop_name'].dropna().astype(str).tolist())
@@ -0,0 +1,116 @@
+import math
+from datetime import datetime
+from typing import Dict, List, Optional
+from handlers.geometry import shape_points, stop_positions
+from handlers.gtfs import feed_now, get_feed
+from handlers.journey import INF, active_services, earliest_arrival, get_timetable, _clock
+
+# Walking from the last station reached, for the optional walk-out polygons
+WALK_METRES_PER_MINUTE = 80
+MAX_WALK_METRES = 1000
+CIRCLE_POINTS = 16
+
+def _reach(from_stop_id, when: Optional[datetime], max_minutes: int, accessible: bool) -> Optional[tuple]:
+    """(view, departure, {stop: arrival}, trips per stop) for one pruned RAPTOR pass"""
+    when = when or feed_now()
+    timetable = get_timetable()
+    origin = timetable.stop_index.get(from_stop_id)
+    if origin is None:
+        return None
+    view = timetable.view(active_services(get_feed(), when.date()), accessible)
+    depart = when.hour * 3600 + when.minute * 60 + when.second
+    trips = [0] * len(timetable.stop_ids)
+    if not view.usable[origin]:
+        return view, depart, {}, trips
+    best = earliest_arrival(view, {origin: depart}, max_arrival=depart + max_minutes * 60, trips_taken=trips)
+    reached = sorted((stop for stop, arrival in enumerate(best) if arrival < INF), key=lambda stop: best[stop])
+    return view, depart, {stop: best[stop] for stop in reached}, trips
+
+def reachable(from_stop_id, when: Optional[datetime] = None, max_minutes: int = 30,
+              accessible: bool = False) -> Optional[Dict]:
+    """Earliest arrival at every stop reachable from `from_stop_id` within `max_minutes`.
+
+    One RAPTOR pass with no target, pruned at the time budget, so it costs
+    about the same as a single point-to-point query. Stops come back as
+    parallel columns ordered by arrival.
+    """
+    reach = _reach(from_stop_id, when, max_minutes, accessible)
+    if reach is None:
+        return None
+    view, depart, arrivals, trips = reach
+    timetable = view.timetable
+    return {
+        'from_station': timetable.stop_names[timetable.stop_index[from_stop_id]],
+        'departure_time': _clock(depart),
+        'max_minutes': max_minutes,
+        'step_free_only': accessible,
+        'count': len(arrivals),
+        'stops': {
+            'stop_id': [timetable.stop_ids[stop] for stop in arrivals],
+            'stop_name': [timetable.stop_names[stop] for stop in arrivals],
+            'lat': [timetable.coords[stop][0] for stop in arrivals],
+            'lon': [timetable.coords[stop][1] for stop in arrivals],
+            'arrival_time': [_clock(arrival) for arrival in arrivals.values()],
+            'minutes': [round((arrival - depart) / 60, 1) for arrival in arrivals.values()],
+            'interchanges': [max(trips[stop] - 1, 0) for stop in arrivals],
+        },
+    }
+
+def _circle(lon: float, lat: float, metres: float) -> List[List[float]]:
+    d_lat = metres / 111320
+    d_lon = d_lat / max(math.cos(math.radians(lat)), 1e-6)
+    ring = [[round(lon + d_lon * math.cos(2 * math.pi * i / CIRCLE_POINTS), 6),
+             round(lat + d_lat * math.sin(2 * math.pi * i / CIRCLE_POINTS), 6)] for i in range(CIRCLE_POINTS)]
+    return ring + [ring[0]]
+
+def isochrone_geojson(from_stop_id, when: Optional[datetime] = None, max_minutes: int = 30,
+                     accessible: bool = False, walk: bool = False) -> Optional[Dict]:
+    """reachable() as GeoJSON: stops as Points, the track between reached stops as
+    LineStrings along shapes.txt, and with `walk` a circle around each stop sized
+    by the minutes left over."""
+    reach = _reach(from_stop_id, when, max_minutes, accessible)
+    if reach is None:
+        return None
+    view, depart, arrivals, _ = reach
+    timetable = view.timetable
+    budget = depart + max_minutes * 60
+    features = []
+    for stop, arrival in arrivals.items():
+        lat, lon = timetable.coords[stop]
+        properties = {'stop_id': timetable.stop_ids[stop], 'stop_name': timetable.stop_names[stop],
+                      'arrival_time': _clock(arrival), 'minutes': round((arrival - depart) / 60, 1)}
+        features.append({'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [lon, lat]},
+                         'properties': properties})
+        if walk:
+            metres = min((budget - arrival) / 60 * WALK_METRES_PER_MINUTE, MAX_WALK_METRES)
+            if metres > 0:
+                features.append({'type': 'Feature',
+                                 'geometry': {'type': 'Polygon', 'coordinates': [_circle(lon, lat, metres)]},
+                                 'properties': dict(properties, walk_metres=round(metres))})
+
+    # Track between consecutive reached stops, each shape segment once
+    points = shape_points()
+    positions = stop_positions()
+    seen = set()
+    for pattern in view.patterns:
+        for a, b in zip(pattern.stops, pattern.stops[1:]):
+            if a not in arrivals or b not in arrivals:
+                continue
+            key = tuple(sorted((a, b)))
+            if key in seen:
+                continue
+            seen.add(key)
+            coordinates = []
+            start, end = positions.get((pattern.shape_id, a)), positions.get((pattern.shape_id, b))
+            if start is not None and end is not None:
+                start, end = sorted((start, end))
+                coordinates = [list(point) for point in points[pattern.shape_id][start:end + 1]]
+            if len(coordinates) < 2:
+                coordinates = [[timetable.coords[s][1], timetable.coords[s][0]] for s in (a, b)]
+            features.append({'type': 'Feature', 'geometry': {'type': 'LineString', 'coordinates': coordinates},
+                             'properties': {'route_id': str(pattern.route_id),
+                                            'line': timetable.route_names.get(pattern.route_id, ('', ''))[0]}})
+    return {'type': 'FeatureCollection', 'features': features,
+            'properties': {'from_station': timetable.stop_names[timetable.stop_index[from_stop_id]],
+                           'departure_time': _clock(depart), 'max_minutes': max_minutes,
+                           'step_free_only': accessible, 'count': len(arrivals)}}
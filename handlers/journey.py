@@ -0,0 +1,577 @@
+import os
+import bisect
+import threading
+from array import array
+from datetime import date, datetime
+from typing import Dict, List, Optional
+from handlers.gtfs import GTFSFeed, feed_now, get_feed, gtfs_seconds
+
+INF = 1 << 30
+# Minimum time to change lines inside a station, and via lifts for step-free journeys
+TRANSFER_SECONDS = int(os.getenv('TRANSFER_SECONDS', '180'))
+ACCESSIBLE_TRANSFER_SECONDS = int(os.getenv('ACCESSIBLE_TRANSFER_SECONDS', '300'))
+# GTFS trips.wheelchair_accessible / stops.wheelchair_boarding values
+ACCESS_UNKNOWN, ACCESS_YES, ACCESS_NO = 0, 1, 2
+# Rounds = trips taken, so five rounds allow four interchanges
+MAX_ROUNDS = 5
+# Alternatives may take up to twice as long as the fastest journey, and at least this much longer
+EXTRA_MINUTES = 30
+NO_OVERLAY = ({}, 0, 0)
+NOT_DELAYED = ()
+WEEKDAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+
+class Pattern:
+    """Trips of one route that serve the same stop sequence, ordered by departure"""
+    __slots__ = ('route_id', 'shape_id', 'stops', 'km', 'trip_ids', 'services', 'access', 'arrivals',
+                 'departures', 'departure_columns', 'overlay')
+
+    def __init__(self, route_id, stops: List[int], km: List[float], shape_id=None):
+        self.route_id = route_id
+        self.shape_id = shape_id
+        self.stops = stops
+        self.km = km                  # cumulative track distance at each stop
+        self.trip_ids = []
+        self.services = []
+        self.access = []              # per trip, wheelchair_accessible
+        self.arrivals = []            # per trip, int32 array of seconds at each stop
+        self.departures = []
+        self.departure_columns = []   # per stop, int32 array of every trip's departure (for bisect)
+        # Live overlay: ({trip: (arrivals, departures) with the real-time delay applied}, max delay,
+        # min delay), holding only delayed or cancelled trips; the arrays above are never modified
+        self.overlay = NO_OVERLAY
+
+    def add_trip(self, trip_id, service, access: int, arrivals: List[int], departures: List[int]):
+        self.trip_ids.append(trip_id)
+        self.services.append(service)
+        self.access.append(access)
+        self.arrivals.append(arrivals)
+        self.departures.append(departures)
+
+    def finish(self):
+        # Trips on one pattern do not overtake, so sorting by first departure
+        # keeps every stop's departure column sorted too
+        order = sorted(range(len(self.trip_ids)), key=lambda t: self.departures[t][0])
+        self.trip_ids = [self.trip_ids[t] for t in order]
+        self.services = [self.services[t] for t in order]
+        self.access = [self.access[t] for t in order]
+        self.arrivals = [self.arrivals[t] for t in order]
+        self.departures = [self.departures[t] for t in order]
+        self.departure_columns = [array('i', [trip[pos] for trip in self.departures]) for pos in range(len(self.stops))]
+        return self
+
+    def rows(self, trip: int):
+        """Arrival and departure rows of `trip` as currently expected"""
+        live = self.overlay[0]
+        return live[trip] if trip in live else (self.arrivals[trip], self.departures[trip])
+
+    def earliest_trip(self, pos: int, ready: int) -> Optional[int]:
+        """Index of the first trip leaving stop `pos` at or after `ready`"""
+        column = self.departure_columns[pos]
+        live, max_delay, min_delay = self.overlay
+        if not live:
+            index = bisect.bisect_left(column, ready)
+            return index if index < len(self.trip_ids) else None
+        # A late trip scheduled before `ready` may still be catchable, so start the scan
+        # max_delay earlier and stop once no scheduled time plus min_delay can beat the best
+        best, best_departure = None, INF
+        for trip in range(bisect.bisect_left(column, ready - max_delay), len(column)):
+            if column[trip] + min_delay >= best_departure:
+                break
+            departure = live[trip][1][pos] if trip in live else column[trip]
+            if ready <= departure < best_departure:
+                best, best_departure = trip, departure
+        return best
+
+    def upcoming(self, pos: int, after: int, limit: int) -> List[tuple]:
+        """Up to `limit` (expected departure, trip) from stop `pos` at or after `after`, soonest first"""
+        column = self.departure_columns[pos]
+        live, max_delay, min_delay = self.overlay
+        found = []
+        for trip in range(bisect.bisect_left(column, after - max_delay), len(column)):
+            if len(found) >= limit and column[trip] + min_delay >= found[limit - 1][0]:
+                break
+            departure = live[trip][1][pos] if trip in live else column[trip]
+            if after <= departure < INF:
+                bisect.insort(found, (departure, trip))
+        return found[:limit]
+
+    def set_live(self, live: Dict[int, tuple]):
+        """Swap in a new overlay; readers see either the old or the new one, never a mix"""
+        offsets = [departure - scheduled for trip, (_, departures) in live.items()
+                   for departure, scheduled in zip(departures, self.departures[trip]) if departure < INF]
+        self.overlay = (live, max(offsets + [0]), min(offsets + [0])) if live else NO_OVERLAY
+
+    def filtered(self, keep) -> 'Pattern':
+        pattern = Pattern(self.route_id, self.stops, self.km, self.shape_id)
+        for t, trip_id in enumerate(self.trip_ids):
+            if keep(self, t):
+                pattern.add_trip(trip_id, self.services[t], self.access[t], self.arrivals[t], self.departures[t])
+        return pattern.finish()
+
+class TimetableView:
+    """The patterns RAPTOR scans for one query: a subset of the timetable's trips"""
+
+    def __init__(self, timetable: 'Timetable', patterns: List[Pattern], accessible: bool = False):
+        self.timetable = timetable
+        self.patterns = patterns
+        self.accessible = accessible
+        self.transfer_seconds = ACCESSIBLE_TRANSFER_SECONDS if accessible else TRANSFER_SECONDS
+        # Stops where a passenger may get on or off; step-free views drop stations known to lack it
+        self.usable = [not accessible or access != ACCESS_NO for access in timetable.stop_access]
+        self.stop_patterns = [[] for _ in timetable.stop_ids]
+        for index, pattern in enumerate(patterns):
+            for pos, stop in enumerate(pattern.stops):
+                self.stop_patterns[stop].append((index, pos))
+
+class Timetable:
+    """stop_times regrouped into patterns with plain-list arrays for round-based search"""
+
+    def __init__(self, feed: GTFSFeed):
+        import math
+        from handlers.route_finder import calculate_distance
+        stops = feed.stops
+        self.stop_ids = stops['stop_id'].tolist()
+        self.stop_index = {stop_id: i for i, stop_id in enumerate(self.stop_ids)}
+        self.stop_names = stops['stop_name'].astype(str).tolist()
+        coords = self.coords = list(zip(stops['stop_lat'].astype(float), stops['stop_lon'].astype(float)))
+        self.route_names = {route_id: (short, long) for route_id, short, long in zip(
+            feed.routes['route_id'], feed.routes['route_short_name'], feed.routes['route_long_name'])}
+        trip_route = dict(zip(feed.trips['trip_id'], feed.trips['route_id']))
+        trip_service = dict(zip(feed.trips['trip_id'], feed.trips['service_id'].astype(str)))
+        shaped = feed.trips.dropna(subset=['shape_id'])
+        trip_shape = dict(zip(shaped['trip_id'], shaped['shape_id']))
+        trip_access = dict(zip(feed.trips['trip_id'], _access_codes(feed.trips.get('wheelchair_accessible'), len(feed.trips))))
+        self.stop_access = _access_codes(stops.get('wheelchair_boarding'), len(stops))
+        self.patterns = []
+        self._views = {}
+        self._lock = threading.Lock()
+        # Real-time delays currently applied, and where each trip sits in every pattern copy
+        self.delays = {}
+        self._slots = {}
+
+        stop_times = feed.stop_times.sort_values(['trip_id', 'stop_sequence'], kind='stable')
+        stop_times = stop_times[stop_times['stop_id'].isin(self.stop_index)]
+        if stop_times.empty:
+            return
+        trip_col = stop_times['trip_id'].to_numpy()
+        stop_col = stop_times['stop_id'].map(self.stop_index).astype(int).tolist()
+        # Rows are int32 arrays cut straight from these buffers, 4 bytes a time instead of an int object
+        arrivals = gtfs_seconds(stop_times['arrival_time'])
+        departures = gtfs_seconds(stop_times['departure_time'])
+        bounds = [0] + (1 + (trip_col[1:] != trip_col[:-1]).nonzero()[0]).tolist() + [len(trip_col)]
+
+        by_sequence = {}
+        for start, end in zip(bounds, bounds[1:]):
+            trip_id = trip_col[start]
+            route_id = trip_route.get(trip_id)
+            sequence = tuple(stop_col[start:end])
+            if route_id is None or len(sequence) < 2:
+                continue
+            pattern = by_sequence.get((route_id, sequence))
+            if pattern is None:
+                km = [0.0]
+                for a, b in zip(sequence, sequence[1:]):
+                    km.append(km[-1] + calculate_distance(*coords[a], *coords[b]))
+                km = [0.0 if math.isnan(value) else value for value in km]
+                pattern = by_sequence[(route_id, sequence)] = Pattern(route_id, list(sequence), km,
+                                                                      trip_shape.get(trip_id))
+            pattern.add_trip(trip_id, trip_service.get(trip_id), trip_access.get(trip_id, ACCESS_UNKNOWN),
+                             array('i', arrivals[start:end].tobytes()), array('i', departures[start:end].tobytes()))
+        self.patterns = [pattern.finish() for pattern in by_sequence.values()]
+        self._register(self.patterns)
+
+    def _register(self, patterns: List[Pattern]):
+        for pattern in patterns:
+            for t, trip_id in enumerate(pattern.trip_ids):
+                self._slots.setdefault(trip_id, []).append((pattern, t))
+
+    def trip_slot(self, trip_id) -> Optional[tuple]:
+        """(pattern, trip index) of `trip_id` in the full timetable, or None"""
+        slots = self._slots.get(trip_id)
+        return slots[0] if slots else None
+
+    def _overlay(self, trip_ids, delays: Dict) -> int:
+        """Rebuild the live rows of `trip_ids` from `delays`; returns the patterns touched"""
+        touched = {}
+        for trip_id in trip_ids:
+            for pattern, t in self._slots.get(trip_id, ()):
+                touched.setdefault(pattern, {})[t] = delays.get(trip_id, NOT_DELAYED)
+        for pattern, trips in touched.items():
+            live = dict(pattern.overlay[0])
+            for t, steps in trips.items():
+                if steps is NOT_DELAYED:
+                    live.pop(t, None)
+                else:
+                    live[t] = delayed_rows(pattern.arrivals[t], pattern.departures[t], steps)
+            pattern.set_live(live)
+        return len(touched)
+
+    def apply_delays(self, delays: Dict[str, Optional[List[tuple]]]) -> int:
+        """Make `delays` the live overlay: {trip_id: [(position, arrival delay, departure delay)]
+        sorted by position, or None if cancelled}. Trips absent from `delays` run to schedule.
+
+        Only trips whose delay changed are rebuilt, and the scheduled arrays are left as they
+        are, so the cost follows the size of the update rather than the timetable's.
+        Returns the number of patterns touched.
+        """
+        with self._lock:
+            previous = self.delays
+            changed = [trip_id for trip_id in set(previous) | set(delays)
+                       if previous.get(trip_id, NOT_DELAYED) != delays.get(trip_id, NOT_DELAYED)]
+            touched = self._overlay(changed, delays)
+            self.delays = dict(delays)
+        return touched
+
+    def view(self, services: Optional[frozenset] = None, accessible: bool = False) -> TimetableView:
+        """Patterns restricted to trips running on `services` (None = every trip), and for
+        `accessible` to trips not marked wheelchair-inaccessible. Built once per key."""
+        key = (services, accessible)
+        view = self._views.get(key)
+        if view is None:
+            with self._lock:
+                view = self._views.get(key)
+                if view is None:
+                    def keep(pattern, t):
+                        return ((services is None or pattern.services[t] in services)
+                                and not (accessible and pattern.access[t] == ACCESS_NO))
+                    if services is None and not accessible:
+                        patterns = self.patterns
+                    else:
+                        patterns = [p.filtered(keep) for p in self.patterns]
+                        patterns = [p for p in patterns if p.trip_ids]
+                        self._register(patterns)
+                        for pattern in patterns:
+                            delays = self.delays
+                            live = {t: delayed_rows(pattern.arrivals[t], pattern.departures[t], delays[trip_id])
+                                    for t, trip_id in enumerate(pattern.trip_ids) if trip_id in delays}
+                            if live:
+                                pattern.set_live(live)
+                    view = self._views[key] = TimetableView(self, patterns, accessible)
+        return view
+
+def delayed_rows(arrivals: List[int], departures: List[int], steps: Optional[List[tuple]]) -> tuple:
+    """A trip's arrival and departure rows with GTFS-Realtime delays applied.
+
+    Each (position, arrival delay, departure delay) step holds from its stop onwards
+    until the next step, as StopTimeUpdates propagate; stops before the first step
+    keep their schedule. A cancelled trip (None) never arrives or departs.
+    """
+    if steps is None:
+        return array('i', [INF]) * len(arrivals), array('i', [INF]) * len(departures)
+    live_arrivals, live_departures = array('i', arrivals), array('i', departures)
+    for i, (pos, arrival_delay, departure_delay) in enumerate(steps):
+        end = steps[i + 1][0] if i + 1 < len(steps) else len(arrivals)
+        live_arrivals[pos] += arrival_delay
+        live_departures[pos] = max(live_departures[pos] + departure_delay, live_arrivals[pos])
+        for later in range(pos + 1, end):
+            live_arrivals[later] += departure_delay
+            live_departures[later] += departure_delay
+    return live_arrivals, live_departures
+
+def _access_codes(column, length: int) -> List[int]:
+    """GTFS accessibility column as ints, 0 (no information) where missing"""
+    if column is None:
+        return [ACCESS_UNKNOWN] * length
+    return column.fillna(ACCESS_UNKNOWN).astype(int).tolist()
+
+def get_timetable() -> Timetable:
+    return get_feed().derived('timetable', Timetable)
+
+def active_services(feed: GTFSFeed, day: date) -> Optional[frozenset]:
+    """service_ids running on `day`, or None when the feed has no calendar"""
+    calendar = feed.calendar
+    if calendar.empty:
+        return None
+    on_day = calendar[calendar[WEEKDAYS[day.weekday()]] == 1]
+    stamp = int(day.strftime('%Y%m%d'))
+    in_range = on_day[(on_day['start_date'] <= stamp) & (on_day['end_date'] >= stamp)]
+    # An expired feed still describes the weekly timetable, so fall back to the weekday match
+    chosen = in_range if not in_range.empty else on_day
+    return frozenset(chosen['service_id'].astype(str))
+
+def earliest_arrival(view: TimetableView, sources: Dict[int, int], target: Optional[int] = None,
+                     max_rounds: int = MAX_ROUNDS, max_arrival: int = INF,
+                     trips_taken: Optional[List[int]] = None, km_travelled: Optional[List[float]] = None) -> List[int]:
+    """RAPTOR: earliest arrival (seconds) at every stop from `sources` {stop: departure}.
+
+    Arrivals after `max_arrival` are ignored. If `trips_taken` / `km_travelled`
+    are given they are filled with the trips used and track distance of the
+    journey behind each stop's arrival.
+    """
+    best = [INF] * len(view.stop_patterns)
+    for stop, time in sources.items():
+        best[stop] = min(best[stop], time)
+    previous = list(best)
+    marked = set(sources)
+
+    for round_ in range(1, max_rounds + 1):
+        queue = {}
+        for stop in marked:
+            for index, pos in view.stop_patterns[stop]:
+                if pos < queue.get(index, INF):
+                    queue[index] = pos
+        marked = set()
+        current = list(previous)
+        previous_km = list(km_travelled) if km_travelled is not None else None
+        change = view.transfer_seconds if round_ > 1 else 0
+
+        for index, start in queue.items():
+            pattern = view.patterns[index]
+            trip = board = arrival_row = departure_row = None
+            for pos in range(start, len(pattern.stops)):
+                stop = pattern.stops[pos]
+                if trip is not None and view.usable[stop]:
+                    arrival = arrival_row[pos]
+                    bound = best[stop] if target is None else min(best[stop], best[target])
+                    if arrival < bound and arrival <= max_arrival:
+                        best[stop] = current[stop] = arrival
+                        marked.add(stop)
+                        if trips_taken is not None:
+                            trips_taken[stop] = round_
+                        if km_travelled is not None:
+                            km_travelled[stop] = previous_km[pattern.stops[board]] + pattern.km[pos] - pattern.km[board]
+                if previous[stop] < INF and (trip is None or previous[stop] + change <= departure_row[pos]):
+                    earlier = pattern.earliest_trip(pos, previous[stop] + change)
+                    if earlier is not None and earlier != trip:
+                        rows = pattern.rows(earlier)
+                        if trip is None or rows[1][pos] < departure_row[pos]:
+                            trip, board = earlier, pos
+                            arrival_row, departure_row = rows
+        previous = current
+        if not marked:
+            break
+    return best
+
+# McRAPTOR labels: (arrival, km travelled, trips taken, parent label, leg)
+# where leg = (pattern index, trip index, board position, alight position)
+
+def _dominated(bag: List[tuple], arrival: int, km: float) -> bool:
+    return any(label[0] <= arrival and label[1] <= km for label in bag)
+
+def _add(bag: List[tuple], label: tuple):
+    bag[:] = [other for other in bag if not (label[0] <= other[0] and label[1] <= other[1])]
+    bag.append(label)
+
+def pareto_search(view: TimetableView, origin: int, target: int, depart: int,
+                  max_rounds: int = MAX_ROUNDS, extra_minutes: int = EXTRA_MINUTES) -> List[tuple]:
+    """McRAPTOR over (arrival, distance, trips); returns every label that reached `target`.
+
+    A plain earliest-arrival pass runs first and bounds the search (twice
+    the fastest travel time, at least `extra_minutes` more), so alternatives
+    come out of one pruned multi-criteria search instead of k separate ones.
+    """
+    fastest = earliest_arrival(view, {origin: depart}, target, max_rounds)[target]
+    if fastest >= INF:
+        return []
+    cap = fastest + max(extra_minutes * 60, fastest - depart)
+
+    start_label = (depart, 0.0, 0, None, None)
+    best_bags = {origin: [start_label]}
+    target_bag = []
+    reached = []
+    previous_bags = {origin: [start_label]}
+
+    for round_ in range(1, max_rounds + 1):
+        queue = {}
+        for stop in previous_bags:
+            for index, pos in view.stop_patterns[stop]:
+                if pos < queue.get(index, INF):
+                    queue[index] = pos
+        round_bags = {}
+
+        for index, start in queue.items():
+            pattern = view.patterns[index]
+            km = pattern.km
+            route_bag = []  # (trip, board position, label at boarding, (arrivals, departures))
+            for pos in range(start, len(pattern.stops)):
+                stop = pattern.stops[pos]
+                bag = best_bags.setdefault(stop, [])
+                for trip, board, boarded, rows in route_bag:
+                    arrival = rows[0][pos]
+                    if arrival > cap or not view.usable[stop]:
+                        continue
+                    travelled = boarded[1] + km[pos] - km[board]
+                    label = (arrival, travelled, round_, boarded, (index, trip, board, pos))
+                    if stop == target:
+                        reached.append(label)
+                    if _dominated(bag, arrival, travelled) or _dominated(target_bag, arrival, travelled):
+                        continue
+                    _add(bag, label)
+                    round_bags.setdefault(stop, []).append(label)
+                    if stop == target:
+                        _add(target_bag, label)
+
+                for label in previous_bags.get(stop, ()):
+                    # Getting off and back onto the same line is never a useful alternative
+                    if label[4] is not None and view.patterns[label[4][0]].route_id == pattern.route_id:
+                        continue
+                    ready = label[0] + (view.transfer_seconds if label[4] is not None else 0)
+                    trip = pattern.earliest_trip(pos, ready)
+                    if trip is None:
+                        continue
+                    # Compare trips by expected departure here: a delayed trip may fall behind the next one
+                    rows = pattern.rows(trip)
+                    departure = rows[1][pos]
+                    offset = label[1] - km[pos]
+                    if any(r[1][pos] <= departure and l[1] - km[b] <= offset for _, b, l, r in route_bag):
+                        continue
+                    route_bag = [(t, b, l, r) for t, b, l, r in route_bag
+                                 if not (departure <= r[1][pos] and offset <= l[1] - km[b])]
+                    route_bag.append((trip, pos, label, rows))
+
+        # Carry forward only labels that are still Pareto-optimal at their stop
+        previous_bags = {}
+        for stop, labels in round_bags.items():
+            alive = [label for label in labels if any(label is kept for kept in best_bags[stop])]
+            if alive and stop != target:
+                previous_bags[stop] = alive
+        if not previous_bags:
+            break
+    return reached
+
+def _clock(seconds: int) -> str:
+    return f"{(seconds // 3600) % 24:02d}:{(seconds % 3600) // 60:02d}"
+
+ACCESS_LABELS = {ACCESS_UNKNOWN: 'unknown', ACCESS_YES: 'yes', ACCESS_NO: 'no'}
+
+ACCESS_CODES = {label: code for code, label in ACCESS_LABELS.items()}
+
+def _step_free(*codes: int) -> str:
+    """'yes' only if every trip and station is marked accessible, 'no' if any is marked not"""
+    if ACCESS_NO in codes:
+        return 'no'
+    return 'yes' if all(code == ACCESS_YES for code in codes) else 'unknown'
+
+def _legs(view: TimetableView, label: tuple) -> List[Dict]:
+    timetable = view.timetable
+    legs = []
+    while label[3] is not None:
+        index, trip, board, alight = label[4]
+        pattern = view.patterns[index]
+        arrivals, departures = pattern.rows(trip)
+        short, long = timetable.route_names.get(pattern.route_id, ('', ''))
+        leg = {
+            'line': short,
+            'line_name': long,
+            'from': timetable.stop_names[pattern.stops[board]],
+            'to': timetable.stop_names[pattern.stops[alight]],
+            'from_stop_id': timetable.stop_ids[pattern.stops[board]],
+            'to_stop_id': timetable.stop_ids[pattern.stops[alight]],
+            'shape_id': pattern.shape_id,
+            'direction': f"Towards {timetable.stop_names[pattern.stops[-1]]}",
+            'departure_time': _clock(departures[board]),
+            'arrival_time': _clock(arrivals[alight]),
+            'stops': alight - board,
+            'wheelchair_accessible': ACCESS_LABELS.get(pattern.access[trip], 'unknown'),
+            'step_free': _step_free(pattern.access[trip], timetable.stop_access[pattern.stops[board]],
+                                    timetable.stop_access[pattern.stops[alight]]),
+        }
+        delay = departures[board] - pattern.departures[trip][board]
+        if delay:
+            leg['delay_minutes'] = round(delay / 60)
+        legs.append(leg)
+        label = label[3]
+    legs.reverse()
+    return legs
+
+def rank_journeys(view: TimetableView, labels: List[tuple], max_journeys: int) -> List[Dict]:
+    """Distinct itineraries ranked by Pareto front over (arrival, interchanges, fare).
+
+    Journeys boarding and alighting at the same stations are one itinerary whichever
+    route variant carries each leg, so only the earliest-arriving of them is ranked.
+    """
+    from handlers.route_finder import fare_for_distance
+    itineraries = {}
+    for label in labels:
+        signature, visited, node = [], [], label
+        while node[3] is not None:
+            index, _, board, alight = node[4]
+            pattern = view.patterns[index]
+            signature.append((pattern.stops[board], pattern.stops[alight]))
+            visited.extend(pattern.stops[board + 1:alight + 1])
+            node = node[3]
+        # Skip journeys that double back through a station they already passed, the origin included
+        if signature:
+            visited.append(signature[-1][0])
+        if len(visited) != len(set(visited)):
+            continue
+        signature = tuple(signature)
+        if signature not in itineraries or label[0] < itineraries[signature][0]:
+            itineraries[signature] = label
+
+    scored = [(label[0], label[2] - 1, fare_for_distance(label[1]), label) for label in itineraries.values()]
+    ranked, rank = [], 1
+    while scored:
+        front = [s for s in scored if not any(
+            o[0] <= s[0] and o[1] <= s[1] and o[2] <= s[2] and o[:3] != s[:3] for o in scored)]
+        ranked.extend((rank, s) for s in front)
+        scored = [s for s in scored if s not in front]
+        rank += 1
+    ranked.sort(key=lambda item: (item[0], item[1][0], item[1][1], item[1][2]))
+
+    journeys = []
+    for rank, (arrival, interchanges, fare, label) in ranked[:max_journeys]:
+        legs = _legs(view, label)
+        departure = _first_departure(view, label)
+        journeys.append({
+            'type': 'Direct' if interchanges == 0 else 'Interchange',
+            'route_type': 'Direct' if interchanges == 0 else f"{interchanges} interchange{'s' if interchanges > 1 else ''}",
+            'line': legs[0]['line'],
+            'line_name': legs[0]['line_name'],
+            'departure_time': _clock(departure),
+            'arrival_time': _clock(arrival),
+            'estimated_minutes': round((arrival - departure) / 60),
+            'interchanges': interchanges,
+            'interchange_stations': [leg['from'] for leg in legs[1:]],
+            'distance_km': round(label[1], 1),
+            'fare': fare,
+            'pareto_rank': rank,
+            'step_free': _step_free(*(ACCESS_CODES[leg['step_free']] for leg in legs)),
+            'legs': legs,
+        })
+    return journeys
+
+def _first_departure(view: TimetableView, label: tuple) -> int:
+    while label[3][3] is not None:
+        label = label[3]
+    index, trip, board, _ = label[4]
+    return view.patterns[index].rows(trip)[1][board]
+
+STEP_FREE_NEEDS = ('wheelchair', 'step_free', 'mobility')
+
+def valid_accessibility_needs(accessibility_needs) -> bool:
+    """The shapes user_preferences.accessibility_needs may take: {"wheelchair": true, ...},
+    a list of needs such as ["wheelchair"], or a single need such as 'mobility'"""
+    if isinstance(accessibility_needs, (dict, str)):
+        return True
+    return isinstance(accessibility_needs, (list, tuple)) and all(isinstance(need, str) for need in accessibility_needs)
+
+def requires_step_free(accessibility_needs) -> bool:
+    """Whether saved accessibility needs (see valid_accessibility_needs) ask for step-free journeys"""
+    if not valid_accessibility_needs(accessibility_needs):
+        return False
+    if isinstance(accessibility_needs, dict):
+        return any(accessibility_needs.get(key) for key in STEP_FREE_NEEDS)
+    if isinstance(accessibility_needs, str):
+        accessibility_needs = [accessibility_needs]
+    return any(need.lower() in STEP_FREE_NEEDS for need in accessibility_needs)
+
+def plan_journeys(from_stop_id, to_stop_id, when: Optional[datetime] = None, max_journeys: int = 3,
+                  accessible: bool = False) -> List[Dict]:
+    """Pareto-optimal journeys (time, interchanges, fare) leaving `from_stop_id` at or after `when`.
+
+    With `accessible`, only trips and stations not marked wheelchair-inaccessible
+    are used and interchanges get ACCESSIBLE_TRANSFER_SECONDS.
+    """
+    when = when or feed_now()
+    timetable = get_timetable()
+    origin = timetable.stop_index.get(from_stop_id)
+    target = timetable.stop_index.get(to_stop_id)
+    if origin is None or target is None or origin == target:
+        return []
+    view = timetable.view(active_services(get_feed(), when.date()), accessible)
+    if not (view.usable[origin] and view.usable[target]):
+        return []
+    depart = when.hour * 3600 + when.minute * 60 + when.second
+    labels = pareto_search(view, origin, target, depart)
+    return rank_journeys(view, labels, max_journeys)
@@ -0,0 +1,159 @@
+import re
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Tuple
+from handlers.gtfs import GTFSFeed, get_feed
+
+# Devanagari to a plain ITRANS-like romanization. Only consonant skeletons are compared,
+# so vowel length and the inherent 'a' need not be exact.
+_VOWELS = {'अ': 'a', 'आ': 'aa', 'इ': 'i', 'ई': 'ii', 'उ': 'u', 'ऊ': 'uu', 'ऋ': 'ri', 'ए': 'e', 'ऐ': 'ai',
+           'ओ': 'o', 'औ': 'au', 'ऑ': 'o', 'ऍ': 'e'}
+_SIGNS = {'ा': 'aa', 'ि': 'i', 'ी': 'ii', 'ु': 'u', 'ू': 'uu', 'ृ': 'ri', 'े': 'e', 'ै': 'ai', 'ो': 'o', 'ौ': 'au',
+          'ॉ': 'o', 'ॅ': 'e', '्': '', 'ं': 'n', 'ँ': 'n', 'ः': 'h', '‌': '', '‍': ''}
+_CONSONANTS = {'क': 'k', 'ख': 'kh', 'ग': 'g', 'घ': 'gh', 'ङ': 'n', 'च': 'ch', 'छ': 'chh', 'ज': 'j', 'झ': 'jh',
+               'ञ': 'n', 'ट': 't', 'ठ': 'th', 'ड': 'd', 'ढ': 'dh', 'ण': 'n', 'त': 't', 'थ': 'th', 'द': 'd',
+               'ध': 'dh', 'न': 'n', 'प': 'p', 'फ': 'ph', 'ब': 'b', 'भ': 'bh', 'म': 'm', 'य': 'y', 'र': 'r',
+               'ल': 'l', 'व': 'v', 'श': 'sh', 'ष': 'sh', 'स': 's', 'ह': 'h',
+               'क़': 'q', 'ख़': 'kh', 'ग़': 'g', 'ज़': 'z', 'ड़': 'r', 'ढ़': 'rh', 'फ़': 'f', 'य़': 'y'}
+# Consonant plus nukta written as two code points
+_NUKTA = {'क': 'q', 'ख': 'kh', 'ग': 'g', 'ज': 'z', 'ड': 'r', 'ढ': 'rh', 'फ': 'f', 'य': 'y'}
+_DIGITS = {chr(0x966 + i): str(i) for i in range(10)}
+_DEVANAGARI = re.compile(r'[ऀ-ॿ]')
+_WORDS = re.compile(r'[a-z0-9]+')
+
+# Spelling variants collapsed before vowels are dropped: aspirates, sibilants, c/k/q, v/w, z/j
+_DIGRAPHS = [('chh', 'C'), ('ch', 'C'), ('sh', 's'), ('ph', 'f'), ('kh', 'k'), ('gh', 'g'), ('jh', 'j'),
+             ('th', 't'), ('dh', 'd'), ('bh', 'b'), ('ck', 'k'), ('q', 'k'), ('x', 'ks'), ('z', 'j')]
+_SOFT_C = re.compile(r'c(?=[eiy])')
+# w/y after a vowel and not before one is a vowel glide (chowk, new, malviya)
+_GLIDE = re.compile(r'(?<=[aeiou])[wy](?![aeiou])')
+_SOFT_LETTERS = re.compile(r'[aeiouhy]')
+# Short abbreviations in GTFS stop names, expanded so spoken forms match
+ABBREVIATIONS = {'sec': 'sector', 'ext': 'extension', 'cantt': 'cantonment', 'stn': 'station'}
+# Hindi/Hinglish function words that must never match a one-word station on their own
+STOPWORDS = {'se', 'tak', 'ka', 'ki', 'ke', 'ko', 'hai', 'kya', 'kaise', 'kitna', 'kitne', 'kab', 'mujhe', 'jana',
+             'jaana', 'chahiye', 'aur', 'par', 'pe', 'me', 'mein', 'ek', 'agli', 'agla', 'kiraya', 'metro', 'train',
+             'station', 'to', 'from', 'the'}
+
+def romanize(text: str) -> str:
+    """Lowercase Latin text, with Devanagari transliterated"""
+    if not _DEVANAGARI.search(text):
+        return text.lower()
+    out = []
+    chars = list(text)
+    for i, char in enumerate(chars):
+        following = chars[i + 1] if i + 1 < len(chars) else ''
+        if char in _CONSONANTS:
+            out.append(_NUKTA[char] if following == '़' and char in _NUKTA else _CONSONANTS[char])
+            # Inherent vowel, unless a vowel sign or virama follows or the word ends
+            after = chars[i + 2] if following == '़' and i + 2 < len(chars) else following
+            if after in _CONSONANTS:
+                out.append('a')
+        elif char == '़':
+            continue
+        elif char in _VOWELS:
+            out.append(_VOWELS[char])
+        elif char in _SIGNS:
+            out.append(_SIGNS[char])
+        elif char in _DIGITS:
+            out.append(_DIGITS[char])
+        elif char in '।॥':
+            out.append(' ')
+        else:
+            out.append(char.lower())
+    return ''.join(out)
+
+def words(text: str) -> List[str]:
+    return _WORDS.findall(romanize(text))
+
+def phonetic_key(word: str) -> str:
+    """Consonant skeleton of a romanized word, so 'chowk', 'chauk' and 'चौक' share a key"""
+    if word.isdigit():
+        return str(int(word))
+    for digraph, replacement in _DIGRAPHS:
+        word = word.replace(digraph, replacement)
+    word = _SOFT_C.sub('s', word).replace('c', 'k').replace('C', 'c')
+    word = _GLIDE.sub('', word).replace('w', 'v')
+    first = 'a' if word[:1] in 'aeiou' else word[:1]
+    key = first + _SOFT_LETTERS.sub('', word[1:])
+    return re.sub(r'(.)\1+', r'\1', key)
+
+def name_variants(name: str) -> List[List[str]]:
+    """The word lists a stop name is indexed under: as written, without parenthesized
+    qualifiers, and with two neighbouring words run together ('Janakpuri West')"""
+    variants = []
+    for text in (name, re.sub(r'\s*\([^)]*\)', '', name)):
+        tokens = [ABBREVIATIONS.get(word, word) for word in words(text)]
+        if tokens and tokens not in variants:
+            variants.append(tokens)
+    for tokens in list(variants):
+        variants.extend(tokens[:i] + [tokens[i] + tokens[i + 1]] + tokens[i + 2:] for i in range(len(tokens) - 1))
+    return variants
+
+def _translations(feed: GTFSFeed) -> List[Tuple[str, str]]:
+    """(stop_name, translated name) from translations.txt for stop names in any language"""
+    table = getattr(feed, 'translations', None)
+    if table is None or table.empty:
+        return []
+    rows = table[(table['table_name'] == 'stops') & (table['field_name'] == 'stop_name')]
+    names_by_id = dict(zip(feed.stops['stop_id'].astype(str), feed.stops['stop_name']))
+    pairs = []
+    for record_id, field_value, translation in zip(rows['record_id'], rows['field_value'], rows['translation']):
+        # Rows name the stop either by record_id (stop_id) or by the English field_value
+        if isinstance(record_id, float):
+            record_id = int(record_id) if record_id == record_id else None
+        name = names_by_id.get(str(record_id)) if record_id is not None else None
+        name = name or (field_value if isinstance(field_value, str) else None)
+        if name and isinstance(translation, str):
+            pairs.append((name, translation))
+    return pairs
+
+class StationLexicon:
+    """Phonetic index of stop names and their translations for resolving Hindi,
+    Devanagari and transliterated (Hinglish) station mentions without the LLM"""
+
+    def __init__(self, feed: GTFSFeed):
+        self.index: Dict[tuple, List[str]] = {}
+        self.spellings: Dict[str, List[str]] = {}
+        names = [(name, name) for name in feed.stops['stop_name'].dropna().astype(str)]
+        for name, spelling in names + _translations(feed):
+            for tokens in name_variants(spelling):
+                key = tuple(phonetic_key(word) for word in tokens)
+                candidates = self.index.setdefault(key, [])
+                if name not in candidates:
+                    candidates.append(name)
+                self.spellings.setdefault(name, []).append(' '.join(tokens))
+        self.max_words = max((len(key) for key in self.index), default=0)
+
+    def _pick(self, candidates: List[str], spoken: str) -> str:
+        if len(candidates) == 1:
+            return candidates[0]
+        # Same skeleton: take the name whose spelling is closest to what was said
+        return max(candidates, key=lambda name: max(SequenceMatcher(None, spoken, spelling).ratio()
+                                                    for spelling in self.spellings[name]))
+
+    def find(self, query: str, limit: Optional[int] = None) -> List[str]:
+        """Stations mentioned in `query`, in the order they appear, longest match first"""
+        tokens = [ABBREVIATIONS.get(word, word) for word in words(query)]
+        keys = [phonetic_key(word) for word in tokens]
+        found = []
+        i = 0
+        while i < len(tokens) and (limit is None or len(found) < limit):
+            for n in range(min(self.max_words, len(tokens) - i), 0, -1):
+                candidates = self.index.get(tuple(keys[i:i + n]))
+                if not candidates:
+                    continue
+                spoken = ' '.join(tokens[i:i + n])
+                # A lone word needs a distinctive skeleton or an exact spelling to count
+                if n == 1 and (spoken in STOPWORDS or (len(keys[i]) < 3 and
+                               not any(spoken in self.spellings[name] for name in candidates))):
+                    continue
+                name = self._pick(candidates, spoken)
+                if name not in found:
+                    found.append(name)
+                i += n - 1
+                break
+            i += 1
+        return found
+
+def station_lexicon() -> StationLexicon:
+    return get_feed().derived('station_lexicon', StationLexicon)
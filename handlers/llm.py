@@ -1,58 +1,108 @@
 import os
-import requests
+import asyncio
 import re
 from dotenv import load_dotenv
-import pandas as pd
 from difflib import get_close_matches
+from handlers.gtfs import station_names
+from handlers.lexicon import station_lexicon
+from handlers.admission import admit, admit_async
 
 load_dotenv()
 api_key = os.getenv('GEMINI_API_KEY')
 MODEL = 'gemini-2.0-pro'
+# GEMINI_API_BASE lets benchmarks point the app at a local stand-in server
+GEMINI_API_BASE = os.getenv('GEMINI_API_BASE', 'https://generativelanguage.googleapis.com')
+GEMINI_URL = f"{GEMINI_API_BASE}/v1beta/models/gemini-2.0-flash:generateContent"
+# Seconds to wait for Gemini; a call holds an 'llm' admission slot until it returns
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', '30'))
 
 PLAIN_INSTRUCTION_EN = (
     "Respond in plain text only. Do not use Markdown, bullet points, numbering, or any special formatting. "
     "Provide a coherent, uninterrupted narrative. Avoid using asterisks, hashtags, or any markdown symbols."
 )
 
-# Load station names (English only)
-GTFS_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'gtfs')
-stops_path = os.path.join(GTFS_PATH, 'stops.txt')
-if os.path.exists(stops_path):
-    stops_df = pd.read_csv(stops_path)
-    STATION_NAMES = stops_df['stop_name'].dropna().astype(str).tolist()
-else:
-    STATION_NAMES = []
-
 def fuzzy_find_station(query):
-    matches = get_close_matches(query, STATION_NAMES, n=1, cutoff=0.7)
+    matches = get_close_matches(query, station_names(), n=1, cutoff=0.7)
     return matches[0] if matches else None
 
+# Characters spoken as-is: word characters, whitespace, basic punctuation, and the
+# Devanagari block (\w alone drops vowel signs and viramas, garbling Hindi)
+_SPOKEN = r'\w\s.,!?:;\-()\u0900-\u097f\u200c\u200d'
+# One scan removes '*' and '+' bullets, heading hashes with the whitespace after them,
+# and every other unspoken character (Markdown delimiters, emoji, currency signs)
+_MARKUP = re.compile(rf'^\s*[*+]\s+|#+\s*|[^{_SPOKEN}]+', re.MULTILINE)
+# List markers are matched on the text left after that, so a marker uncovered by
+# removing symbols is stripped now rather than by the next call
+_LIST_MARKERS = re.compile(r'^\s*(?:(?:[-+*]|\d+\.)\s+)+', re.MULTILINE)
+_BLANK_LINES = re.compile(r'\n\s*\n')
+_SPACES = re.compile(r' {2,}')
+# Recent outputs: the same answer is cleaned again by generate_response and the
+# RAG enhancer, and cleaning a cleaned text is a no-op
+_cleaned = {}
+_CLEANED_LIMIT = 256
+
 def clean_text_for_tts(text: str) -> str:
+    """Strip Markdown and symbols TTS would read aloud; idempotent"""
     if not text:
         return ""
-    text = re.sub(r'\*\*(.*?)\*\*', r'\1', text)
-    text = re.sub(r'\*(.*?)\*', r'\1', text)
-    text = re.sub(r'#+\s*(.*)', r'\1', text)
-    text = re.sub(r'`(.*?)`', r'\1', text)
-    text = re.sub(r'~~(.*?)~~', r'\1', text)
-    text = re.sub(r'^\s*[-*+]\s+', '', text, flags=re.MULTILINE)
-    text = re.sub(r'^\s*\d+\.\s+', '', text, flags=re.MULTILINE)
-    text = re.sub(r'\n\s*\n', '\n', text)
-    text = re.sub(r' +', ' ', text)
-    text = text.strip()
-    text = re.sub(r'[^\w\s\.\,\!\?\:\;\-\(\)]', '', text)
+    if text in _cleaned:
+        return text
+    text = _LIST_MARKERS.sub('', _MARKUP.sub('', text))
+    text = _SPACES.sub(' ', _BLANK_LINES.sub('\n', text)).strip()
+    if len(_cleaned) >= _CLEANED_LIMIT:
+        _cleaned.clear()
+    _cleaned[text] = True
     return text
 
+def gemini_request(prompt: str):
+    """Build the URL and payload for a Gemini generateContent call"""
+    url = f"{GEMINI_URL}?key={api_key}"
+    payload = {"contents": [{"parts": [{"text": prompt}]}]}
+    return url, payload
+
+# One pooled client per event loop, so concurrent conversations share connections
+_async_client = None
+_async_client_loop = None
+
+def _get_async_client():
+    global _async_client, _async_client_loop
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_client_loop is not loop:
+        import httpx
+        _async_client = httpx.AsyncClient(
+            timeout=LLM_TIMEOUT,
+            limits=httpx.Limits(max_connections=500, max_keepalive_connections=100)
+        )
+        _async_client_loop = loop
+    return _async_client
+
+async def call_llm_async(prompt: str):
+    """Call Gemini without blocking the event loop, returns None on failure"""
+    url, payload = gemini_request(prompt)
+    # Overloaded from admission propagates; only failures of the call itself mean None
+    async with admit_async('llm'):
+        try:
+            response = await _get_async_client().post(url, json=payload)
+            if response.status_code == 200:
+                return response.json()['candidates'][0]['content']['parts'][0]['text']
+        except Exception:
+            pass
+    return None
+
 def llm_generate(user_query, lang='en'):
     prompt = (
         f"{PLAIN_INSTRUCTION_EN} You are a Delhi Metro travel assistant. The user said: '{user_query}'. "
         "Please provide a detailed route including station names, line names, interchanges, platform info, direction, approximate travel time, and fare in English. "
         "Use natural, conversational language without any formatting symbols."
     )
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={api_key}"
-    payload = {"contents": [{"parts": [{"text": prompt}]}]}
+    url, payload = gemini_request(prompt)
     headers = {"Content-Type": "application/json"}
-    response = requests.post(url, headers=headers, json=payload)
+    import requests
+    with admit('llm'):
+        try:
+            response = requests.post(url, headers=headers, json=payload, timeout=LLM_TIMEOUT)
+        except requests.RequestException:
+            return 'LLM API error'
     if response.ok:
         try:
             text = response.json()['candidates'][0]['content']['parts'][0]['text']
@@ -62,11 +112,20 @@ def llm_generate(user_query, lang='en'):
             return 'Error parsing LLM response'
     return 'LLM API error'
 
-def extract_stations(user_query, lang='en'):
+def find_stations(user_query, lang='en'):
+    """Station names mentioned in the query: exact matches first, then Hindi, Devanagari and
+    transliterated names from the station lexicon, then fuzzy word matches"""
     found = []
-    for name in STATION_NAMES:
+    for name in station_names():
         if name.lower() in user_query.lower():
             found.append(name)
+    if len(found) < 2:
+        spoken = station_lexicon().find(user_query)
+        if all(name in spoken for name in found):
+            # The lexicon saw every exact match too, and it keeps the order they were said in
+            found = spoken
+        else:
+            found += [name for name in spoken if name not in found]
     if len(found) < 2:
         words = user_query.split()
         for word in words:
@@ -75,6 +134,17 @@ def extract_stations(user_query, lang='en'):
                 found.append(match)
             if len(found) == 2:
                 break
+    return found
+
+def canonical_station(name):
+    """The GTFS stop name for a station as written in any script or spelling, or `name` unchanged"""
+    if not name or name in station_names():
+        return name
+    spoken = station_lexicon().find(name, limit=1)
+    return spoken[0] if spoken else name
+
+def extract_stations(user_query, lang='en'):
+    found = find_stations(user_query, lang)
     return (found[0], found[1]) if len(found) >= 2 else (None, None)
 
 def clarification_prompt(lang='en', from_station=None, to_station=None):
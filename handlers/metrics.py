@@ -0,0 +1,126 @@
+import bisect
+import threading
+import contextvars
+from time import perf_counter
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+# Latency buckets in seconds, from sub-millisecond lookups up to slow LLM/TTS calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Histogram:
+    """Minimal Prometheus-style histogram with one label set per series"""
+
+    def __init__(self, name: str, help_text: str, label_name: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_name = label_name
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, label: str):
+        with self._lock:
+            series = self._series.get(label)
+            if series is None:
+                series = self._series[label] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f'{self.name}_bucket{{{self.label_name}="{label}",le="{bound}"}} {cumulative}')
+                lines.append(f'{self.name}_bucket{{{self.label_name}="{label}",le="+Inf"}} {count}')
+                lines.append(f'{self.name}_sum{{{self.label_name}="{label}"}} {total:.6f}')
+                lines.append(f'{self.name}_count{{{self.label_name}="{label}"}} {count}')
+        return lines
+
+STAGE_SECONDS = Histogram('metro_stage_seconds', 'Time spent in each processing stage', 'stage')
+REQUEST_SECONDS = Histogram('metro_request_seconds', 'End-to-end request latency', 'endpoint')
+
+class Trace:
+    """Per-request accumulator of stage timings"""
+
+    def __init__(self):
+        self.start = perf_counter()
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def elapsed(self) -> float:
+        return perf_counter() - self.start
+
+    def as_dict(self) -> Dict[str, float]:
+        """Stage timings in milliseconds"""
+        with self._lock:
+            return {stage: round(seconds * 1000, 2) for stage, seconds in self.stages.items()}
+
+# Context variables follow the request into asyncio tasks and asyncio.to_thread workers
+_current_trace = contextvars.ContextVar('metro_trace', default=None)
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+@contextmanager
+def request_trace(endpoint: str):
+    """Collect every span recorded while handling one request"""
+    trace = Trace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+        REQUEST_SECONDS.observe(trace.elapsed(), endpoint)
+
+@contextmanager
+def span(stage: str):
+    """Time a stage into the stage histogram and the current request's trace"""
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(stage, elapsed)
+
+# Extra gauges/counters rendered on /metrics, registered by other modules
+_collectors = []
+
+def register_collector(collect: Callable[[], List[str]]):
+    _collectors.append(collect)
+
+def stats_lines(prefix: str, stats: Dict, counters=()) -> List[str]:
+    """Render a flat stats dict as Prometheus counters (names in `counters`) and gauges"""
+    lines = []
+    for key, value in stats.items():
+        if not isinstance(value, (int, float)):
+            continue
+        if key in counters:
+            lines.append(f"# TYPE {prefix}_{key}_total counter")
+            lines.append(f"{prefix}_{key}_total {value}")
+        else:
+            lines.append(f"# TYPE {prefix}_{key} gauge")
+            lines.append(f"{prefix}_{key} {value}")
+    return lines
+
+def render_metrics() -> str:
+    lines = STAGE_SECONDS.render() + REQUEST_SECONDS.render()
+    for collect in _collectors:
+        try:
+            lines.extend(collect())
+        except Exception as e:
+            lines.append(f"# collector error: {e}")
+    return "\n".join(lines) + "\n"
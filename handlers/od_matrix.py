@@ -0,0 +1,248 @@
+import io
+import os
+import csv
+import sys
+import time
+from datetime import date, datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from handlers.gtfs import feed_now, get_feed
+from handlers.journey import INF, active_services, earliest_arrival, get_timetable, _clock
+
+COLUMNS = ('origin_id', 'origin_name', 'destination_id', 'destination_name', 'departure_time',
+           'arrival_time', 'travel_minutes', 'interchanges', 'distance_km', 'fare')
+# Requests above this many pairs are refused by the web endpoint (the CLI has no limit)
+MAX_API_PAIRS = int(os.getenv('OD_MATRIX_MAX_PAIRS', '250000'))
+API_PROCESSES = int(os.getenv('OD_MATRIX_PROCESSES', '1'))
+
+def resolve_stops(values: Iterable) -> Tuple[List[int], List[str]]:
+    """Timetable indexes for stop_ids or station names; names match like the rest of the app
+    (first case-insensitive substring match). Returns (indexes, unresolved)."""
+    timetable = get_timetable()
+    by_id = {str(stop_id): i for i, stop_id in enumerate(timetable.stop_ids)}
+    lowered = [name.lower() for name in timetable.stop_names]
+    indexes, unresolved = [], []
+    for value in values:
+        value = str(value).strip()
+        index = by_id.get(value)
+        if index is None:
+            needle = value.lower()
+            index = next((i for i, name in enumerate(lowered) if needle and needle in name), None)
+        if index is None:
+            unresolved.append(value)
+        else:
+            indexes.append(index)
+    return indexes, unresolved
+
+def build_tasks(pairs: Iterable[Tuple[int, int]], departures: List[int]) -> List[Tuple[int, int, Tuple[int, ...]]]:
+    """One (origin, departure, destinations) task per origin and time, so each is a single RAPTOR pass"""
+    by_origin = {}
+    for origin, destination in pairs:
+        by_origin.setdefault(origin, []).append(destination)
+    return [(origin, depart, tuple(destinations))
+            for depart in departures for origin, destinations in by_origin.items()]
+
+_view = None
+
+def _init_worker(services: Optional[frozenset], accessible: bool):
+    global _view
+    _view = get_timetable().view(services, accessible)
+
+def _solve(task: Tuple[int, int, Tuple[int, ...]]) -> List[tuple]:
+    from handlers.route_finder import fare_for_distance
+    origin, depart, destinations = task
+    view = _view
+    timetable = view.timetable
+    trips = [0] * len(timetable.stop_ids)
+    km = [0.0] * len(timetable.stop_ids)
+    if view.usable[origin]:
+        best = earliest_arrival(view, {origin: depart}, trips_taken=trips, km_travelled=km)
+    else:
+        best = [INF] * len(timetable.stop_ids)
+    origin_id, origin_name, departure = str(timetable.stop_ids[origin]), timetable.stop_names[origin], _clock(depart)
+    rows = []
+    for destination in destinations:
+        arrival = best[destination]
+        row = (origin_id, origin_name, str(timetable.stop_ids[destination]), timetable.stop_names[destination], departure)
+        if arrival >= INF:
+            rows.append(row + (None, None, None, None, None))
+        elif destination == origin:
+            rows.append(row + (departure, 0.0, 0, 0.0, None))
+        else:
+            rows.append(row + (_clock(arrival), round((arrival - depart) / 60, 1), max(trips[destination] - 1, 0),
+                               round(km[destination], 2), fare_for_distance(km[destination])))
+    return rows
+
+def od_matrix(pairs: Iterable[Tuple[int, int]], departures: List[int], day: Optional[date] = None,
+              accessible: bool = False, processes: int = 1, stats: Optional[Dict] = None) -> Iterator[tuple]:
+    """Rows of COLUMNS for every (origin, destination) timetable-index pair at every
+    departure (seconds after midnight), in task order.
+
+    With `processes` > 1 the passes are spread over a process pool. `stats`, if
+    given, is filled with pairs, seconds and pairs_per_second once the rows run out.
+    """
+    services = active_services(get_feed(), day or feed_now().date())
+    tasks = build_tasks(pairs, departures)
+    start = time.perf_counter()
+    count = 0
+    if processes > 1 and len(tasks) > 1:
+        import multiprocessing
+        # Building the view first lets forked workers inherit the timetable instead of rebuilding it
+        _init_worker(services, accessible)
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+        with context.Pool(processes, _init_worker, (services, accessible)) as pool:
+            for rows in pool.imap(_solve, tasks, chunksize=max(1, len(tasks) // (processes * 8))):
+                count += len(rows)
+                yield from rows
+    else:
+        _init_worker(services, accessible)
+        for task in tasks:
+            rows = _solve(task)
+            count += len(rows)
+            yield from rows
+    if stats is not None:
+        seconds = time.perf_counter() - start
+        stats.update(pairs=count, seconds=round(seconds, 3),
+                     pairs_per_second=round(count / seconds, 1) if seconds else None)
+
+def parse_departures(times: Iterable[str]) -> List[int]:
+    """HH:MM strings as seconds after midnight; ValueError if malformed"""
+    departures = []
+    for value in times:
+        clock = datetime.strptime(value.strip(), '%H:%M')
+        departures.append(clock.hour * 3600 + clock.minute * 60)
+    return departures
+
+def csv_chunks(rows: Iterable[tuple], batch: int = 2000) -> Iterator[str]:
+    """CSV text with a header, yielded every `batch` rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % batch == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def write_parquet(rows: Iterable[tuple], sink, batch: int = 50000):
+    """Write rows to a path or binary file as Parquet, one row group per `batch` (needs pyarrow)"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = pa.schema([('origin_id', pa.string()), ('origin_name', pa.string()),
+                        ('destination_id', pa.string()), ('destination_name', pa.string()),
+                        ('departure_time', pa.string()), ('arrival_time', pa.string()),
+                        ('travel_minutes', pa.float32()), ('interchanges', pa.int8()),
+                        ('distance_km', pa.float32()), ('fare', pa.int16())])
+    with pq.ParquetWriter(sink, schema) as writer:
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == batch:
+                writer.write_batch(pa.RecordBatch.from_arrays(
+                    [pa.array(column, type=field.type) for column, field in zip(zip(*chunk), schema)], schema=schema))
+                chunk = []
+        if chunk:
+            writer.write_batch(pa.RecordBatch.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(zip(*chunk), schema)], schema=schema))
+
+def _check_stations(values, field: str, allow_all: bool = True):
+    """ValueError unless `values` is a list of station names or stop_ids (or 'all')"""
+    if values is None or allow_all and values == 'all':
+        return
+    if not isinstance(values, (list, tuple)) or not all(isinstance(value, str) for value in values):
+        raise ValueError(f"{field} must be a list of station names" + (" or 'all'" if allow_all else ""))
+
+def matrix_pairs(pairs: Optional[List] = None, origins: Optional[List] = None,
+                 destinations: Optional[List] = None) -> Tuple[List[Tuple[int, int]], List[str]]:
+    """Index pairs from explicit [from, to] pairs or the cross product of origins x destinations
+    ('all' = every station; destinations default to the origins). Returns (pairs, unresolved);
+    ValueError if they are not shaped like that."""
+    if pairs:
+        if not isinstance(pairs, (list, tuple)) or not all(
+                isinstance(pair, (list, tuple)) and len(pair) == 2 for pair in pairs):
+            raise ValueError("pairs must be a list of [from, to] pairs")
+        for pair in pairs:
+            _check_stations(pair, 'pairs', allow_all=False)
+        origin_indexes, missing_from = resolve_stops(pair[0] for pair in pairs)
+        destination_indexes, missing_to = resolve_stops(pair[1] for pair in pairs)
+        if missing_from or missing_to:
+            return [], missing_from + missing_to
+        return list(zip(origin_indexes, destination_indexes)), []
+    _check_stations(origins, 'origins')
+    _check_stations(destinations, 'destinations')
+    everything = list(range(len(get_timetable().stop_ids)))
+    unresolved = []
+    if origins == 'all':
+        origin_indexes = everything
+    else:
+        origin_indexes, unresolved = resolve_stops(origins or [])
+    if destinations is None:
+        destination_indexes = origin_indexes
+    elif destinations == 'all':
+        destination_indexes = everything
+    else:
+        destination_indexes, missing = resolve_stops(destinations)
+        unresolved += missing
+    return [(o, d) for o in origin_indexes for d in destination_indexes], unresolved
+
+def _read_pairs(path: str) -> List[List[str]]:
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = [row[:2] for row in csv.reader(f) if len(row) >= 2]
+    # Skip a header row such as "from,to" or "origin,destination"
+    if rows and rows[0][0].strip().lower() in ('from', 'origin', 'from_station', 'origin_id'):
+        rows = rows[1:]
+    return rows
+
+def main(argv: List[str] = None) -> int:
+    import argparse
+    parser = argparse.ArgumentParser(description='Travel-time and fare matrix for many origin-destination pairs.',
+                                     epilog='python -m handlers.od_matrix --all --times 08:00 09:00 -o matrix.csv')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--pairs', help='CSV of from,to station names or stop_ids')
+    source.add_argument('--origins', nargs='+', help='origin stations (cross product with --destinations)')
+    source.add_argument('--all', action='store_true', help='every station to every station')
+    parser.add_argument('--destinations', nargs='+', help='destination stations (default: the origins)')
+    parser.add_argument('--times', nargs='+', default=['09:00'], help='departure times, HH:MM')
+    parser.add_argument('--date', help='service date, YYYY-MM-DD (default: today)')
+    parser.add_argument('--accessible', action='store_true', help='step-free journeys only')
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--format', choices=('csv', 'parquet'), default='csv')
+    parser.add_argument('-o', '--output', help='output file (default: stdout, CSV only)')
+    args = parser.parse_args(argv)
+
+    try:
+        departures = parse_departures(args.times)
+        day = datetime.strptime(args.date, '%Y-%m-%d').date() if args.date else None
+    except ValueError as e:
+        parser.error(str(e))
+    if args.format == 'parquet' and not args.output:
+        parser.error('--format parquet needs --output')
+    if args.pairs:
+        pairs, unresolved = matrix_pairs(pairs=_read_pairs(args.pairs))
+    else:
+        pairs, unresolved = matrix_pairs(origins='all' if args.all else args.origins,
+                                         destinations='all' if args.all else args.destinations)
+    if unresolved:
+        print(f"Error: stations not found: {', '.join(unresolved)}", file=sys.stderr)
+        return 1
+
+    stats = {}
+    rows = od_matrix(pairs, departures, day, args.accessible, args.processes, stats)
+    if args.format == 'parquet':
+        write_parquet(rows, args.output)
+    else:
+        out = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+        try:
+            for chunk in csv_chunks(rows):
+                out.write(chunk)
+        finally:
+            if args.output:
+                out.close()
+    print(f"{stats['pairs']} pairs in {stats['seconds']}s ({stats['pairs_per_second']} pairs/s, "
+          f"{args.processes} processes)", file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
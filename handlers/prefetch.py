@@ -0,0 +1,143 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from handlers.cache import answer_cache
+
+# Opt-in: once a query names a station, the handler results a follow-up is likely to need
+# (next trains there, fares to the places usually searched from it, station info) are
+# computed on a small low-priority pool and parked in the answer cache
+PREFETCH_ENABLED = os.getenv('PREFETCH_ENABLED', '0') == '1'
+PREFETCH_WORKERS = int(os.getenv('PREFETCH_WORKERS', '1'))
+# Budget: stations waiting to be prefetched, and actions computed per station
+PREFETCH_QUEUE = int(os.getenv('PREFETCH_QUEUE', '16'))
+PREFETCH_PER_STATION = int(os.getenv('PREFETCH_PER_STATION', '4'))
+PREFETCH_DESTINATIONS = int(os.getenv('PREFETCH_DESTINATIONS', '2'))
+PREFETCH_NICE = int(os.getenv('PREFETCH_NICE', '10'))
+# Schedules go stale quickly; fares and station info only change with the feed
+PREFETCH_TTL = {'get_schedule': 60}
+
+def result_key(action: Dict) -> tuple:
+    """Answer-cache key of a handler result; the action name comes first so evictions can match it"""
+    return (action['action'], 'result') + tuple(sorted((k, v) for k, v in action.items() if k != 'action'))
+
+def likely_actions(station: str, destinations: List[str]) -> List[Dict]:
+    """Actions a follow-up about `station` would run, as MetroAgent.plan_actions writes them"""
+    actions = [{"action": "get_schedule", "station": station}]
+    actions += [{"action": "calculate_fare", "from": station, "to": to} for to in destinations if to != station]
+    actions.append({"action": "get_station_info", "station": station})
+    return actions
+
+def _lower_priority():
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), PREFETCH_NICE)
+    except (AttributeError, OSError):
+        # Not on Linux, or not permitted: run at normal priority
+        pass
+
+class Prefetcher:
+    """Warms likely handler results into the answer cache and counts how many get used"""
+
+    def __init__(self, workers: int = PREFETCH_WORKERS, queue_limit: int = PREFETCH_QUEUE,
+                 per_station: int = PREFETCH_PER_STATION, maxsize: int = 4096):
+        self.queue_limit = queue_limit
+        self.per_station = per_station
+        self.maxsize = maxsize
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='metro-prefetch',
+                                        initializer=_lower_priority)
+        self._pending = 0
+        # Keys this prefetcher stored and nobody has read yet, oldest first
+        self._unused = OrderedDict()
+        self._lock = threading.Lock()
+        self.scheduled = self.dropped = self.computed = self.skipped = self.errors = 0
+        self.hits = self.used = 0
+
+    def submit(self, session_id: Optional[str], query: str, stations: Optional[tuple], lang: str = 'en') -> bool:
+        """Queue prefetching for the station a query is about; False if over budget"""
+        with self._lock:
+            if self._pending >= self.queue_limit:
+                self.dropped += 1
+                return False
+            self._pending += 1
+            self.scheduled += 1
+        self._pool.submit(self._run, session_id, query, stations, lang)
+        return True
+
+    def _run(self, session_id, query, stations, lang):
+        try:
+            station = self._origin(query, stations, lang)
+            if station:
+                for action in likely_actions(station, self._destinations(session_id, station))[:self.per_station]:
+                    self._warm(action)
+        except Exception as e:
+            print(f"Error prefetching: {e}")
+            with self._lock:
+                self.errors += 1
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _origin(self, query: str, stations: Optional[tuple], lang: str) -> Optional[str]:
+        if stations:
+            return stations[0]
+        from handlers.llm import find_stations
+        found = find_stations(query, lang)
+        return found[0] if found else None
+
+    def _destinations(self, session_id: Optional[str], station: str) -> List[str]:
+        """route_history from `station`, then the session's frequent_stations"""
+        from handlers.database import get_database
+        from handlers.session import session_store
+        destinations = get_database().frequent_destinations(session_id or '', station, PREFETCH_DESTINATIONS)
+        context = session_store.get(session_id)
+        if context:
+            destinations += [name for name in context.user_context.get('frequent_stations') or []
+                             if name != station and name not in destinations]
+        return destinations[:PREFETCH_DESTINATIONS]
+
+    def _warm(self, action: Dict):
+        key = result_key(action)
+        if answer_cache.peek(key) is not None:
+            with self._lock:
+                self.skipped += 1
+            return
+        from handlers.agent import MetroAgent
+        result = MetroAgent().execute_action(action)
+        if not isinstance(result, dict) or result.get('error'):
+            return
+        answer_cache.set(key, result, PREFETCH_TTL.get(action['action']))
+        with self._lock:
+            self.computed += 1
+            self._unused[key] = True
+            while len(self._unused) > self.maxsize:
+                self._unused.popitem(last=False)
+
+    def lookup(self, action: Dict) -> Optional[Dict]:
+        """A prefetched result for `action`, or None"""
+        key = result_key(action)
+        result = answer_cache.peek(key)
+        if result is not None:
+            with self._lock:
+                self.hits += 1
+                if self._unused.pop(key, None):
+                    self.used += 1
+        return result
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'enabled': int(PREFETCH_ENABLED), 'pending': self._pending, 'scheduled': self.scheduled,
+                    'dropped': self.dropped, 'computed': self.computed, 'skipped': self.skipped,
+                    'errors': self.errors, 'hits': self.hits, 'used': self.used,
+                    # Share of prefetched results that served a request at least once
+                    'hit_rate': round(self.used / self.computed, 4) if self.computed else 0.0}
+
+prefetcher = Prefetcher()
+
+def prefetch(session_id: Optional[str], query: str, stations: Optional[tuple], lang: str = 'en'):
+    """Start prefetching for a resolved query when PREFETCH_ENABLED=1"""
+    if PREFETCH_ENABLED:
+        prefetcher.submit(session_id, query, stations, lang)
+
+def prefetched_result(action: Dict) -> Optional[Dict]:
+    return prefetcher.lookup(action) if PREFETCH_ENABLED else None
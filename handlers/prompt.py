@@ -0,0 +1,94 @@
+import os
+import re
+import json
+import math
+from typing import Any, Dict, List
+
+# Handler results are summarized for the response prompt rather than dumped:
+# ids, geometry and internal ranks mean nothing to the LLM but cost tokens
+DROP_KEYS = {'from_stop_id', 'to_stop_id', 'shape_id', 'polyline', 'pareto_rank', 'route_type', 'total_routes',
+             'location', 'currency', 'source', 'accessible_trips', 'inaccessible_trips',
+             'trips_without_information', 'accessible_trip_share'}
+# A key is dropped when one of the keys it maps to is present in the same object and says
+# the same thing (a journey's line is its first leg's line)
+REDUNDANT = {'line': ('line_name', 'legs'), 'line_name': ('legs',), 'type': ('interchanges',),
+             'wheelchair_accessible': ('step_free',)}
+SHORT_KEYS = {
+    'departure_time': 'dep', 'arrival_time': 'arr', 'estimated_minutes': 'mins', 'estimated_time': 'time',
+    'estimated_duration': 'time', 'interchanges': 'changes', 'interchange_stations': 'change_at',
+    'distance_km': 'km', 'line_name': 'line', 'smart_card_discount': 'card_discount', 'final_fare': 'card_fare',
+    'from_station': 'from', 'to_station': 'to', 'station_name': 'station', 'next_trains': 'next',
+    'route_info': 'trains', 'operating_hours': 'hours', 'fare_info': 'fare', 'direction': 'dir',
+    'first_train': 'first', 'last_train': 'last', 'service_by_line': 'by_line', 'every_minutes': 'every_min',
+}
+# Longest lists kept per key before the budget applies; other lists (journey legs) are kept whole
+LIST_LIMITS = {'routes': 3, 'steps': 2, 'route_info': 3, 'next_trains': 4, 'connections': 6, 'facilities': 6,
+               'service_by_line': 4}
+EMPTY_STRINGS = {'', 'unknown', 'Unknown', 'TBD', 'nan'}
+# Rough tokens per character for the JSON summaries (mostly ASCII names and numbers)
+CHARS_PER_TOKEN = 4
+RESULT_TOKEN_BUDGET = int(os.getenv('PROMPT_RESULT_TOKENS', '600'))
+
+_SECONDS = re.compile(r'^(\d{1,2}:\d{2}):\d{2}$')
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def _empty(value) -> bool:
+    return value is None or (isinstance(value, (str, list, dict)) and not value)
+
+def _compact(value, key, limits: Dict[str, int]):
+    if isinstance(value, dict):
+        out = {}
+        for k, v in value.items():
+            if k in DROP_KEYS or any(other in value for other in REDUNDANT.get(k, ())):
+                continue
+            v = _compact(v, k, limits)
+            if not _empty(v):
+                out[SHORT_KEYS.get(k, k)] = v
+        return out
+    if isinstance(value, (list, tuple)):
+        items = [item for item in (_compact(v, None, limits) for v in value) if not _empty(item)]
+        limit = limits.get(key)
+        if limit is not None and len(items) > limit:
+            items = items[:limit] + [f"+{len(items) - limit} more"]
+        return items
+    if hasattr(value, 'item') and not isinstance(value, (str, bytes)):
+        # numpy scalars from DataFrame rows
+        value = value.item()
+    if isinstance(value, float):
+        if math.isnan(value):
+            return None
+        return int(value) if value.is_integer() else round(value, 2)
+    if isinstance(value, str):
+        value = value.strip()
+        return None if value in EMPTY_STRINGS else _SECONDS.sub(r'\1', value)
+    return value
+
+def compact_results(results: List[Dict], limits: Dict[str, int] = None) -> List[Any]:
+    """Handler results without nulls, ids or redundant fields, under short keys, duplicates removed"""
+    limits = LIST_LIMITS if limits is None else limits
+    compacted, seen = [], set()
+    for result in results:
+        result = _compact(result, None, limits)
+        text = json.dumps(result, sort_keys=True, ensure_ascii=False)
+        if not _empty(result) and text not in seen:
+            seen.add(text)
+            compacted.append(result)
+    return compacted
+
+def summarize_results(results: List[Dict], budget: int = RESULT_TOKEN_BUDGET) -> str:
+    """Compact JSON of `results` for the response prompt, within about `budget` tokens.
+
+    Over budget, the per-key list limits are halved until the summary fits or every
+    list is down to one item; only then is the text cut off.
+    """
+    limits = dict(LIST_LIMITS)
+    while True:
+        text = json.dumps(compact_results(results, limits), separators=(',', ':'), ensure_ascii=False)
+        if estimate_tokens(text) <= budget or all(limit == 1 for limit in limits.values()):
+            break
+        limits = {key: max(1, limit // 2) for key, limit in limits.items()}
+    if estimate_tokens(text) > budget:
+        text = text[:budget * CHARS_PER_TOKEN] + ' (truncated)'
+    return text
@@ -1,78 +1,63 @@
-import pandas as pd
-import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import json
-import os
 from typing import List, Dict, Any
-import pickle
+from handlers.gtfs import GTFSFeed, get_feed
 from handlers.llm import clean_text_for_tts
+from handlers.metrics import span
+
+class KnowledgeEntry:
+    """One searchable fact about a station, line or the network"""
+    __slots__ = ('type', 'content', 'metadata')
+
+    def __init__(self, type: str, content: str, metadata: Dict[str, Any]):
+        self.type = type
+        self.content = content
+        self.metadata = metadata
 
 class MetroRAG:
-    def __init__(self):
-        self.base_path = os.path.dirname(os.path.dirname(__file__))
-        self.gtfs_path = os.path.join(self.base_path, 'gtfs')
-        self.knowledge_base = []
+    def __init__(self, feed: GTFSFeed = None):
+        # scikit-learn is slow to import, so it loads with the first index build
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        self.knowledge_base: List[KnowledgeEntry] = []
         self.vectorizer = TfidfVectorizer(max_features=1000, stop_words='english')
         self.vectors = None
-        self.load_knowledge_base()
+        self.load_knowledge_base(feed or get_feed())
         
-    def load_knowledge_base(self):
+    def load_knowledge_base(self, feed: GTFSFeed):
         """Load and process GTFS data into searchable knowledge base"""
+        import pandas as pd
         try:
-            # Load GTFS files
-            stops = pd.read_csv(os.path.join(self.gtfs_path, 'stops.txt'))
-            routes = pd.read_csv(os.path.join(self.gtfs_path, 'routes.txt'))
-            trips = pd.read_csv(os.path.join(self.gtfs_path, 'trips.txt'))
-            stop_times = pd.read_csv(os.path.join(self.gtfs_path, 'stop_times.txt'))
+            stops = feed.stops
+            routes = feed.routes
             
-            # Create station knowledge entries
-            for _, stop in stops.iterrows():
-                self.knowledge_base.append({
-                    'type': 'station',
-                    'content': f"Station: {stop['stop_name']} (Code: {stop['stop_code']}) - {stop['stop_desc'] if pd.notna(stop['stop_desc']) else 'Delhi Metro Station'}",
-                    'metadata': {
-                        'stop_id': stop['stop_id'],
-                        'stop_name': stop['stop_name'],
-                        'stop_code': stop['stop_code'],
-                        'latitude': stop['stop_lat'],
-                        'longitude': stop['stop_lon']
-                    }
-                })
+            # Create station knowledge entries (columns as plain Python values, not numpy scalars)
+            for stop_id, name, code, desc, lat, lon in zip(*(stops[column].tolist() for column in (
+                    'stop_id', 'stop_name', 'stop_code', 'stop_desc', 'stop_lat', 'stop_lon'))):
+                self.knowledge_base.append(KnowledgeEntry(
+                    'station',
+                    f"Station: {name} (Code: {code}) - {desc if pd.notna(desc) else 'Delhi Metro Station'}",
+                    {'stop_id': stop_id, 'stop_name': name, 'stop_code': code, 'latitude': lat, 'longitude': lon}
+                ))
             
             # Create route knowledge entries
-            for _, route in routes.iterrows():
-                self.knowledge_base.append({
-                    'type': 'route',
-                    'content': f"Route: {route['route_long_name']} (Line {route['route_short_name']}) - {route['route_desc'] if pd.notna(route['route_desc']) else 'Delhi Metro Line'}",
-                    'metadata': {
-                        'route_id': route['route_id'],
-                        'route_name': route['route_long_name'],
-                        'route_short': route['route_short_name']
-                    }
-                })
+            for route_id, long_name, short_name, desc in zip(*(routes[column].tolist() for column in (
+                    'route_id', 'route_long_name', 'route_short_name', 'route_desc'))):
+                self.knowledge_base.append(KnowledgeEntry(
+                    'route',
+                    f"Route: {long_name} (Line {short_name}) - {desc if pd.notna(desc) else 'Delhi Metro Line'}",
+                    {'route_id': route_id, 'route_name': long_name, 'route_short': short_name}
+                ))
             
             # Create fare and timing knowledge
             self.knowledge_base.extend([
-                {
-                    'type': 'fare',
-                    'content': "Delhi Metro fare structure: Minimum fare ₹10, Maximum fare ₹60. Smart card users get 10% discount.",
-                    'metadata': {'category': 'pricing'}
-                },
-                {
-                    'type': 'timing',
-                    'content': "Delhi Metro operating hours: 5:30 AM to 11:30 PM. Peak hours: 8-11 AM and 5-8 PM.",
-                    'metadata': {'category': 'schedule'}
-                },
-                {
-                    'type': 'general',
-                    'content': "Delhi Metro has 8 color-coded lines: Red, Yellow, Blue, Green, Violet, Pink, Magenta, and Grey lines.",
-                    'metadata': {'category': 'lines'}
-                }
+                KnowledgeEntry('fare', "Delhi Metro fare structure: Minimum fare ₹10, Maximum fare ₹60. Smart card users get 10% discount.",
+                               {'category': 'pricing'}),
+                KnowledgeEntry('timing', "Delhi Metro operating hours: 5:30 AM to 11:30 PM. Peak hours: 8-11 AM and 5-8 PM.",
+                               {'category': 'schedule'}),
+                KnowledgeEntry('general', "Delhi Metro has 8 color-coded lines: Red, Yellow, Blue, Green, Violet, Pink, Magenta, and Grey lines.",
+                               {'category': 'lines'}),
             ])
             
             # Vectorize knowledge base
-            texts = [entry['content'] for entry in self.knowledge_base]
+            texts = [entry.content for entry in self.knowledge_base]
             self.vectors = self.vectorizer.fit_transform(texts)
             
         except Exception as e:
@@ -82,6 +67,8 @@ class MetroRAG:
         """Search knowledge base for relevant information"""
         if self.vectors is None:
             return []
+        import numpy as np
+        from sklearn.metrics.pairwise import cosine_similarity
         
         # Vectorize query
         query_vector = self.vectorizer.transform([query])
@@ -95,10 +82,11 @@ class MetroRAG:
         results = []
         for idx in top_indices:
             if similarities[idx] > 0.1:  # Minimum similarity threshold
+                entry = self.knowledge_base[idx]
                 results.append({
-                    'content': self.knowledge_base[idx]['content'],
-                    'metadata': self.knowledge_base[idx]['metadata'],
-                    'type': self.knowledge_base[idx]['type'],
+                    'content': entry.content,
+                    'metadata': entry.metadata,
+                    'type': entry.type,
                     'similarity': float(similarities[idx])
                 })
         
@@ -150,7 +138,15 @@ class MetroRAG:
 
 def enhance_response_with_rag(query: str, base_response: str) -> str:
     """Enhance LLM response with RAG-retrieved information"""
-    rag = MetroRAG()
+    with span('rag'):
+        return _enhance_response_with_rag(query, base_response)
+
+def get_rag() -> MetroRAG:
+    """The TF-IDF index for the current feed, built once"""
+    return get_feed().derived('rag', MetroRAG)
+
+def _enhance_response_with_rag(query: str, base_response: str) -> str:
+    rag = get_rag()
     relevant_info = rag.search(query, top_k=3)
     
     # If no relevant info found, just return cleaned base response
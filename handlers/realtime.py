@@ -0,0 +1,222 @@
+import os
+import json
+import time
+import threading
+from datetime import date, datetime, time as dt_time
+from time import perf_counter
+from typing import Callable, Dict, List, Optional, Tuple
+from handlers.gtfs import GTFSFeed, feed_timezone, get_feed, on_swap, pinned_feed
+from handlers.metrics import Histogram, stats_lines
+
+# GTFS-Realtime TripUpdates: an http(s) URL or a local file standing in for one. Files ending
+# in .json hold the FeedMessage in its JSON form; anything else is read as protobuf.
+TRIP_UPDATES_URL = os.getenv('GTFS_RT_TRIP_UPDATES_URL', '')
+POLL_INTERVAL = float(os.getenv('GTFS_RT_INTERVAL', '30'))
+FETCH_TIMEOUT = float(os.getenv('GTFS_RT_TIMEOUT', '5'))
+# Delays older than this are dropped rather than trusted after the feed stops updating
+MAX_AGE = float(os.getenv('GTFS_RT_MAX_AGE', '300'))
+# Applying is linear in the trips that changed; this caps one update's work
+MAX_TRIPS = int(os.getenv('GTFS_RT_MAX_TRIPS', '10000'))
+
+APPLY_SECONDS = Histogram('metro_realtime_seconds', 'Time to parse and apply a TripUpdates message', 'phase',
+                          buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+
+_state = {'updates': 0, 'errors': 0, 'last_error': None, 'last_success': None, 'feed_timestamp': None,
+          'delayed_trips': 0, 'cancelled_trips': 0, 'ignored': 0, 'patterns_touched': 0, 'last_seconds': None}
+_last_message = None
+_update_listeners = []
+_apply_lock = threading.Lock()
+
+def _field(message: Dict, camel: str, snake: str, default=None):
+    """A FeedMessage field under its proto3 JSON (camelCase) or original (snake_case) name"""
+    value = message.get(camel, message.get(snake))
+    return default if value is None else value
+
+def fetch_trip_updates(source: str = None) -> Dict:
+    """Read a TripUpdates FeedMessage from `source` as a dict in its JSON form"""
+    source = source or TRIP_UPDATES_URL
+    if source.startswith(('http://', 'https://')):
+        import requests
+        response = requests.get(source, timeout=FETCH_TIMEOUT)
+        response.raise_for_status()
+        data, json_form = response.content, 'json' in response.headers.get('Content-Type', '')
+    else:
+        with open(source, 'rb') as f:
+            data = f.read()
+        json_form = source.endswith('.json')
+    if json_form:
+        return json.loads(data)
+    from google.transit import gtfs_realtime_pb2
+    from google.protobuf.json_format import MessageToDict
+    message = gtfs_realtime_pb2.FeedMessage()
+    message.ParseFromString(data)
+    return MessageToDict(message)
+
+def _sequence_positions(feed: GTFSFeed) -> Dict:
+    """{trip_id: {stop_sequence: position}} for updates that name stops only by sequence"""
+    from handlers.journey import get_timetable
+    known = set(get_timetable().stop_index)
+    stop_times = feed.stop_times[feed.stop_times['stop_id'].isin(known)]
+    stop_times = stop_times.sort_values(['trip_id', 'stop_sequence'], kind='stable')
+    positions = {}
+    for trip_id, sequence in zip(stop_times['trip_id'], stop_times['stop_sequence'].astype(int)):
+        trip = positions.setdefault(trip_id, {})
+        trip[sequence] = len(trip)
+    return positions
+
+def sequence_positions(feed: GTFSFeed = None) -> Dict:
+    return (feed or get_feed()).derived('realtime_sequences', _sequence_positions)
+
+def _position(update: Dict, trip_id, stops: List[int], stop_index: Dict, feed: GTFSFeed) -> Optional[int]:
+    stop_id = _field(update, 'stopId', 'stop_id')
+    if stop_id is not None:
+        stop = stop_index.get(stop_id)
+        if stop is None and str(stop_id).isdigit():
+            stop = stop_index.get(int(stop_id))
+        return stops.index(stop) if stop in stops else None
+    sequence = _field(update, 'stopSequence', 'stop_sequence')
+    if sequence is None:
+        return None
+    return sequence_positions(feed).get(trip_id, {}).get(int(sequence))
+
+def service_midnight(day: date, timezone) -> float:
+    """Unix time that GTFS times on `day` count from: noon in the feed's timezone minus 12 h,
+    which stays right on days that change to or from daylight saving time"""
+    return datetime.combine(day, dt_time(12), tzinfo=timezone).timestamp() - 12 * 3600
+
+def _event_delay(event: Optional[Dict], scheduled: int, midnight: float) -> Optional[int]:
+    """Delay in seconds of a StopTimeEvent, from its delay or else its absolute time"""
+    if not event:
+        return None
+    if event.get('delay') is not None:
+        return int(event['delay'])
+    if event.get('time') is not None:
+        return int(int(event['time']) - midnight - scheduled)
+    return None
+
+def parse_trip_updates(message: Dict) -> Tuple[Dict, int]:
+    """({trip_id: delay steps or None if cancelled}, entities ignored) for Timetable.apply_delays"""
+    from handlers.journey import get_timetable
+    feed = get_feed()
+    timetable = get_timetable()
+    timezone = feed_timezone(feed)
+    today = datetime.now(timezone).date()
+    delays, ignored = {}, 0
+    for entity in message.get('entity', ()):
+        update = _field(entity, 'tripUpdate', 'trip_update')
+        if not update or len(delays) >= MAX_TRIPS:
+            ignored += bool(update)
+            continue
+        trip = update.get('trip', {})
+        trip_id = _field(trip, 'tripId', 'trip_id')
+        slot = timetable.trip_slot(trip_id)
+        if slot is None and str(trip_id).isdigit():
+            trip_id = int(trip_id)
+            slot = timetable.trip_slot(trip_id)
+        if slot is None:
+            # Unknown or ADDED trips have no scheduled rows to offset
+            ignored += 1
+            continue
+        if _field(trip, 'scheduleRelationship', 'schedule_relationship') in ('CANCELED', 3):
+            delays[trip_id] = None
+            continue
+        pattern, t = slot
+        start_date = _field(trip, 'startDate', 'start_date')
+        day = datetime.strptime(start_date, '%Y%m%d').date() if start_date else today
+        midnight = service_midnight(day, timezone)
+        steps = {}
+        if update.get('delay') is not None:
+            steps[0] = (0, int(update['delay']), int(update['delay']))
+        for stop_update in _field(update, 'stopTimeUpdate', 'stop_time_update', ()):
+            if _field(stop_update, 'scheduleRelationship', 'schedule_relationship') in ('SKIPPED', 1, 'NO_DATA', 2):
+                continue
+            pos = _position(stop_update, trip_id, pattern.stops, timetable.stop_index, feed)
+            if pos is None:
+                continue
+            arrival = _event_delay(stop_update.get('arrival'), pattern.arrivals[t][pos], midnight)
+            departure = _event_delay(stop_update.get('departure'), pattern.departures[t][pos], midnight)
+            if arrival is None and departure is None:
+                continue
+            steps[pos] = (pos, arrival if arrival is not None else departure,
+                          departure if departure is not None else arrival)
+        if any(step[1] or step[2] for step in steps.values()):
+            delays[trip_id] = [steps[pos] for pos in sorted(steps)]
+    return delays, ignored
+
+def on_update(listener: Callable[[Dict], None]):
+    """Call `listener(status)` after every update that changed the live overlay"""
+    _update_listeners.append(listener)
+
+def apply_trip_updates(message: Dict) -> Dict:
+    """Parse `message` and make its delays the timetable's live overlay; returns the update status"""
+    global _last_message
+    from handlers.journey import get_timetable
+    with _apply_lock:
+        start = perf_counter()
+        delays, ignored = parse_trip_updates(message)
+        parsed = perf_counter()
+        touched = get_timetable().apply_delays(delays)
+        applied = perf_counter()
+        APPLY_SECONDS.observe(parsed - start, 'parse')
+        APPLY_SECONDS.observe(applied - parsed, 'apply')
+        _last_message = message
+        header = message.get('header', {})
+        cancelled = sum(steps is None for steps in delays.values())
+        _state.update(updates=_state['updates'] + 1, last_success=time.time(), ignored=ignored,
+                      feed_timestamp=int(header['timestamp']) if header.get('timestamp') else None,
+                      delayed_trips=len(delays) - cancelled, cancelled_trips=cancelled, patterns_touched=touched,
+                      last_seconds={'parse': round(parsed - start, 6), 'apply': round(applied - parsed, 6)})
+        status = dict(_state)
+    if touched:
+        for listener in _update_listeners:
+            try:
+                listener(status)
+            except Exception as e:
+                print(f"Error in realtime update listener: {e}")
+    return status
+
+def clear_delays():
+    """Run every trip to schedule again"""
+    apply_trip_updates({'entity': []})
+
+def poll_once(source: str = None) -> Optional[Dict]:
+    try:
+        return apply_trip_updates(fetch_trip_updates(source))
+    except Exception as e:
+        print(f"Error reading GTFS-Realtime trip updates: {e}")
+        _state.update(errors=_state['errors'] + 1, last_error=str(e))
+        last = _state['last_success']
+        if last is not None and time.time() - last > MAX_AGE and _state['delayed_trips'] + _state['cancelled_trips']:
+            clear_delays()
+        return None
+
+def _poll(source: str, interval: float):
+    while True:
+        poll_once(source)
+        time.sleep(interval)
+
+def start_realtime(source: str = TRIP_UPDATES_URL, interval: float = POLL_INTERVAL):
+    """Poll `source` for TripUpdates in a background thread (off unless GTFS_RT_TRIP_UPDATES_URL is set)"""
+    if source and interval > 0:
+        threading.Thread(target=_poll, args=(source, interval), name='metro-gtfs-rt', daemon=True).start()
+
+def _reapply(feed: GTFSFeed):
+    # A reloaded timetable starts on schedule; the last message is mapped onto its trips
+    if _last_message is not None:
+        with pinned_feed(feed):
+            apply_trip_updates(_last_message)
+
+on_swap(_reapply)
+
+def realtime_status() -> Dict:
+    status = dict(_state)
+    status['source'] = TRIP_UPDATES_URL or None
+    status['age_seconds'] = round(time.time() - status['last_success'], 1) if status['last_success'] else None
+    return status
+
+def metrics_lines() -> List[str]:
+    status = realtime_status()
+    return APPLY_SECONDS.render() + stats_lines('metro_realtime', {
+        'updates': status['updates'], 'errors': status['errors'], 'delayed_trips': status['delayed_trips'],
+        'cancelled_trips': status['cancelled_trips'], 'age_seconds': status['age_seconds'] or 0,
+    }, counters=('updates', 'errors'))
@@ -1,27 +1,24 @@
-import pandas as pd
 from collections import defaultdict
-import os
 import math
+from datetime import datetime
 from typing import Dict, List, Tuple
+from handlers.gtfs import GTFSFeed, get_feed
 
-BASE = os.path.dirname(os.path.dirname(__file__))
-GTFS = os.path.join(BASE, 'gtfs')
-
-stops = pd.read_csv(os.path.join(GTFS, 'stops.txt'))
-trips = pd.read_csv(os.path.join(GTFS, 'trips.txt'))
-stop_times = pd.read_csv(os.path.join(GTFS, 'stop_times.txt'))
-routes = pd.read_csv(os.path.join(GTFS, 'routes.txt'))
-
-def build_graph():
+def build_graph(feed: GTFSFeed = None):
     """Build a graph representation of the metro network"""
+    feed = feed or get_feed()
     stop_to_routes = defaultdict(set)
-    merged = stop_times.merge(trips, on='trip_id').sort_values(['trip_id', 'stop_sequence'])
+    merged = feed.stop_times[['trip_id', 'stop_id']].merge(feed.trips[['trip_id', 'route_id']], on='trip_id')
     
-    for _, row in merged.iterrows():
-        stop_to_routes[row['stop_id']].add(row['route_id'])
+    for stop_id, route_id in zip(merged['stop_id'], merged['route_id']):
+        stop_to_routes[stop_id].add(route_id)
     
     return stop_to_routes
 
+def stop_to_routes_index() -> Dict:
+    """Routes serving each stop, built once per loaded feed"""
+    return get_feed().derived('stop_to_routes', build_graph)
+
 def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """Calculate distance between two points using Haversine formula"""
     R = 6371  # Earth's radius in kilometers
@@ -39,11 +36,27 @@ def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> fl
     
     return R * c
 
+def fare_for_distance(distance: float) -> int:
+    """Delhi Metro fare structure (simplified)"""
+    if distance <= 2:
+        return 10
+    elif distance <= 5:
+        return 20
+    elif distance <= 12:
+        return 30
+    elif distance <= 21:
+        return 40
+    elif distance <= 32:
+        return 50
+    else:
+        return 60
+
 def calculate_fare(from_station: str, to_station: str) -> Dict:
     """Calculate fare between two stations"""
+    stops = get_feed().stops
     # Find stations
-    from_matches = stops[stops['stop_name'].str.contains(from_station, case=False, na=False)]
-    to_matches = stops[stops['stop_name'].str.contains(to_station, case=False, na=False)]
+    from_matches = stops[stops['stop_name'].str.contains(from_station, case=False, na=False, regex=False)]
+    to_matches = stops[stops['stop_name'].str.contains(to_station, case=False, na=False, regex=False)]
     
     if from_matches.empty or to_matches.empty:
         return {"error": "Station not found"}
@@ -57,19 +70,7 @@ def calculate_fare(from_station: str, to_station: str) -> Dict:
         to_station['stop_lat'], to_station['stop_lon']
     )
     
-    # Delhi Metro fare structure (simplified)
-    if distance <= 2:
-        fare = 10
-    elif distance <= 5:
-        fare = 20
-    elif distance <= 12:
-        fare = 30
-    elif distance <= 21:
-        fare = 40
-    elif distance <= 32:
-        fare = 50
-    else:
-        fare = 60
+    fare = fare_for_distance(distance)
     
     return {
         "distance_km": round(distance, 1),
@@ -87,9 +88,11 @@ def find_route(user_query: str) -> Dict:
     if not start or not end:
         return {'steps': [], 'fare': 0, 'error': 'Could not identify stations'}
     
-    stop_to_routes = build_graph()
-    start_ids = stops[stops['stop_name'].str.contains(start, case=False, na=False)]['stop_id']
-    end_ids = stops[stops['stop_name'].str.contains(end, case=False, na=False)]['stop_id']
+    feed = get_feed()
+    stops, routes = feed.stops, feed.routes
+    stop_to_routes = stop_to_routes_index()
+    start_ids = stops[stops['stop_name'].str.contains(start, case=False, na=False, regex=False)]['stop_id']
+    end_ids = stops[stops['stop_name'].str.contains(end, case=False, na=False, regex=False)]['stop_id']
     
     if start_ids.empty or end_ids.empty:
         return {'steps': [], 'fare': 0, 'error': 'Stations not found'}
@@ -125,11 +128,14 @@ def find_route(user_query: str) -> Dict:
         'total_routes': len(routes_found)
     }
 
-def find_multiple_routes(from_station: str, to_station: str, max_routes: int = 3) -> Dict:
-    """Find multiple route options between two stations"""
+def find_multiple_routes(from_station: str, to_station: str, max_routes: int = 3, when: datetime = None,
+                         accessible: bool = False) -> Dict:
+    """Find multiple route options between two stations, ranked across time, interchanges and fare"""
+    from handlers.journey import plan_journeys
+    stops = get_feed().stops
     # Find stations
-    from_matches = stops[stops['stop_name'].str.contains(from_station, case=False, na=False)]
-    to_matches = stops[stops['stop_name'].str.contains(to_station, case=False, na=False)]
+    from_matches = stops[stops['stop_name'].str.contains(from_station, case=False, na=False, regex=False)]
+    to_matches = stops[stops['stop_name'].str.contains(to_station, case=False, na=False, regex=False)]
     
     if from_matches.empty or to_matches.empty:
         return {"error": "Stations not found"}
@@ -137,115 +143,17 @@ def find_multiple_routes(from_station: str, to_station: str, max_routes: int = 3
     from_id = from_matches.iloc[0]['stop_id']
     to_id = to_matches.iloc[0]['stop_id']
     
-    # Get all possible routes
-    all_routes = []
-    
-    # Direct routes
-    direct_routes = find_direct_routes(from_id, to_id)
-    all_routes.extend(direct_routes)
-    
-    # Routes with one interchange
-    interchange_routes = find_interchange_routes(from_id, to_id)
-    all_routes.extend(interchange_routes)
-    
-    # Sort by estimated time and take top routes
-    all_routes.sort(key=lambda x: x.get('estimated_minutes', 999))
+    # Pareto-optimal journeys first, then the next-best alternatives
+    all_routes = plan_journeys(from_id, to_id, when, max_routes, accessible)
     
     return {
         'from_station': from_matches.iloc[0]['stop_name'],
         'to_station': to_matches.iloc[0]['stop_name'],
-        'routes': all_routes[:max_routes],
+        'step_free_only': accessible,
+        'routes': all_routes,
         'fare_info': calculate_fare(from_station, to_station)
     }
 
-def find_direct_routes(from_id: str, to_id: str) -> List[Dict]:
-    """Find direct routes between two stations"""
-    # Get all trips that pass through both stations
-    from_times = stop_times[stop_times['stop_id'] == from_id]
-    to_times = stop_times[stop_times['stop_id'] == to_id]
-    
-    # Find common trips
-    common_trips = set(from_times['trip_id']).intersection(set(to_times['trip_id']))
-    
-    routes = []
-    for trip_id in list(common_trips)[:2]:  # Limit to 2 direct routes
-        trip_info = trips[trips['trip_id'] == trip_id].iloc[0]
-        route_info = routes.loc[routes['route_id'] == trip_info['route_id']].iloc[0]
-        
-        # Get departure and arrival times
-        from_time = from_times[from_times['trip_id'] == trip_id]['departure_time'].iloc[0]
-        to_time = to_times[to_times['trip_id'] == trip_id]['arrival_time'].iloc[0]
-        
-        routes.append({
-            'type': 'Direct',
-            'line': route_info['route_short_name'],
-            'line_name': route_info['route_long_name'],
-            'departure_time': from_time,
-            'arrival_time': to_time,
-            'estimated_minutes': calculate_time_difference(from_time, to_time),
-            'interchanges': 0,
-            'route_type': 'Direct'
-        })
-    
-    return routes
-
-def find_interchange_routes(from_id: str, to_id: str) -> List[Dict]:
-    """Find routes with one interchange"""
-    # This is a simplified version - in reality, you'd need a more complex algorithm
-    # to find optimal interchange points
-    
-    routes = []
-    
-    # Get all routes from source station
-    from_times = stop_times[stop_times['stop_id'] == from_id]
-    from_routes = from_times.merge(trips, on='trip_id').merge(routes, on='route_id')
-    
-    # Get all routes to destination station
-    to_times = stop_times[stop_times['stop_id'] == to_id]
-    to_routes = to_times.merge(trips, on='trip_id').merge(routes, on='route_id')
-    
-    # Find common interchange stations (simplified)
-    interchange_stations = find_common_stations(from_routes, to_routes)
-    
-    for station in interchange_stations[:2]:  # Limit to 2 interchange routes
-        routes.append({
-            'type': 'Interchange',
-            'interchange_station': station['name'],
-            'first_line': station['first_line'],
-            'second_line': station['second_line'],
-            'estimated_minutes': station['estimated_time'],
-            'interchanges': 1,
-            'route_type': 'Interchange'
-        })
-    
-    return routes
-
-def find_common_stations(from_routes: pd.DataFrame, to_routes: pd.DataFrame) -> List[Dict]:
-    """Find common stations that can serve as interchange points"""
-    # This is a simplified implementation
-    # In reality, you'd need to analyze the actual network topology
-    
-    common_stations = []
-    
-    # Get unique stations from both route sets
-    from_stations = set(from_routes['stop_id'].unique())
-    to_stations = set(to_routes['stop_id'].unique())
-    
-    # Find intersection
-    interchange_stations = from_stations.intersection(to_stations)
-    
-    for station_id in list(interchange_stations)[:3]:  # Limit to 3 interchange points
-        station_info = stops[stops['stop_id'] == station_id].iloc[0]
-        
-        common_stations.append({
-            'name': station_info['stop_name'],
-            'first_line': from_routes[from_routes['stop_id'] == station_id]['route_short_name'].iloc[0],
-            'second_line': to_routes[to_routes['stop_id'] == station_id]['route_short_name'].iloc[0],
-            'estimated_time': 30  # Simplified estimate
-        })
-    
-    return common_stations
-
 def calculate_time_difference(time1: str, time2: str) -> int:
     """Calculate time difference in minutes"""
     try:
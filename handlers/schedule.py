@@ -1,29 +1,25 @@
-import pandas as pd
-import os
 from datetime import datetime, timedelta
 from typing import Dict, List
+from handlers.gtfs import GTFSFeed, feed_now, get_feed
 
 class MetroSchedule:
-    def __init__(self):
-        self.base_path = os.path.dirname(os.path.dirname(__file__))
-        self.gtfs_path = os.path.join(self.base_path, 'gtfs')
-        self.load_schedule_data()
+    def __init__(self, feed: GTFSFeed = None):
+        self.load_schedule_data(feed or get_feed())
     
-    def load_schedule_data(self):
-        """Load GTFS schedule data"""
-        try:
-            self.stops = pd.read_csv(os.path.join(self.gtfs_path, 'stops.txt'))
-            self.trips = pd.read_csv(os.path.join(self.gtfs_path, 'trips.txt'))
-            self.stop_times = pd.read_csv(os.path.join(self.gtfs_path, 'stop_times.txt'))
-            self.routes = pd.read_csv(os.path.join(self.gtfs_path, 'routes.txt'))
-            self.calendar = pd.read_csv(os.path.join(self.gtfs_path, 'calendar.txt'))
-        except Exception as e:
-            print(f"Error loading schedule data: {e}")
+    def load_schedule_data(self, feed: GTFSFeed):
+        """Use the tables of an already loaded GTFS feed"""
+        self.stops = feed.stops
+        self.trips = feed.trips
+        self.stop_times = feed.stop_times
+        self.routes = feed.routes
+        self.calendar = feed.calendar
+        trips = feed.trips
+        self.headsigns = dict(zip(trips['trip_id'], trips['trip_headsign'])) if 'trip_headsign' in trips else {}
     
     def get_station_schedule(self, station_name: str, time_of_day: str = "current") -> Dict:
         """Get schedule for a specific station"""
         # Find station
-        station_matches = self.stops[self.stops['stop_name'].str.contains(station_name, case=False, na=False)]
+        station_matches = self.stops[self.stops['stop_name'].str.contains(station_name, case=False, na=False, regex=False)]
         
         if station_matches.empty:
             return {"error": f"Station '{station_name}' not found"}
@@ -32,61 +28,69 @@ class MetroSchedule:
         
         # Get current time or specified time
         if time_of_day == "current":
-            current_time = datetime.now().time()
+            current_time = feed_now().time()
         else:
             # Parse time string (e.g., "14:30")
             try:
                 current_time = datetime.strptime(time_of_day, "%H:%M").time()
             except:
-                current_time = datetime.now().time()
+                current_time = feed_now().time()
         
         # Get next trains
         next_trains = self.get_next_trains(station_id, current_time)
+        from handlers.service_hours import station_hours
+        hours = station_hours(station_id) or {}
         
         return {
             "station_name": station_matches.iloc[0]['stop_name'],
             "current_time": current_time.strftime("%H:%M"),
             "next_trains": next_trains,
-            "operating_hours": "5:30 AM - 11:30 PM",
-            "peak_hours": "8:00 AM - 11:00 AM, 5:00 PM - 8:00 PM"
+            "operating_hours": hours.get("operating_hours"),
+            "first_train": hours.get("first_train"),
+            "last_train": hours.get("last_train"),
+            "service_by_line": hours.get("service_by_line", []),
+            "peak_hours": hours.get("peak_hours")
         }
     
     def get_next_trains(self, station_id: str, current_time, limit: int = 5) -> List[Dict]:
-        """Get next trains arriving at a station"""
-        # Get stop times for this station
-        station_times = self.stop_times[self.stop_times['stop_id'] == station_id]
-        
-        if station_times.empty:
+        """Next trains leaving a station today, with live delays applied"""
+        from handlers.journey import get_timetable, active_services
+        timetable = get_timetable()
+        stop = timetable.stop_index.get(station_id)
+        if stop is None:
             return []
-        
-        # Merge with trip and route information
-        merged = station_times.merge(self.trips, on='trip_id').merge(self.routes, on='route_id')
-        
-        # Convert arrival times to datetime for comparison
-        merged['arrival_time'] = pd.to_datetime(merged['arrival_time'], format='%H:%M:%S').dt.time
-        
-        # Filter for trains after current time
-        future_trains = merged[merged['arrival_time'] > current_time]
-        
-        # Sort by arrival time and take next few
-        next_trains = future_trains.sort_values('arrival_time').head(limit)
-        
+        view = timetable.view(active_services(get_feed(), feed_now().date()))
+        after = current_time.hour * 3600 + current_time.minute * 60 + current_time.second
+
+        upcoming = []
+        for index, pos in view.stop_patterns[stop]:
+            pattern = view.patterns[index]
+            # Trains terminating here are not ones to catch
+            if pos < len(pattern.stops) - 1:
+                upcoming.extend((departure, pattern, trip, pos) for departure, trip in pattern.upcoming(pos, after, limit))
+        upcoming.sort(key=lambda item: item[0])
+
         trains = []
-        for _, train in next_trains.iterrows():
-            trains.append({
-                'line': train['route_short_name'],
-                'direction': train['trip_headsign'] if pd.notna(train['trip_headsign']) else 'Unknown',
-                'arrival_time': train['arrival_time'].strftime('%H:%M'),
-                'platform': train.get('platform_code', 'TBD')
-            })
-        
+        for departure, pattern, trip, pos in upcoming[:limit]:
+            headsign = self.headsigns.get(pattern.trip_ids[trip])
+            train = {
+                'line': timetable.route_names.get(pattern.route_id, ('', ''))[0],
+                'direction': headsign if isinstance(headsign, str) and headsign else
+                             f"Towards {timetable.stop_names[pattern.stops[-1]]}",
+                'arrival_time': f"{(departure // 3600) % 24:02d}:{(departure % 3600) // 60:02d}",
+                'platform': 'TBD'
+            }
+            delay = departure - pattern.departures[trip][pos]
+            if delay:
+                train['delay_minutes'] = round(delay / 60)
+            trains.append(train)
         return trains
     
     def get_route_schedule(self, from_station: str, to_station: str) -> Dict:
         """Get schedule for a specific route"""
         # Find stations
-        from_matches = self.stops[self.stops['stop_name'].str.contains(from_station, case=False, na=False)]
-        to_matches = self.stops[self.stops['stop_name'].str.contains(to_station, case=False, na=False)]
+        from_matches = self.stops[self.stops['stop_name'].str.contains(from_station, case=False, na=False, regex=False)]
+        to_matches = self.stops[self.stops['stop_name'].str.contains(to_station, case=False, na=False, regex=False)]
         
         if from_matches.empty or to_matches.empty:
             return {"error": "One or both stations not found"}
@@ -95,7 +99,7 @@ class MetroSchedule:
         to_id = to_matches.iloc[0]['stop_id']
         
         # Get current time
-        current_time = datetime.now().time()
+        current_time = feed_now().time()
         
         # Find direct routes between stations
         route_info = self.find_direct_route(from_id, to_id, current_time)
@@ -160,7 +164,7 @@ class MetroSchedule:
 
 def get_schedule(from_station: str = "", to_station: str = "") -> Dict:
     """Main function to get schedule information"""
-    schedule = MetroSchedule()
+    schedule = get_feed().derived('schedule', MetroSchedule)
     
     if from_station and to_station:
         return schedule.get_route_schedule(from_station, to_station)
@@ -0,0 +1,127 @@
+import bisect
+from array import array
+from datetime import date
+from typing import Dict, List, Optional
+from handlers.gtfs import GTFSFeed, feed_now, get_feed
+from handlers.journey import Timetable, active_services, _clock
+
+# Headway statistics are kept per band of the service day, in seconds since midnight;
+# the last band runs past midnight to cover trips timed 24:xx and later
+TIME_BANDS = (('early', 0, 8 * 3600), ('morning_peak', 8 * 3600, 11 * 3600), ('midday', 11 * 3600, 17 * 3600),
+              ('evening_peak', 17 * 3600, 20 * 3600), ('late', 20 * 3600, 48 * 3600))
+PEAK_BANDS = ('morning_peak', 'evening_peak')
+NO_HEADWAY = -1
+
+def peak_hours() -> str:
+    """The peak bands as clock ranges, e.g. '08:00 - 11:00, 17:00 - 20:00'"""
+    return ', '.join(f"{_clock(start)} - {_clock(end)}" for band, start, end in TIME_BANDS if band in PEAK_BANDS)
+
+class ServiceSpans:
+    """First and last departure, and headways per time band, for every (stop, route, terminus,
+    service_id) and for every (stop, service_id) across all lines.
+
+    Rows live in int32 columns; `index` maps a key to its row, so a span is one dict lookup.
+    A line's direction is the stop its pattern terminates at, since trips.direction_id is
+    often left empty. Trains terminating at a stop do not count as departures from it.
+    """
+
+    def __init__(self, feed: GTFSFeed):
+        timetable = feed.derived('timetable', Timetable)
+        departures = {}
+        for pattern in timetable.patterns:
+            by_service = {}
+            for t, service in enumerate(pattern.services):
+                by_service.setdefault(service, []).append(t)
+            terminus = pattern.stops[-1]
+            for pos, stop in enumerate(pattern.stops[:-1]):
+                column = pattern.departure_columns[pos]
+                for service, trips in by_service.items():
+                    times = [column[t] for t in trips]
+                    departures.setdefault((stop, pattern.route_id, terminus, service), []).extend(times)
+                    departures.setdefault((stop, None, None, service), []).extend(times)
+
+        self.index = {}
+        # Keys of each stop's per-line rows, for listing a station's lines
+        self.lines_at = {}
+        self.first, self.last, self.trains = array('i'), array('i'), array('i')
+        # len(TIME_BANDS) entries per row: trains in the band, mean and longest gap between them
+        self.band_trains, self.band_mean, self.band_max = array('i'), array('i'), array('i')
+        for key, times in departures.items():
+            times.sort()
+            self.index[key] = len(self.first)
+            if key[1] is not None:
+                self.lines_at.setdefault(key[0], []).append(key)
+            self.first.append(times[0])
+            self.last.append(times[-1])
+            self.trains.append(len(times))
+            for _, start, end in TIME_BANDS:
+                low, high = bisect.bisect_left(times, start), bisect.bisect_left(times, end)
+                count = high - low
+                self.band_trains.append(count)
+                if count < 2:
+                    self.band_mean.append(NO_HEADWAY)
+                    self.band_max.append(NO_HEADWAY)
+                    continue
+                # Gaps telescope, so their mean is the band's spread over the gaps in it
+                self.band_mean.append(round((times[high - 1] - times[low]) / (count - 1)))
+                self.band_max.append(max(times[i + 1] - times[i] for i in range(low, high - 1)))
+        self._services = {}
+
+    def services(self, feed: GTFSFeed, day: date) -> Optional[frozenset]:
+        """active_services for `day`, remembered so a lookup does not filter the calendar again"""
+        services = self._services.get(day, False)
+        if services is False:
+            services = self._services[day] = active_services(feed, day)
+        return services
+
+    def rows(self, stop: int, route_id=None, terminus: Optional[int] = None,
+             services: Optional[frozenset] = None) -> List[int]:
+        """Rows of one key for each service running (every service when `services` is None)"""
+        if services is None:
+            services = {key[3] for key in self.lines_at.get(stop, ())}
+        rows = [self.index.get((stop, route_id, terminus, service)) for service in services]
+        return [row for row in rows if row is not None]
+
+    def span(self, rows: List[int]) -> Optional[Dict]:
+        """First and last departure (seconds) and headways over `rows`; the busiest row's
+        headways stand for the day when more than one service runs"""
+        if not rows:
+            return None
+        busiest = max(rows, key=lambda row: self.trains[row])
+        headways = {}
+        for b, (band, _, _) in enumerate(TIME_BANDS):
+            cell = busiest * len(TIME_BANDS) + b
+            if self.band_mean[cell] != NO_HEADWAY:
+                headways[band] = {'trains': self.band_trains[cell], 'every_minutes': round(self.band_mean[cell] / 60, 1),
+                                  'longest_gap_minutes': round(self.band_max[cell] / 60, 1)}
+        return {'first': min(self.first[row] for row in rows), 'last': max(self.last[row] for row in rows),
+                'trains': sum(self.trains[row] for row in rows), 'headways': headways}
+
+def get_service_spans() -> ServiceSpans:
+    return get_feed().derived('service_spans', ServiceSpans)
+
+def station_hours(stop_id, day: Optional[date] = None) -> Optional[Dict]:
+    """Today's (or `day`'s) first and last train at a station, overall and per line and direction;
+    None when no train is scheduled to leave it"""
+    from handlers.journey import get_timetable
+    timetable = get_timetable()
+    stop = timetable.stop_index.get(stop_id)
+    if stop is None:
+        return None
+    spans = get_service_spans()
+    services = spans.services(get_feed(), day or feed_now().date())
+    overall = spans.span(spans.rows(stop, services=services))
+    if overall is None:
+        return None
+    lines = []
+    for key in {key[:3] for key in spans.lines_at.get(stop, ())}:
+        span = spans.span(spans.rows(*key, services=services))
+        if span is not None:
+            lines.append({'line': timetable.route_names.get(key[1], ('', ''))[0],
+                          'direction': f"Towards {timetable.stop_names[key[2]]}",
+                          'first_train': _clock(span['first']), 'last_train': _clock(span['last']),
+                          'every_minutes': {band: stats['every_minutes'] for band, stats in span['headways'].items()}})
+    lines.sort(key=lambda line: (line['line'], line['direction']))
+    return {'operating_hours': f"{_clock(overall['first'])} - {_clock(overall['last'])}",
+            'first_train': _clock(overall['first']), 'last_train': _clock(overall['last']),
+            'trains_today': overall['trains'], 'peak_hours': peak_hours(), 'service_by_line': lines}
@@ -0,0 +1,200 @@
+import os
+import time
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, Optional
+from handlers.cache import guess_intent, resolve_stations
+
+ANONYMOUS = 'anonymous'
+FOLLOWUP_PREFIXES = ('and ', 'what about', 'how about', 'also ', 'then ', 'same ')
+# Schedules and routes carry next departures, so they go stale quickly; everything
+# else lives as long as the session (or until the feed is reloaded)
+RESULT_TTL = {'get_schedule': 60, 'find_route': 60}
+TIME_SENSITIVE_ACTIONS = tuple(RESULT_TTL)
+
+class SessionContext:
+    """Per-session conversation state kept between requests"""
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.entities = {}
+        self.last_intent = None
+        self.user_context = {}
+        self.history = deque(maxlen=10)
+        self.results = {}
+        self.touched = time.monotonic()
+
+    def stations(self) -> Optional[tuple]:
+        if self.entities.get('from_station') and self.entities.get('to_station'):
+            return (self.entities['from_station'], self.entities['to_station'])
+        return None
+
+    def is_followup(self, query: str, lang: str = 'en') -> bool:
+        """A short query with no stations of its own that refers back to the last answer"""
+        if not self.entities:
+            return False
+        q = query.lower().strip()
+        if len(q.split()) > 8:
+            return False
+        if not (q.startswith(FOLLOWUP_PREFIXES) or guess_intent(q) != 'general_help'):
+            return False
+        from handlers.llm import find_stations
+        return not find_stations(query, lang)
+
+    def followup_intent(self, query: str, lang: str = 'en') -> Optional[Dict]:
+        """Intent data for a follow-up built from session state, skipping LLM classification"""
+        if not self.is_followup(query, lang):
+            return None
+        intent = guess_intent(query, 2 if self.stations() else 0)
+        if intent == 'general_help':
+            intent = self.last_intent or 'route_finding'
+        return {"intent": intent, "entities": dict(self.entities), "confidence": 0.8,
+                "requires_followup": False, "from_context": True}
+
+    def get_result(self, action: Dict):
+        key = _action_key(action)
+        entry = self.results.get(key)
+        if entry is None:
+            return None
+        stored_at, result = entry
+        ttl = RESULT_TTL.get(action["action"])
+        if ttl is not None and time.monotonic() - stored_at > ttl:
+            del self.results[key]
+            return None
+        return result
+
+    def put_result(self, action: Dict, result: Dict):
+        if isinstance(result, dict) and not result.get('error') and action["action"] != "clarify_stations":
+            self.results[_action_key(action)] = (time.monotonic(), result)
+
+    def drop_results(self, actions: Optional[tuple] = None):
+        """Forget stored results of `actions` (all of them when None)"""
+        self.results = {key: entry for key, entry in list(self.results.items())
+                        if actions is not None and dict(key)['action'] not in actions}
+
+    def needs_step_free(self) -> bool:
+        from handlers.journey import requires_step_free
+        return requires_step_free(self.user_context.get('accessibility_needs'))
+
+    def note_stations(self, stations: Optional[tuple]):
+        """Record a station pair resolved outside the agent (e.g. on an answer-cache hit)"""
+        if stations:
+            self.entities['from_station'], self.entities['to_station'] = stations
+            self.touched = time.monotonic()
+
+    def remember(self, query: str, intent_data: Dict, response: str):
+        entities = intent_data.get("entities") or {}
+        self.entities.update({k: v for k, v in entities.items() if v})
+        self.last_intent = intent_data.get("intent", self.last_intent)
+        self.history.append({'query': query, 'intent': self.last_intent, 'response': response})
+        self.touched = time.monotonic()
+
+def resolve_query(query: str, lang: str = 'en', ctx: Optional[SessionContext] = None) -> Optional[tuple]:
+    """Resolve the station pair from the query, or from the session for a follow-up"""
+    stations = resolve_stations(query, lang)
+    if stations is None and ctx is not None and ctx.is_followup(query, lang):
+        return ctx.stations()
+    return stations
+
+def _action_key(action: Dict) -> tuple:
+    return tuple(sorted((k, v) for k, v in action.items() if k != 'message'))
+
+class SessionStore:
+    """In-memory session contexts with TTL and LRU bounds.
+
+    New sessions take their saved accessibility needs from user_preferences,
+    so step-free answers never depend on whether the session was just created.
+    When `persist` is set, they are seeded with the rest of the preferences
+    too, and newly mentioned stations are written back to frequent_stations.
+    """
+
+    def __init__(self, ttl: float = 1800, max_sessions: int = 10000, persist: bool = False):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.persist = persist
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: Optional[str]) -> Optional[SessionContext]:
+        # Requests without a session id must not share one context
+        if not session_id or session_id == ANONYMOUS:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            ctx = self._sessions.get(session_id)
+            if ctx is not None and now - ctx.touched > self.ttl:
+                ctx = None
+            load_preferences = ctx is None
+            if ctx is None:
+                ctx = SessionContext(session_id)
+                self._sessions[session_id] = ctx
+            self._sessions.move_to_end(session_id)
+            ctx.touched = now
+            self._prune(now)
+
+        if load_preferences:
+            self._load_preferences(ctx)
+        return ctx
+
+    def _prune(self, now: float):
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if len(self._sessions) > self.max_sessions or now - oldest.touched > self.ttl:
+                self._sessions.popitem(last=False)
+            else:
+                break
+
+    def _load_preferences(self, ctx: SessionContext):
+        from handlers.database import get_database
+        try:
+            prefs = get_database().get_user_preferences(ctx.session_id)
+        except Exception as e:
+            print(f"Error loading session preferences: {e}")
+            return
+        self._apply_preferences(ctx, prefs)
+
+    def _apply_preferences(self, ctx: SessionContext, prefs: Dict):
+        if not self.persist:
+            prefs = {k: v for k, v in prefs.items() if k == 'accessibility_needs'}
+        ctx.user_context.update(prefs)
+
+    def update_preferences(self, session_id: Optional[str], prefs: Dict):
+        """Apply preferences just saved for `session_id` to its live context"""
+        ctx = self.get(session_id)
+        if ctx is not None:
+            self._apply_preferences(ctx, prefs)
+
+    def save(self, ctx: SessionContext):
+        """Write newly seen stations back to user_preferences when persistence is on"""
+        if not self.persist:
+            return
+        frequent = list(ctx.user_context.get('frequent_stations') or [])
+        new = [s for s in (ctx.entities.get('from_station'), ctx.entities.get('to_station')) if s and s not in frequent]
+        if not new:
+            return
+        frequent = (new + frequent)[:10]
+        ctx.user_context['frequent_stations'] = frequent
+        from handlers.database import get_database
+        try:
+            get_database().save_user_preferences(ctx.session_id, {
+                'preferred_language': ctx.user_context.get('preferred_language', ctx.user_context.get('lang', 'en')),
+                'frequent_stations': frequent,
+                'accessibility_needs': ctx.user_context.get('accessibility_needs', {})
+            })
+        except Exception as e:
+            print(f"Error saving session preferences: {e}")
+
+    def drop_results(self, actions: Optional[tuple] = None):
+        """Forget results stored in every session, e.g. when the data behind them changes"""
+        with self._lock:
+            contexts = list(self._sessions.values())
+        for ctx in contexts:
+            ctx.drop_results(actions)
+
+    def __len__(self):
+        return len(self._sessions)
+
+session_store = SessionStore(
+    ttl=float(os.getenv('SESSION_TTL', '1800')),
+    persist=os.getenv('SESSION_PERSIST', '0') == '1'
+)
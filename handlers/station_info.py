@@ -1,33 +1,29 @@
-import pandas as pd
-import os
 from typing import Dict, List
+from handlers.gtfs import GTFSFeed, get_feed
 
 class StationInfo:
-    def __init__(self):
-        self.base_path = os.path.dirname(os.path.dirname(__file__))
-        self.gtfs_path = os.path.join(self.base_path, 'gtfs')
-        self.load_station_data()
+    def __init__(self, feed: GTFSFeed = None):
+        self.load_station_data(feed or get_feed())
     
-    def load_station_data(self):
-        """Load station data from GTFS"""
-        try:
-            self.stops = pd.read_csv(os.path.join(self.gtfs_path, 'stops.txt'))
-            self.routes = pd.read_csv(os.path.join(self.gtfs_path, 'routes.txt'))
-            self.trips = pd.read_csv(os.path.join(self.gtfs_path, 'trips.txt'))
-            self.stop_times = pd.read_csv(os.path.join(self.gtfs_path, 'stop_times.txt'))
-        except Exception as e:
-            print(f"Error loading station data: {e}")
+    def load_station_data(self, feed: GTFSFeed):
+        """Use the tables of an already loaded GTFS feed"""
+        self.stops = feed.stops
+        self.routes = feed.routes
+        self.trips = feed.trips
+        self.stop_times = feed.stop_times
     
     def get_station_details(self, station_name: str) -> Dict:
         """Get detailed information about a station"""
         # Find station
-        station_matches = self.stops[self.stops['stop_name'].str.contains(station_name, case=False, na=False)]
+        station_matches = self.stops[self.stops['stop_name'].str.contains(station_name, case=False, na=False, regex=False)]
         
         if station_matches.empty:
             return {"error": f"Station '{station_name}' not found"}
         
         station = station_matches.iloc[0]
         station_id = station['stop_id']
+        from handlers.service_hours import station_hours
+        hours = station_hours(station_id) or {}
         
         # Get station information
         station_info = {
@@ -41,10 +37,11 @@ class StationInfo:
             "facilities": self.get_station_facilities(station['stop_name']),
             "connections": self.get_station_connections(station_id),
             "lines": self.get_station_lines(station_id),
-            "accessibility": self.get_accessibility_info(station['stop_name']),
-            "operating_hours": "5:30 AM - 11:30 PM",
-            "last_train": "11:30 PM",
-            "first_train": "5:30 AM"
+            "accessibility": self.get_accessibility_info(station_id),
+            "operating_hours": hours.get("operating_hours"),
+            "last_train": hours.get("last_train"),
+            "first_train": hours.get("first_train"),
+            "service_by_line": hours.get("service_by_line", [])
         }
         
         return station_info
@@ -109,30 +106,34 @@ class StationInfo:
         
         return unique_lines
     
-    def get_accessibility_info(self, station_name: str) -> Dict:
-        """Get accessibility information for the station"""
-        # This would typically come from accessibility database
-        accessibility = {
-            "wheelchair_accessible": True,
-            "elevator": True,
-            "escalator": True,
-            "ramp_access": True,
-            "tactile_path": True,
-            "audio_signals": True,
-            "visual_signals": True
+    def get_accessibility_info(self, station_id) -> Dict:
+        """Get accessibility information for the station from GTFS wheelchair fields"""
+        from handlers.journey import get_timetable, ACCESS_LABELS, ACCESS_UNKNOWN, ACCESS_YES, ACCESS_NO
+        timetable = get_timetable()
+        stop = timetable.stop_index.get(station_id)
+        boarding = timetable.stop_access[stop] if stop is not None else ACCESS_UNKNOWN
+        
+        # Share of trips calling here that the feed marks accessible / not accessible
+        counts = {ACCESS_UNKNOWN: 0, ACCESS_YES: 0, ACCESS_NO: 0}
+        for pattern in timetable.patterns:
+            if stop in pattern.stops:
+                for access in pattern.access:
+                    counts[access] = counts.get(access, 0) + 1
+        total = sum(counts.values())
+        
+        return {
+            "wheelchair_accessible": ACCESS_LABELS.get(boarding, "unknown"),
+            "accessible_trips": counts[ACCESS_YES],
+            "inaccessible_trips": counts[ACCESS_NO],
+            "trips_without_information": counts[ACCESS_UNKNOWN],
+            "accessible_trip_share": round(counts[ACCESS_YES] / total, 2) if total else None,
+            "source": "gtfs"
         }
-        
-        # Some stations might have limited accessibility
-        if "old" in station_name.lower() or "heritage" in station_name.lower():
-            accessibility["wheelchair_accessible"] = False
-            accessibility["elevator"] = False
-        
-        return accessibility
     
     def get_nearby_stations(self, station_name: str, radius_km: float = 2.0) -> List[Dict]:
         """Get nearby stations within specified radius"""
         # Find the target station
-        station_matches = self.stops[self.stops['stop_name'].str.contains(station_name, case=False, na=False)]
+        station_matches = self.stops[self.stops['stop_name'].str.contains(station_name, case=False, na=False, regex=False)]
         
         if station_matches.empty:
             return []
@@ -206,5 +207,5 @@ class StationInfo:
 
 def get_station_details(station_name: str) -> Dict:
     """Main function to get station details"""
-    station_info = StationInfo()
+    station_info = get_feed().derived('station_info', StationInfo)
     return station_info.get_station_details(station_name) 
\ No newline at end of file
@@ -1,10 +1,22 @@
-import speech_recognition as sr
+import asyncio
+from handlers.admission import admit, admit_async
 
-def stt_transcribe(wav_path):
+def _transcribe(wav_path):
+    import speech_recognition as sr
     r = sr.Recognizer()
     with sr.AudioFile(wav_path) as src:
         audio = r.record(src)
     try:
         return r.recognize_google(audio, language='en-IN')
     except Exception:
-        return None
\ No newline at end of file
+        return None
+
+def stt_transcribe(wav_path):
+    with admit('stt'):
+        return _transcribe(wav_path)
+
+async def stt_transcribe_async(wav_path):
+    # Queue on the event loop rather than in a worker thread, then run the
+    # blocking speech_recognition client off the loop once admitted
+    async with admit_async('stt'):
+        return await asyncio.to_thread(_transcribe, wav_path)
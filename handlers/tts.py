@@ -1,9 +1,35 @@
 import os
+import time
 import asyncio
-from edge_tts import Communicate
+from handlers.admission import admit, admit_async
+
+def _voice(lang):
+    return 'en-IN-PrabhatNeural' if lang == 'en' else 'hi-IN-MadhurNeural'
 
 def tts_synthesize(text, lang='en'):
-    voice = 'en-IN-PrabhatNeural' if lang == 'en' else 'hi-IN-MadhurNeural'
+    from edge_tts import Communicate
     output = os.path.join('static', 'output.mp3')
-    asyncio.run(Communicate(text=text, voice=voice).save(output))
-    return output
\ No newline at end of file
+    with admit('tts'):
+        asyncio.run(Communicate(text=text, voice=_voice(lang)).save(output))
+    return output
+
+async def tts_synthesize_async(text, lang='en', filename='output.mp3'):
+    from edge_tts import Communicate
+    output = os.path.join('static', filename)
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    async with admit_async('tts'):
+        await Communicate(text=text, voice=_voice(lang)).save(output)
+    return output
+
+def prune_audio(directory=os.path.join('static', 'audio'), max_age=600):
+    """Remove per-request audio files older than max_age seconds"""
+    if not os.path.isdir(directory):
+        return
+    cutoff = time.time() - max_age
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
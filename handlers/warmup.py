@@ -0,0 +1,170 @@
+import os
+import time
+import threading
+from time import perf_counter
+from typing import Dict, Optional
+from handlers.gtfs import (GTFSFeed, GTFS_PATH, directory_fingerprint, feed_now, get_feed, loaded_feed, pinned_feed,
+                           station_names, swap_feed)
+
+def _load_gtfs():
+    get_feed()
+
+def _load_stations():
+    from handlers.lexicon import station_lexicon
+    station_names()
+    station_lexicon()
+
+def _load_route_graph():
+    from handlers.route_finder import stop_to_routes_index
+    stop_to_routes_index()
+
+def _load_timetable():
+    from handlers.journey import get_timetable, active_services
+    timetable = get_timetable()
+    # Today's plain and step-free views, so neither kind of query pays to build one
+    services = active_services(get_feed(), feed_now().date())
+    timetable.view(services)
+    timetable.view(services, accessible=True)
+
+def _load_service_hours():
+    from handlers.service_hours import get_service_spans
+    get_service_spans()
+
+def _load_realtime():
+    from handlers.realtime import TRIP_UPDATES_URL, sequence_positions
+    # Updates that name stops by stop_sequence only are mapped through this index
+    if TRIP_UPDATES_URL:
+        sequence_positions()
+
+def _load_geometry():
+    from handlers.geometry import get_geometry, stop_positions
+    get_geometry()
+    stop_positions()
+
+def _load_rag():
+    from handlers.rag import get_rag
+    get_rag()
+
+# Run in order; later steps reuse the feed loaded by the first
+WARMUP_STEPS = (
+    ('gtfs', _load_gtfs),
+    ('stations', _load_stations),
+    ('route_graph', _load_route_graph),
+    ('timetable', _load_timetable),
+    ('service_hours', _load_service_hours),
+    ('realtime', _load_realtime),
+    ('geometry', _load_geometry),
+    ('rag', _load_rag),
+)
+
+_status = {name: {'ready': False} for name, _ in WARMUP_STEPS}
+_started = False
+_lock = threading.Lock()
+
+def build_indexes(status: Dict[str, Dict]):
+    """Run every warm-up step against the feed get_feed() currently resolves to"""
+    for name, step in WARMUP_STEPS:
+        start = perf_counter()
+        try:
+            step()
+            status[name] = {'ready': True, 'seconds': round(perf_counter() - start, 3)}
+        except Exception as e:
+            print(f"Error warming up {name}: {e}")
+            status[name] = {'ready': False, 'error': str(e)}
+
+def warm_up():
+    """Load GTFS and build the station, route and RAG indexes"""
+    build_indexes(_status)
+
+def start_warmup():
+    """Start warm-up in a background thread once per process"""
+    global _started
+    if _started:
+        return
+    with _lock:
+        if _started:
+            return
+        _started = True
+    threading.Thread(target=warm_up, name='metro-warmup', daemon=True).start()
+    start_watcher()
+    from handlers.realtime import start_realtime
+    start_realtime()
+
+def readiness() -> Dict:
+    feed = loaded_feed()
+    return {
+        'ready': all(status['ready'] for status in _status.values()),
+        'components': dict(_status),
+        'missing_gtfs_files': feed.missing if feed else None,
+        'gtfs_version': feed.version if feed else None
+    }
+
+# Hot reload: a new snapshot is loaded and fully indexed off the request
+# path, then swapped in with a single reference assignment.
+_reload_lock = threading.Lock()
+_reload_state = {'running': False, 'last': None}
+
+def reload_gtfs(path: Optional[str] = None) -> Dict:
+    """Load `path` (default: the live feed's directory), build its indexes, then swap it in"""
+    if not _reload_lock.acquire(blocking=False):
+        return {'swapped': False, 'error': 'A reload is already running'}
+    try:
+        _reload_state['running'] = True
+        current = loaded_feed()
+        path = path or (current.path if current else GTFS_PATH)
+        if not os.path.isdir(path):
+            result = {'swapped': False, 'error': f"GTFS directory not found: {path}"}
+        else:
+            start = perf_counter()
+            feed = GTFSFeed(path, version=(current.version + 1) if current else 1)
+            status = {}
+            # Index builders call get_feed(), so pin the new snapshot while building
+            with pinned_feed(feed):
+                build_indexes(status)
+            failed = [name for name, step in status.items() if not step['ready']]
+            if 'stops.txt' in feed.missing or failed:
+                result = {'swapped': False, 'error': 'New feed is incomplete', 'failed': failed,
+                          'missing_files': feed.missing}
+            else:
+                swap_feed(feed)
+                _status.update(status)
+                result = {'swapped': True, 'version': feed.version, 'path': path,
+                          'missing_files': feed.missing, 'seconds': round(perf_counter() - start, 3)}
+        _reload_state['last'] = dict(result, finished_at=time.time())
+        return result
+    finally:
+        _reload_state['running'] = False
+        _reload_lock.release()
+
+def start_reload(path: Optional[str] = None) -> bool:
+    """Reload in a background thread; False if one is already running"""
+    if _reload_lock.locked():
+        return False
+    threading.Thread(target=reload_gtfs, args=(path,), name='metro-gtfs-reload', daemon=True).start()
+    return True
+
+def reload_status() -> Dict:
+    feed = loaded_feed()
+    return {'live': feed.describe() if feed else None,
+            'running': _reload_state['running'], 'last': _reload_state['last']}
+
+def _watch(interval: float):
+    seen = attempted = None
+    while True:
+        time.sleep(interval)
+        feed = loaded_feed()
+        if feed is None:
+            continue
+        fingerprint = directory_fingerprint(feed.path)
+        # Wait for the directory to stop changing before reloading a half-copied feed,
+        # and try each version of the directory only once
+        if fingerprint != feed.fingerprint and fingerprint == seen and fingerprint != attempted:
+            print(f"GTFS change detected in {feed.path}, reloading")
+            attempted = fingerprint
+            reload_gtfs(feed.path)
+        seen = fingerprint
+
+def start_watcher(interval: float = float(os.getenv('GTFS_WATCH_INTERVAL', '0'))):
+    """Poll the live feed's directory and reload on change (off unless GTFS_WATCH_INTERVAL is set)"""
+    if interval > 0:
+        threading.Thread(target=_watch, args=(interval,), name='metro-gtfs-watch', daemon=True).start()
@@ -0,0 +1,75 @@
+import os
+import tempfile
+import pytest
+
+# A three-stop line run by two trips every day, T1 not step-free and T2 step-free:
+# enough for the timetable, realtime, schedule and app code
+FEED_FILES = {
+    'agency.txt': "agency_id,agency_name,agency_url,agency_timezone\n"
+                  "DMRC,Delhi Metro Rail Corporation,http://www.delhimetrorail.com/,Asia/Kolkata\n",
+    'stops.txt': "stop_id,stop_code,stop_name,stop_desc,stop_lat,stop_lon,wheelchair_boarding\n"
+                 "1,RC,Rajiv Chowk,,28.6328,77.2197,1\n"
+                 "2,NDLS,New Delhi,,28.6431,77.2223,1\n"
+                 "3,KG,Kashmere Gate (ISBT),,28.6675,77.2282,1\n",
+    'routes.txt': "route_id,agency_id,route_short_name,route_long_name,route_desc,route_type\n"
+                  "1,DMRC,Y_SQ,YELLOW_Samaypur Badli to Qutab Minar,,1\n",
+    'trips.txt': "route_id,service_id,trip_id,trip_headsign,direction_id,shape_id,wheelchair_accessible\n"
+                 "1,weekday,T1,,,,2\n"
+                 "1,weekday,T2,,,,1\n",
+    'stop_times.txt': "trip_id,arrival_time,departure_time,stop_id,stop_sequence\n"
+                      "T1,08:00:00,08:00:00,1,1\nT1,08:05:00,08:05:30,2,2\nT1,08:12:00,08:12:00,3,3\n"
+                      "T2,08:10:00,08:10:00,1,1\nT2,08:15:00,08:15:30,2,2\nT2,08:22:00,08:22:00,3,3\n",
+    'calendar.txt': "service_id,monday,tuesday,wednesday,thursday,friday,saturday,sunday,start_date,end_date\n"
+                    "weekday,1,1,1,1,1,1,1,20250101,20301231\n",
+}
+
+# Handlers read their paths at import, so the fixture feed and a scratch database are set up first
+FEED_PATH = tempfile.mkdtemp(prefix='metro-gtfs-')
+for name, content in FEED_FILES.items():
+    with open(os.path.join(FEED_PATH, name), 'w') as f:
+        f.write(content)
+os.environ['METRO_GTFS_PATH'] = FEED_PATH
+os.environ['METRO_DB_PATH'] = os.path.join(tempfile.mkdtemp(prefix='metro-db-'), 'metro.db')
+os.environ['SESSION_RATE_PER_MINUTE'] = '0'
+# Any LLM call fails fast instead of reaching the network
+os.environ['GEMINI_API_BASE'] = 'http://127.0.0.1:9'
+
+@pytest.fixture
+def feed():
+    """A fresh copy of the fixture feed, pinned as the current snapshot for the test"""
+    from handlers.gtfs import GTFSFeed, pinned_feed
+    loaded = GTFSFeed(FEED_PATH)
+    with pinned_feed(loaded):
+        yield loaded
+
+@pytest.fixture
+def make_feed(tmp_path):
+    """Pin a variant of the fixture feed with some files replaced, e.g. make_feed(**{'trips.txt': ...})"""
+    from handlers.gtfs import GTFSFeed, pinned_feed
+    pins = []
+    def build(**files):
+        for name, content in dict(FEED_FILES, **files).items():
+            (tmp_path / name).write_text(content)
+        loaded = GTFSFeed(str(tmp_path))
+        pins.append(pinned_feed(loaded))
+        pins[-1].__enter__()
+        return loaded
+    yield build
+    for pin in reversed(pins):
+        pin.__exit__(None, None, None)
+
+@pytest.fixture
+def client():
+    from app import app
+    return app.test_client()
+
+@pytest.fixture
+def host_timezone(monkeypatch):
+    """Set the process's local timezone, as a server's TZ would"""
+    import time
+    def set_timezone(name: str):
+        monkeypatch.setenv('TZ', name)
+        time.tzset()
+    yield set_timezone
+    monkeypatch.undo()
+    time.tzset()
@@ -0,0 +1,58 @@
+import pytest
+from handlers.journey import requires_step_free
+
+@pytest.mark.parametrize('needs, expected', [
+    ({'wheelchair': True}, True), ({'wheelchair': False, 'visual': True}, False),
+    (['wheelchair'], True), (['Step_Free', 'visual'], True), (['visual'], False),
+    ('mobility', True), (None, False), ([], False), (42, False), (['wheelchair', 1], False),
+])
+def test_requires_step_free_accepts_dicts_and_lists(needs, expected):
+    assert requires_step_free(needs) is expected
+
+def test_journeys_after_saving_needs_as_a_list(client):
+    saved = client.post('/api/preferences?session_id=list-needs', json={'accessibility_needs': ['wheelchair']})
+    assert saved.status_code == 200
+    response = client.get('/api/journeys?session_id=list-needs&from=Rajiv Chowk&to=Kashmere Gate&time=08:00')
+    assert response.status_code == 200
+    # T1 at 08:00 is not step-free, so the journey waits for T2
+    journey = response.get_json()['routes'][0]
+    assert journey['step_free'] == 'yes'
+    assert journey['legs'][0]['departure_time'] == '08:10'
+
+@pytest.mark.parametrize('needs', [[1, 2], ['wheelchair', 1], 3, True])
+def test_preferences_reject_malformed_needs(client, needs):
+    response = client.post('/api/preferences?session_id=bad-needs', json={'accessibility_needs': needs})
+    assert response.status_code == 400
+    assert not requires_step_free(needs)
+
+def test_preferences_accept_what_requires_step_free_reads(client):
+    response = client.post('/api/preferences?session_id=string-needs', json={'accessibility_needs': 'mobility'})
+    assert response.status_code == 200
+    from app import session_store
+    assert session_store.get('string-needs').needs_step_free()
+
+def test_station_accessibility_uses_the_resolved_stop(feed):
+    from handlers.station_info import StationInfo
+    details = StationInfo(feed).get_station_details('Rajiv Chowk')
+    assert details['accessibility']['wheelchair_accessible'] == 'yes'
+    assert details['accessibility']['accessible_trips'] == 1
+    assert details['accessibility']['inaccessible_trips'] == 1
+
+def test_saved_needs_reach_the_live_session_and_the_agent(client):
+    from app import session_store
+    from handlers.agent import MetroAgent
+    context = session_store.get('live-needs')
+    assert not context.needs_step_free()
+    saved = client.post('/api/preferences?session_id=live-needs', json={'accessibility_needs': {'wheelchair': True}})
+    assert saved.status_code == 200
+    assert context.needs_step_free()
+    route = MetroAgent(context).plan_actions('route_finding', {'from_station': 'Rajiv Chowk', 'to_station': 'New Delhi'})[0]
+    assert route['accessible'] is True
+
+def test_new_sessions_take_saved_needs_without_persistence(client):
+    from handlers.session import SessionStore
+    client.post('/api/preferences?session_id=stored-needs', json={'accessibility_needs': ['wheelchair'],
+                                                                 'preferred_language': 'hi'})
+    context = SessionStore(persist=False).get('stored-needs')
+    assert context.needs_step_free()
+    assert 'preferred_language' not in context.user_context
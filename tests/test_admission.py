@@ -0,0 +1,70 @@
+import time
+import asyncio
+import threading
+import pytest
+from handlers.admission import GATES, Overloaded, SessionLimiter, StageGate
+
+def test_gate_queues_then_sheds():
+    gate = StageGate('test', limit=1, queue_limit=1, max_wait=0.5)
+    gate.acquire()
+    timed_out = []
+    def wait():
+        try:
+            gate.acquire()
+        except Overloaded as e:
+            timed_out.append(e.reason)
+    waiter = threading.Thread(target=wait)
+    waiter.start()
+    while not gate.stats()['queue_depth']:
+        time.sleep(0.001)
+    with pytest.raises(Overloaded) as full:
+        gate.acquire()
+    waiter.join()
+    assert full.value.reason == 'queue_full' and timed_out == ['timeout']
+    stats = gate.stats()
+    assert (stats['active'], stats['shed_queue_full'], stats['shed_timeout'], stats['max_queue_depth']) == (1, 1, 1, 1)
+
+def test_release_hands_the_slot_to_the_next_waiter():
+    gate = StageGate('test', limit=1, queue_limit=4, max_wait=5)
+    gate.acquire()
+    admitted = threading.Event()
+    def wait():
+        gate.acquire()
+        admitted.set()
+    threading.Thread(target=wait).start()
+    while not gate.stats()['queue_depth']:
+        time.sleep(0.001)
+    gate.release()
+    assert admitted.wait(5)
+    # The slot passed straight over, so it never looked free
+    assert gate.stats()['active'] == 1 and gate.stats()['admitted'] == 2
+
+def test_threads_and_coroutines_share_a_gate():
+    gate = StageGate('test', limit=1, queue_limit=4, max_wait=5)
+    gate.acquire()
+    async def waiter():
+        task = asyncio.ensure_future(gate.acquire_async())
+        while not gate.stats()['queue_depth']:
+            await asyncio.sleep(0)
+        gate.release()
+        await task
+    asyncio.run(waiter())
+    assert gate.stats()['active'] == 1
+
+def test_session_limiter_reports_how_long_to_wait():
+    limiter = SessionLimiter(rate=1, burst=2)
+    limiter.take('s')
+    limiter.take('s')
+    with pytest.raises(Overloaded) as limited:
+        limiter.take('s')
+    assert limited.value.reason == 'rate_limited' and 0 < limited.value.retry_after <= 1
+
+def test_shed_requests_get_429_with_retry_after(client, monkeypatch):
+    full = StageGate('llm', limit=1, queue_limit=0, max_wait=3)
+    full.acquire()
+    monkeypatch.setitem(GATES, 'llm', full)
+    response = client.post('/process_text', json={'query': 'Which line is best for shedding tests?',
+                                                  'session_id': 'shed'})
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '3'
+    assert response.get_json()['stage'] == 'llm' and response.get_json()['reason'] == 'queue_full'
@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta
+from handlers.analytics import SpaceSaving, backfill, trending_routes
+from handlers.database import get_database
+
+def trending_count(pair) -> int:
+    return dict(trending_routes.top(50)).get(pair, 0)
+
+def hourly_rows(db, pair):
+    return db.conn.execute("SELECT hour_bucket, searches FROM route_pair_hourly WHERE from_station = ? AND to_station = ?"
+                           " ORDER BY hour_bucket", pair).fetchall()
+
+def test_space_saving_clear_resets_the_summary():
+    summary = SpaceSaving(2)
+    for key in 'aabc':
+        summary.update(key)
+    summary.clear()
+    assert summary.top(5) == []
+    summary.update('d')
+    assert summary.top(5) == [('d', 1)] and summary.errors == {'d': 0}
+
+def test_backfill_in_a_live_process_keeps_trending_counts():
+    db = get_database()
+    pair = ('Rajiv Chowk', 'Kashmere Gate (ISBT)')
+    before = trending_count(pair)
+    for _ in range(3):
+        db.save_route_search('trending', *pair)
+    db.flush()
+    assert trending_count(pair) == before + 3
+    backfill(db)
+    assert trending_count(pair) == before + 3
+
+def test_backfill_keeps_hourly_rows_and_fills_older_hours():
+    db = get_database()
+    live, legacy = ('New Delhi', 'Rajiv Chowk'), ('Kashmere Gate (ISBT)', 'New Delhi')
+    for _ in range(2):
+        db.save_route_search('hourly', *live)
+    db.flush()
+    # The writer's exact count for an earlier hour of the same pair
+    earlier = (datetime.utcnow() - timedelta(hours=2)).strftime('%Y-%m-%d %H:00:00')
+    with db.conn:
+        db.conn.execute("INSERT INTO route_pair_hourly (from_station, to_station, hour_bucket, searches)"
+                        " VALUES (?, ?, ?, 4)", (*live, earlier))
+    # A search logged before the aggregates existed: five searches, last one three days ago
+    long_ago = (datetime.utcnow() - timedelta(days=3)).strftime('%Y-%m-%d %H:%M:%S')
+    with db.conn:
+        db.conn.execute("INSERT INTO route_history (session_id, from_station, to_station, search_count, first_searched,"
+                        " last_searched) VALUES ('legacy', ?, ?, 5, ?, ?)", (*legacy, long_ago, long_ago))
+    kept = [tuple(row) for row in hourly_rows(db, live)]
+    backfill(db)
+    assert [tuple(row) for row in hourly_rows(db, live)] == kept
+    assert [tuple(row) for row in hourly_rows(db, legacy)] == [(long_ago[:13] + ':00:00', 5)]
+    assert trending_count(legacy) == 0
@@ -0,0 +1,19 @@
+from datetime import datetime
+import pytest
+from handlers.cache import query_key
+
+STATIONS = ('Rajiv Chowk', 'Kashmere Gate')
+
+@pytest.mark.parametrize('query, stations', [
+    ("Next train at Rajiv Chowk", None),
+    ("How do I get from Rajiv Chowk to Kashmere Gate", STATIONS),
+])
+def test_answers_with_departure_times_expire_with_the_clock(query, stations):
+    at_nine = query_key(query, 'en', stations, datetime(2025, 6, 10, 9, 0))
+    assert query_key(query, 'en', stations, datetime(2025, 6, 10, 9, 4)) == at_nine
+    assert query_key(query, 'en', stations, datetime(2025, 6, 10, 9, 6)) != at_nine
+
+def test_fares_are_not_bucketed_by_time():
+    query = "What is the fare from Rajiv Chowk to Kashmere Gate"
+    assert (query_key(query, 'en', STATIONS, datetime(2025, 6, 10, 9, 0)) ==
+            query_key(query, 'en', STATIONS, datetime(2025, 6, 10, 17, 30)))
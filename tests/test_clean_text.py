@@ -0,0 +1,37 @@
+import random
+import pytest
+from handlers import llm
+from bench.clean_text import CORPUS, legacy_clean_text_for_tts, long_answer
+
+FRAGMENTS = ['**', '*', '#', '## ', '`', '~~', '- ', '+ ', '* ', '1. ', '12. ', '\n', '\n\n', '  ', '\t', ' ',
+             'Rajiv', 'Chowk', '₹50', '@', '&', '->', '—', 'Line', ':', '.', '(', ')', '-', 'नमस्ते', '🚇']
+
+def fresh(text: str) -> str:
+    """Clean without the recently-cleaned short-circuit"""
+    llm._cleaned.clear()
+    return llm.clean_text_for_tts(text)
+
+def legacy_fixed_point(text: str) -> str:
+    """The previous cleaner applied until its output stops changing, as happened when an
+    answer went through generate_response and then the RAG enhancer"""
+    while True:
+        cleaned = legacy_clean_text_for_tts(text)
+        if cleaned == text:
+            return text
+        text = cleaned
+
+@pytest.mark.parametrize('text', CORPUS + [long_answer(3)])
+def test_matches_the_previous_cleaner(text):
+    # The old cleaner left double spaces where it removed symbols, which the next call collapsed
+    assert fresh(text) == legacy_fixed_point(text)
+
+def test_idempotent():
+    rng = random.Random(7)
+    texts = CORPUS + [''.join(rng.choice(FRAGMENTS) for _ in range(rng.randint(1, 12))) for _ in range(20000)]
+    for text in texts:
+        once = fresh(text)
+        assert fresh(once) == once, text
+
+def test_already_clean_text_is_returned_as_is():
+    cleaned = llm.clean_text_for_tts(CORPUS[1])
+    assert llm.clean_text_for_tts(cleaned) == cleaned
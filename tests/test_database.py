@@ -0,0 +1,14 @@
+from handlers.database import get_database
+
+def test_partial_preferences_keep_the_other_columns(client):
+    client.post('/api/preferences?session_id=partial', json={
+        'preferred_language': 'hi', 'frequent_stations': ['Rajiv Chowk'], 'accessibility_needs': {}})
+    response = client.post('/api/preferences?session_id=partial', json={'accessibility_needs': ['wheelchair']})
+    assert response.get_json() == {'preferred_language': 'hi', 'frequent_stations': ['Rajiv Chowk'],
+                                   'accessibility_needs': ['wheelchair']}
+
+def test_new_preferences_take_defaults():
+    db = get_database()
+    db.save_user_preferences('defaults', {'frequent_stations': ['New Delhi']})
+    assert db.get_user_preferences('defaults') == {'preferred_language': 'en', 'frequent_stations': ['New Delhi'],
+                                                   'accessibility_needs': {}}
@@ -0,0 +1,29 @@
+from datetime import datetime
+import pytest
+from conftest import FEED_FILES
+from handlers.route_finder import find_multiple_routes
+
+MORNING = datetime(2025, 6, 10, 7, 55)
+
+@pytest.mark.parametrize('name', ['(', 'Gate (', '[', '*', 'Kashmere Gate (ISBT)'])
+def test_station_names_are_not_regular_expressions(client, name):
+    response = client.get('/api/journeys', query_string={'from': 'Rajiv Chowk', 'to': name, 'time': '08:00'})
+    assert response.status_code == 200
+
+def test_names_with_brackets_resolve(feed):
+    result = find_multiple_routes('Rajiv Chowk', 'Kashmere Gate (ISBT)', 3, MORNING)
+    assert result['to_station'] == 'Kashmere Gate (ISBT)'
+    assert result['routes']
+
+def test_route_variants_on_the_same_stops_are_one_itinerary(make_feed):
+    # A short-working variant of the line runs the same stops a minute behind T1
+    make_feed(**{
+        'routes.txt': FEED_FILES['routes.txt'] + "2,DMRC,Y_SQ_S,YELLOW_short working,,1\n",
+        'trips.txt': FEED_FILES['trips.txt'] + "2,weekday,S1,,,,1\n",
+        'stop_times.txt': FEED_FILES['stop_times.txt'] +
+                          "S1,08:01:00,08:01:00,1,1\nS1,08:06:00,08:06:30,2,2\nS1,08:13:00,08:13:00,3,3\n",
+    })
+    routes = find_multiple_routes('Rajiv Chowk', 'Kashmere Gate', 5, MORNING)['routes']
+    legs = [tuple((leg['from'], leg['to']) for leg in route['legs']) for route in routes]
+    assert len(legs) == len(set(legs))
+    assert routes[0]['departure_time'] == '08:00'
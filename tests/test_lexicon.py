@@ -0,0 +1,34 @@
+import pytest
+from conftest import FEED_FILES
+from handlers.lexicon import StationLexicon, phonetic_key
+
+STOPS = FEED_FILES['stops.txt'] + ("4,HK,Hauz Khas,,28.5494,77.2001,1\n"
+                                   "5,CC,Chandni Chowk,,28.6579,77.2301,1\n"
+                                   "6,MN,Mein,,28.6000,77.2000,1\n")
+TRANSLATIONS = ("table_name,field_name,language,translation,record_id,field_value\n"
+                "stops,stop_name,hi,राजीव चौक,1,\n"
+                "stops,stop_name,hi,कश्मीरी गेट,,Kashmere Gate (ISBT)\n")
+
+@pytest.fixture
+def lexicon(make_feed):
+    return StationLexicon(make_feed(**{'stops.txt': STOPS, 'translations.txt': TRANSLATIONS}))
+
+def test_spellings_share_a_phonetic_key():
+    assert phonetic_key('chowk') == phonetic_key('chauk') == phonetic_key('chok')
+
+@pytest.mark.parametrize('query, expected', [
+    ("राजीव चौक से कश्मीरी गेट कैसे जाना है", ['Rajiv Chowk', 'Kashmere Gate (ISBT)']),
+    ("rajiv chauk se kashmiri gate", ['Rajiv Chowk', 'Kashmere Gate (ISBT)']),
+    ("Hauz Khaas se Chandni Chauk ka kiraya", ['Hauz Khas', 'Chandni Chowk']),
+    ("Kashmere Gate to Rajiv Chowk", ['Kashmere Gate (ISBT)', 'Rajiv Chowk']),
+])
+def test_resolves_hindi_and_hinglish_names(lexicon, query, expected):
+    assert lexicon.find(query) == expected
+
+def test_stopwords_never_match_on_their_own(lexicon):
+    # "mein" is also the whole name of a (made-up) station
+    assert lexicon.find("mujhe metro mein jana hai") == []
+    assert lexicon.find("hauz khas mein kya hai") == ['Hauz Khas']
+
+def test_limit_stops_at_the_first_matches(lexicon):
+    assert lexicon.find("rajiv chowk se hauz khas", limit=1) == ['Rajiv Chowk']
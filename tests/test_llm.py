@@ -0,0 +1,27 @@
+import socket
+import time
+import pytest
+from handlers import agent, llm
+from handlers.admission import admission_stats
+
+@pytest.fixture
+def hung_upstream(monkeypatch):
+    """A Gemini URL that accepts connections and never answers"""
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen(16)
+    monkeypatch.setattr(llm, 'GEMINI_URL', f"http://127.0.0.1:{server.getsockname()[1]}/generate")
+    yield
+    server.close()
+
+def test_hung_llm_call_times_out_and_frees_its_slot(hung_upstream, monkeypatch):
+    monkeypatch.setattr(agent, 'LLM_TIMEOUT', 0.2)
+    start = time.perf_counter()
+    assert agent.MetroAgent()._call_llm("Hello") == agent.LLM_UNAVAILABLE
+    assert time.perf_counter() - start < 2
+    assert admission_stats()['stages']['llm']['active'] == 0
+
+def test_llm_generate_times_out(hung_upstream, monkeypatch):
+    monkeypatch.setattr(llm, 'LLM_TIMEOUT', 0.2)
+    assert llm.llm_generate("Rajiv Chowk to Kashmere Gate") == 'LLM API error'
+    assert admission_stats()['stages']['llm']['active'] == 0
@@ -0,0 +1,25 @@
+import pytest
+
+def test_od_matrix_streams_without_printing(client, capsys):
+    from handlers.metrics import STAGE_SECONDS
+    response = client.post('/api/od_matrix', json={'pairs': [['Rajiv Chowk', 'Kashmere Gate']], 'times': ['08:00']})
+    body = response.get_data(as_text=True)
+    assert response.status_code == 200 and 'Kashmere Gate' in body
+    assert 'OD matrix' not in capsys.readouterr().out
+    assert 'od_matrix' in STAGE_SECONDS._series
+
+def test_od_matrix_reports_pairs_per_second(client):
+    response = client.post('/api/od_matrix', json={'origins': ['Rajiv Chowk'], 'destinations': ['New Delhi', 'Kashmere Gate'],
+                                                   'times': ['08:00']})
+    trailer = response.get_data(as_text=True).splitlines()[-1]
+    assert trailer.startswith('# pairs=2 ') and 'pairs_per_second=' in trailer
+
+@pytest.mark.parametrize('body', [
+    {'origins': 'Rajiv Chowk'}, {'origins': ['Rajiv Chowk'], 'destinations': 'New Delhi'},
+    {'origins': [1, 2]}, {'pairs': [['Rajiv Chowk']]}, {'pairs': [['Rajiv Chowk', 'New Delhi', 'Kashmere Gate']]},
+    {'pairs': ['Rajiv Chowk', 'New Delhi']}, {'pairs': [['Rajiv Chowk', 3]]},
+])
+def test_od_matrix_rejects_malformed_stations(client, body):
+    response = client.post('/api/od_matrix', json=body)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
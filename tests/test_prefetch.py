@@ -0,0 +1,49 @@
+import time
+import threading
+from handlers.cache import answer_cache
+from handlers.prefetch import Prefetcher, result_key
+
+def station_info(station: str) -> dict:
+    action = {'action': 'get_station_info', 'station': station}
+    answer_cache.evict(lambda key: key == result_key(action))
+    return action
+
+def test_submissions_over_the_queue_limit_are_dropped(monkeypatch):
+    prefetcher = Prefetcher(workers=1, queue_limit=2)
+    release = threading.Event()
+    monkeypatch.setattr(prefetcher, '_origin', lambda query, stations, lang: release.wait(5) and None)
+    assert prefetcher.submit('s', 'q', None)
+    assert prefetcher.submit('s', 'q', None)
+    assert not prefetcher.submit('s', 'q', None)
+    stats = prefetcher.stats()
+    assert (stats['scheduled'], stats['dropped'], stats['pending']) == (2, 1, 2)
+    release.set()
+    deadline = time.monotonic() + 5
+    while prefetcher.stats()['pending'] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # The budget frees up as queued stations finish
+    assert prefetcher.submit('s', 'q', None)
+    prefetcher._pool.shutdown(wait=True)
+    assert prefetcher.stats()['dropped'] == 1
+
+def test_used_counts_each_prefetched_result_once():
+    prefetcher = Prefetcher(workers=1)
+    info = station_info('New Delhi')
+    prefetcher._warm(info)
+    # Already cached: not computed again
+    prefetcher._warm(info)
+    assert prefetcher.lookup(info)['name'] == 'New Delhi'
+    assert prefetcher.lookup(info) is not None
+    assert prefetcher.lookup({'action': 'get_station_info', 'station': 'Nowhere'}) is None
+    stats = prefetcher.stats()
+    assert (stats['computed'], stats['skipped'], stats['hits'], stats['used']) == (1, 1, 2, 1)
+    assert stats['hit_rate'] == 1.0
+
+def test_hit_rate_is_the_share_of_computed_results_used():
+    prefetcher = Prefetcher(workers=1)
+    used, unused = station_info('Rajiv Chowk'), station_info('Kashmere Gate')
+    prefetcher._warm(used)
+    prefetcher._warm(unused)
+    prefetcher.lookup(used)
+    stats = prefetcher.stats()
+    assert (stats['computed'], stats['used'], stats['hit_rate']) == (2, 1, 0.5)
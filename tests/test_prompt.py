@@ -0,0 +1,13 @@
+import json
+from handlers.prompt import summarize_results
+
+def test_station_summary_keeps_lines(feed):
+    from handlers.station_info import StationInfo
+    details = StationInfo(feed).get_station_details('Rajiv Chowk')
+    assert details['lines']
+    assert json.loads(summarize_results([details]))[0]['lines'] == details['lines']
+
+def test_schedule_summary_keeps_peak_hours(feed):
+    from handlers.schedule import MetroSchedule
+    schedule = MetroSchedule(feed).get_station_schedule('Rajiv Chowk', '07:30')
+    assert schedule['peak_hours'] in summarize_results([schedule])
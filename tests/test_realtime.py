@@ -0,0 +1,40 @@
+from datetime import date, datetime, timezone
+from zoneinfo import ZoneInfo
+import pytest
+from handlers.realtime import parse_trip_updates, service_midnight
+
+def stop_update(trip_id: str, sequence: int, arrival: datetime, departure: datetime) -> dict:
+    return {'entity': [{'id': trip_id, 'tripUpdate': {
+        'trip': {'tripId': trip_id, 'startDate': '20250610'},
+        'stopTimeUpdate': [{'stopSequence': sequence, 'arrival': {'time': int(arrival.timestamp())},
+                            'departure': {'time': int(departure.timestamp())}}]}}]}
+
+def test_service_midnight_is_in_the_feed_timezone():
+    # 00:00 IST is 18:30 UTC the day before
+    expected = datetime(2025, 6, 9, 18, 30, tzinfo=timezone.utc).timestamp()
+    assert service_midnight(date(2025, 6, 10), ZoneInfo('Asia/Kolkata')) == expected
+
+@pytest.mark.parametrize('host', ['UTC', 'America/New_York', 'Asia/Kolkata'])
+def test_absolute_event_times_do_not_depend_on_host_timezone(feed, host_timezone, host):
+    host_timezone(host)
+    ist = ZoneInfo('Asia/Kolkata')
+    # T1 is due at New Delhi (sequence 2) at 08:05 IST and leaves at 08:05:30
+    on_time, ignored = parse_trip_updates(stop_update('T1', 2, datetime(2025, 6, 10, 8, 5, tzinfo=ist),
+                                                      datetime(2025, 6, 10, 8, 5, 30, tzinfo=ist)))
+    assert on_time == {} and ignored == 0
+    late, _ = parse_trip_updates(stop_update('T1', 2, datetime(2025, 6, 10, 8, 7, tzinfo=ist),
+                                             datetime(2025, 6, 10, 8, 7, 30, tzinfo=ist)))
+    assert late == {'T1': [(1, 120, 120)]}
+
+@pytest.mark.parametrize('host', ['UTC', 'America/New_York'])
+def test_now_is_read_in_the_feed_timezone(feed, host_timezone, host):
+    from handlers.gtfs import feed_now
+    from handlers.schedule import MetroSchedule
+    host_timezone(host)
+    ist = ZoneInfo('Asia/Kolkata')
+    before = datetime.now(ist).replace(tzinfo=None)
+    now = feed_now()
+    current = MetroSchedule(feed).get_station_schedule('Rajiv Chowk')['current_time']
+    after = datetime.now(ist).replace(tzinfo=None)
+    assert before <= now <= after
+    assert current in {before.strftime('%H:%M'), after.strftime('%H:%M')}
@@ -0,0 +1,15 @@
+from handlers.service_hours import TIME_BANDS, peak_hours
+
+def test_peak_hours_follow_the_time_bands(monkeypatch):
+    assert peak_hours() == '08:00 - 11:00, 17:00 - 20:00'
+    bands = tuple((band, start + 1800, end) if band == 'morning_peak' else (band, start, end)
+                  for band, start, end in TIME_BANDS)
+    monkeypatch.setattr('handlers.service_hours.TIME_BANDS', bands)
+    assert peak_hours() == '08:30 - 11:00, 17:00 - 20:00'
+
+def test_station_schedule_reports_computed_hours(feed):
+    from handlers.schedule import MetroSchedule
+    schedule = MetroSchedule(feed).get_station_schedule('Rajiv Chowk', '07:30')
+    assert schedule['operating_hours'] == '08:00 - 08:10'
+    assert schedule['peak_hours'] == peak_hours()
+    assert schedule['service_by_line'][0]['every_minutes'] == {'morning_peak': 10.0}
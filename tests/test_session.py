@@ -0,0 +1,66 @@
+import time
+import pytest
+from handlers.session import RESULT_TTL, SessionStore
+
+ROUTE = {'action': 'find_route', 'from': 'Rajiv Chowk', 'to': 'Kashmere Gate (ISBT)'}
+FARE = {'action': 'calculate_fare', 'from': 'Rajiv Chowk', 'to': 'Kashmere Gate (ISBT)'}
+
+@pytest.mark.parametrize('action', [ROUTE, dict(ROUTE, accessible=True)])
+def test_route_results_expire_like_schedules(monkeypatch, action):
+    ctx = SessionStore().get('ttl')
+    ctx.put_result(action, {'routes': []})
+    assert ctx.get_result(action) == {'routes': []}
+    later = time.monotonic() + RESULT_TTL['find_route'] + 1
+    monkeypatch.setattr('handlers.session.time.monotonic', lambda: later)
+    assert ctx.get_result(action) is None
+
+def test_realtime_updates_drop_time_sensitive_results():
+    from app import session_store
+    from handlers.realtime import apply_trip_updates
+    ctx = session_store.get('delays')
+    ctx.put_result(ROUTE, {'routes': []})
+    ctx.put_result(FARE, {'fare': 30})
+    try:
+        apply_trip_updates({'entity': [{'id': 'T1', 'tripUpdate': {
+            'trip': {'tripId': 'T1'}, 'stopTimeUpdate': [{'stopSequence': 2, 'arrival': {'delay': 60}}]}}]})
+        assert ctx.get_result(ROUTE) is None
+        assert ctx.get_result(FARE) == {'fare': 30}
+    finally:
+        apply_trip_updates({'entity': []})
+
+def test_feed_swap_drops_all_results():
+    from app import session_store
+    from handlers.gtfs import get_feed, swap_feed
+    ctx = session_store.get('swap')
+    ctx.put_result(FARE, {'fare': 30})
+    swap_feed(get_feed())
+    assert ctx.get_result(FARE) is None
+
+def test_anonymous_requests_get_no_session():
+    store = SessionStore()
+    assert store.get(None) is None and store.get('anonymous') is None
+    assert len(store) == 0
+
+def test_sessions_expire_and_are_bounded(monkeypatch):
+    store = SessionStore(ttl=60, max_sessions=2)
+    first = store.get('a')
+    first.entities['from_station'] = 'Rajiv Chowk'
+    assert store.get('a') is first
+    store.get('b')
+    store.get('c')
+    # Least recently used goes first
+    assert len(store) == 2 and store.get('a') is not first
+    store.get('a').entities['from_station'] = 'Rajiv Chowk'
+    later = time.monotonic() + 61
+    monkeypatch.setattr('handlers.session.time.monotonic', lambda: later)
+    assert store.get('a').entities == {}
+
+def test_followups_reuse_the_session_stations():
+    from handlers.session import resolve_query
+    ctx = SessionStore().get('followup')
+    ctx.remember('Rajiv Chowk to New Delhi', {'intent': 'route_finding', 'entities': {
+        'from_station': 'Rajiv Chowk', 'to_station': 'New Delhi'}}, 'Take the Yellow Line')
+    assert resolve_query('and the fare?', 'en', ctx) == ('Rajiv Chowk', 'New Delhi')
+    assert ctx.followup_intent('and the fare?')['intent'] == 'fare'
+    # A query naming its own stations is not a follow-up
+    assert resolve_query('Kashmere Gate to Rajiv Chowk', 'en', ctx) != ('Rajiv Chowk', 'New Delhi')